@@ -0,0 +1,19 @@
+import hmac
+import os
+from typing import Optional
+
+from fastapi import Header, HTTPException
+
+ADMIN_TOKEN_HEADER = "X-Admin-Token"
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+def is_admin_token(token: Optional[str]) -> bool:
+    """Constant-time comparison against ADMIN_TOKEN; always false when no token is configured"""
+    return bool(ADMIN_TOKEN and token and hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()))
+
+async def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Dependency for /admin endpoints: they are disabled unless ADMIN_TOKEN is set"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Admin endpoints are disabled")
+    if not is_admin_token(x_admin_token):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
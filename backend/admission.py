@@ -0,0 +1,146 @@
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from fastapi import HTTPException, Request
+
+ANALYZE_MAX_CONCURRENCY = int(os.getenv("ANALYZE_MAX_CONCURRENCY", "4"))
+ANALYZE_USER_RATE_PER_MINUTE = float(os.getenv("ANALYZE_USER_RATE_PER_MINUTE", "20"))
+ANALYZE_USER_BURST = int(os.getenv("ANALYZE_USER_BURST", "5"))
+PREMIUM_MAX_CONCURRENCY = int(os.getenv("PREMIUM_MAX_CONCURRENCY", "2"))
+PREMIUM_USER_RATE_PER_MINUTE = float(os.getenv("PREMIUM_USER_RATE_PER_MINUTE", "6"))
+PREMIUM_USER_BURST = int(os.getenv("PREMIUM_USER_BURST", "2"))
+# Requests waiting for a slot: past the degrade depth new arrivals skip the LLM, past the max they are shed
+ADMISSION_DEGRADE_QUEUE_DEPTH = int(os.getenv("ADMISSION_DEGRADE_QUEUE_DEPTH", "4"))
+ADMISSION_MAX_QUEUE_DEPTH = int(os.getenv("ADMISSION_MAX_QUEUE_DEPTH", "16"))
+# Seconds spent waiting for a slot: past the degrade wait the request skips the LLM, past the max it is shed
+ADMISSION_DEGRADE_WAIT = float(os.getenv("ADMISSION_DEGRADE_WAIT", "1.0"))
+ADMISSION_MAX_WAIT = float(os.getenv("ADMISSION_MAX_WAIT", "5.0"))
+MAX_TRACKED_USERS = 10000
+
+FULL = "full"
+DEGRADED = "degraded"
+
+class AdmissionRejected(HTTPException):
+    def __init__(self, status_code: int, detail: str, retry_after: float):
+        super().__init__(status_code=status_code, detail=detail, headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+
+def requester_key(user_id: Optional[str], request: Request) -> str:
+    """Quota key: the user_id sent by the client, else the client address"""
+    if user_id:
+        return f"user:{user_id}"
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, tokens: float):
+        self.tokens = tokens
+        self.updated = time.monotonic()
+
+class UserQuota:
+    """Per-user token buckets holding up to `burst` requests, refilled at `rate_per_minute`"""
+
+    def __init__(self, rate_per_minute: float, burst: int, max_users: int = MAX_TRACKED_USERS):
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self.max_users = max_users
+        # Least recently seen users are forgotten first; they would have refilled anyway
+        self.buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+    def take(self, key: str) -> float:
+        """Spend one token; 0 when allowed, otherwise seconds until a token is available"""
+        now = time.monotonic()
+        bucket = self.buckets.pop(key, None) or TokenBucket(float(self.burst))
+        bucket.tokens = min(float(self.burst), bucket.tokens + (now - bucket.updated) * self.rate)
+        bucket.updated = now
+        self.buckets[key] = bucket
+        while len(self.buckets) > self.max_users:
+            self.buckets.popitem(last=False)
+
+        if bucket.tokens >= 1:
+            bucket.tokens -= 1
+            return 0.0
+        return (1 - bucket.tokens) / self.rate if self.rate > 0 else 60.0
+
+class EndpointGate:
+    """Concurrency budget for one expensive endpoint, with queue-depth and queue-latency shedding.
+
+    Under moderate pressure requests are admitted on the DEGRADED tier (rule-based
+    analysis instead of the LLM); only when the queue is full or the wait runs out
+    are they rejected.
+    """
+
+    def __init__(self, name: str, max_concurrency: int, quota: UserQuota):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.quota = quota
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+        self.waiting = 0
+        self.counters = {"full": 0, "degraded": 0, "rejected_quota": 0, "rejected_queue_depth": 0, "rejected_queue_wait": 0}
+        self.avg_wait = 0.0
+
+    def check_quota(self, user_key: str):
+        retry_after = self.quota.take(user_key)
+        if retry_after:
+            self.counters["rejected_quota"] += 1
+            raise AdmissionRejected(429, f"Too many {self.name} requests, retry later", retry_after)
+
+    async def _acquire(self) -> str:
+        if not self.semaphore.locked():
+            await self.semaphore.acquire()
+            return FULL
+
+        if self.waiting >= ADMISSION_MAX_QUEUE_DEPTH:
+            self.counters["rejected_queue_depth"] += 1
+            raise AdmissionRejected(503, f"{self.name} is overloaded, retry shortly", ADMISSION_MAX_WAIT)
+        tier = DEGRADED if self.waiting >= ADMISSION_DEGRADE_QUEUE_DEPTH else FULL
+
+        self.waiting += 1
+        start = time.monotonic()
+        try:
+            await asyncio.wait_for(self.semaphore.acquire(), ADMISSION_MAX_WAIT)
+        except asyncio.TimeoutError:
+            self.counters["rejected_queue_wait"] += 1
+            raise AdmissionRejected(503, f"{self.name} is overloaded, retry shortly", ADMISSION_MAX_WAIT)
+        finally:
+            self.waiting -= 1
+
+        waited = time.monotonic() - start
+        self.avg_wait = 0.9 * self.avg_wait + 0.1 * waited
+        return DEGRADED if waited > ADMISSION_DEGRADE_WAIT else tier
+
+    @asynccontextmanager
+    async def admit(self, user_key: str):
+        """Hold a slot for the duration of the block; yields FULL or DEGRADED, or raises AdmissionRejected"""
+        self.check_quota(user_key)
+        tier = await self._acquire()
+        self.counters[tier] += 1
+        self.in_flight += 1
+        try:
+            yield tier
+        finally:
+            self.in_flight -= 1
+            self.semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "avg_wait_seconds": round(self.avg_wait, 3),
+            "tracked_users": len(self.quota.buckets),
+            **self.counters
+        }
+
+# Global admission gates
+analyze_admission = EndpointGate("analyze", ANALYZE_MAX_CONCURRENCY, UserQuota(ANALYZE_USER_RATE_PER_MINUTE, ANALYZE_USER_BURST))
+premium_admission = EndpointGate("premium-analyze", PREMIUM_MAX_CONCURRENCY, UserQuota(PREMIUM_USER_RATE_PER_MINUTE, PREMIUM_USER_BURST))
+
+def admission_stats() -> dict:
+    return {gate.name: gate.stats() for gate in (analyze_admission, premium_admission)}
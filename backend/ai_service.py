@@ -1,10 +1,11 @@
-import openai
 import requests
 import json
 import os
 from typing import Dict, List, Any
 from dotenv import load_dotenv
 
+from metrics import llm_json_failures, stage
+
 load_dotenv()
 
 class RealAIService:
@@ -19,6 +20,7 @@ class RealAIService:
             api_key = os.getenv("OPENAI_API_KEY")
             if not api_key:
                 raise ValueError("OPENAI_API_KEY environment variable not set")
+            import openai
             self.openai_client = openai.OpenAI(api_key=api_key)
         return self.openai_client
     
@@ -79,18 +81,23 @@ class RealAIService:
             """
             
             client = self._get_openai_client()
-            response = client.chat.completions.create(
-                model="gpt-4",
-                messages=[
-                    {"role": "system", "content": "You are a leading nutritionist and food scientist with access to the latest research. Provide evidence-based, comprehensive analysis."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.2,
-                max_tokens=2000
-            )
+            with stage("llm"):
+                response = client.chat.completions.create(
+                    model="gpt-4",
+                    messages=[
+                        {"role": "system", "content": "You are a leading nutritionist and food scientist with access to the latest research. Provide evidence-based, comprehensive analysis."},
+                        {"role": "user", "content": prompt}
+                    ],
+                    temperature=0.2,
+                    max_tokens=2000
+                )
             
             return json.loads(response.choices[0].message.content)
             
+        except json.JSONDecodeError as e:
+            llm_json_failures.inc("ai_service")
+            print(f"OpenAI analysis returned invalid JSON: {e}")
+            return {"error": "OpenAI analysis unavailable"}
         except Exception as e:
             print(f"OpenAI analysis error: {e}")
             return {"error": "OpenAI analysis unavailable"}
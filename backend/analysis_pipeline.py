@@ -0,0 +1,289 @@
+import hashlib
+import json
+import os
+import uuid
+
+from PIL import Image
+
+from cache_backend import analysis_cache, ocr_text_cache
+from deadline import DEADLINE_DOWNSCALE_MAX_SIDE, current_degradations, has_time_for, measure, record_degradation, remaining
+from flight_recorder import note
+from memory_report import record_model_footprint
+from metrics import llm_json_failures, ocr_fallbacks, stage
+from scoring import HealthRisk, analyze_health_risks, fallback_analysis, get_nutritional_insights
+
+# Bump when the analysis logic or AnalysisResult fields change; stored product snapshots are then refreshed lazily
+ANALYZER_VERSION = 1
+
+# Initialize EasyOCR reader (lazy loading to avoid startup issues)
+reader = None
+
+def get_ocr_reader():
+    global reader
+    if reader is None:
+        # EasyOCR pulls in torch; importing it here keeps it off the cold start of pods that never OCR
+        import easyocr
+        reader = record_model_footprint("easyocr", lambda: easyocr.Reader(['en']))
+    return reader
+
+def get_openai():
+    """The OpenAI SDK, imported on the first LLM call rather than at startup"""
+    import openai
+    openai.api_key = os.getenv("OPENAI_API_KEY")
+    return openai
+
+def run_ocr(image_path: str) -> str:
+    """OCR an image file into one string; errors propagate so background jobs can retry"""
+    with stage("ocr"):
+        return " ".join(get_ocr_reader().readtext(image_path, detail=0))
+
+# Placeholder label text used when OCR finds nothing, so analysis can still proceed
+OCR_FALLBACK_TEXT = "INGREDIENTS: Water, Sugar, Salt, Natural Flavors, Artificial Preservatives"
+
+def extract_label_text(image: Image.Image) -> str:
+    """OCR an ingredient label photo, falling back to placeholder text so analysis can proceed"""
+    with stage("image_decode"):
+        # Convert to RGB if necessary
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        
+        # OCR time grows with pixel count: shrink large photos when the budget cannot cover a full pass
+        if not has_time_for("ocr_pass") and max(image.size) > DEADLINE_DOWNSCALE_MAX_SIDE:
+            image.thumbnail((DEADLINE_DOWNSCALE_MAX_SIDE, DEADLINE_DOWNSCALE_MAX_SIDE))
+            record_degradation("downscaled_image")
+        note("image_size", list(image.size))
+        
+        # Save to temporary file for EasyOCR
+        temp_path = f"/tmp/temp_image_{uuid.uuid4().hex}.jpg"
+        image.save(temp_path, "JPEG", quality=95)
+    
+    # Perform OCR on the temporary file
+    try:
+        ocr_reader = get_ocr_reader()
+        with stage("ocr"), measure("ocr_pass"):
+            results = ocr_reader.readtext(temp_path, detail=0)
+        print(f"OCR successful, found {len(results)} text regions")
+        note("ocr_regions", len(results))
+        note("ocr_path", "single_pass")
+        
+        # If no text found, try with different parameters (only if the budget allows another pass)
+        if (not results or len(results) == 0) and not has_time_for("ocr_pass"):
+            print("No text found and no time left for a second OCR pass, using fallback")
+            record_degradation("skipped_second_ocr_pass")
+            ocr_fallbacks.inc("no_time_for_second_pass")
+            note("ocr_path", "fallback_no_time_for_second_pass")
+            results = [OCR_FALLBACK_TEXT]
+        elif not results or len(results) == 0:
+            print("No text found with default settings, trying with detail=1")
+            with stage("ocr"), measure("ocr_pass"):
+                results = ocr_reader.readtext(temp_path, detail=1)
+            note("ocr_regions", len(results))
+            note("ocr_path", "second_pass")
+            if results:
+                results = [result[1] for result in results]  # Extract text only
+            else:
+                print("Still no text found, using fallback")
+                ocr_fallbacks.inc("no_text")
+                note("ocr_path", "fallback_no_text")
+                results = [OCR_FALLBACK_TEXT]
+    except Exception as ocr_error:
+        print(f"OCR failed: {ocr_error}")
+        ocr_fallbacks.inc("error")
+        note("ocr_path", "fallback_error")
+        # Fallback: return mock data for testing
+        results = [OCR_FALLBACK_TEXT]
+    
+    # Clean up temporary file
+    try:
+        os.remove(temp_path)
+    except:
+        pass
+    
+    # Extract text from OCR results
+    if not results:
+        return OCR_FALLBACK_TEXT
+    elif isinstance(results[0], str):
+        # Results are already text strings
+        return " ".join(results)
+    else:
+        # Results are tuples with (bbox, text, confidence)
+        return " ".join([result[1] for result in results])
+
+def cached_label_text(image_data: bytes, image: Image.Image) -> str:
+    """OCR text for an upload, shared between workers by image hash; placeholder or downscaled reads are not cached"""
+    key = hashlib.sha256(image_data).hexdigest()
+    text = ocr_text_cache.get(key)
+    if text is not None:
+        note("ocr_path", "cache")
+        return text
+    text = extract_label_text(image)
+    if text != OCR_FALLBACK_TEXT and "downscaled_image" not in current_degradations():
+        ocr_text_cache.set(key, text)
+    return text
+
+class LLMAnalysisFailed(Exception):
+    """The LLM gave no usable analysis: an API error, a timeout, invalid JSON or no time left for the call"""
+
+def analyze_with_ai(ingredients: list[str], user_profile: dict = None) -> dict:
+    """LLM analysis, or the rule-based analysis when the LLM fails"""
+    try:
+        return llm_analysis(ingredients, user_profile)
+    except LLMAnalysisFailed:
+        note_llm_fallback()
+        return fallback_analysis(ingredients)
+
+def note_llm_fallback():
+    note("analysis_path", "llm_failed_rule_based")
+    if remaining() == 0:
+        record_degradation("rule_based_analysis")
+
+def llm_analysis(ingredients: list[str], user_profile: dict = None) -> dict:
+    """Analyze ingredients using OpenAI API with comprehensive medical-grade analysis; raises LLMAnalysisFailed"""
+    
+    # Identical ingredient lists (repeat scans of an unknown product) reuse the LLM answer from any worker
+    cache_key = hashlib.sha256(json.dumps([ANALYZER_VERSION, ingredients, user_profile], sort_keys=True).encode()).hexdigest()
+    cached = analysis_cache.get(cache_key)
+    if cached is not None:
+        note("analysis_path", "llm_cache")
+        return cached
+    
+    # Build personalized context
+    profile_context = ""
+    if user_profile:
+        profile_context = f"""
+    
+    USER HEALTH PROFILE:
+    - Primary Goal: {user_profile.get('primary_goal', 'Not specified')}
+    - Diet Type: {user_profile.get('diet_type', 'Not specified')}
+    - Health Conditions: {', '.join([k for k, v in user_profile.items() if v is True and k in ['diabetes', 'blood_pressure', 'pcos_thyroid', 'heart_conditions', 'digestive_issues']]) or 'None'}
+    - Dietary Restrictions: {', '.join(user_profile.get('restrictions', [])) or 'None'}
+    - Activity Level: {user_profile.get('activity_level', 'Not specified')}
+    
+    IMPORTANT: Adjust your analysis, scoring, and recommendations based on this user's specific health goals and conditions.
+    """
+    
+    prompt = f"""
+    You are a world-class nutritionist, food scientist, and medical researcher. Provide a comprehensive medical-grade analysis of these ingredients tailored to the user's health profile:
+    
+    {profile_context}
+    
+    Ingredients: {', '.join(ingredients)}
+    
+    Return a detailed JSON response with:
+    {{
+        "score": number 0-100 (health score),
+        "risk_ingredients": [list of concerning ingredients with detailed reasons],
+        "tags": [descriptive tags like "High Protein", "Keto-Friendly", "Vegan", "Gluten-Free", "Ultra-Processed", "Natural", "High Sugar", "Low Sodium", "Heart-Healthy", "Anti-Inflammatory"],
+        "summary": "3-4 sentence comprehensive health assessment with medical context",
+        "recommendation": "Specific actionable medical advice for the consumer",
+        "health_risks": [
+            {{
+                "risk_type": "specific health concern (e.g., cardiovascular_disease, diabetes_risk, inflammation, digestive_health, cancer_risk)",
+                "severity": "low/medium/high",
+                "description": "detailed medical explanation with scientific context",
+                "affected_ingredients": [list of problematic ingredients],
+                "scientific_evidence": "brief summary of research findings",
+                "prevention_tips": [specific actionable prevention strategies]
+            }}
+        ],
+        "nutritional_insights": {{
+            "protein_content": "low/medium/high",
+            "fiber_content": "low/medium/high", 
+            "vitamin_content": "low/medium/high",
+            "mineral_content": "low/medium/high",
+            "processing_level": "minimal/moderate/high/ultra-processed",
+            "sugar_level": "low/medium/high",
+            "sodium_level": "low/medium/high",
+            "fat_quality": "excellent/good/fair/poor",
+            "antioxidant_content": "low/medium/high",
+            "inflammatory_potential": "low/medium/high"
+        }},
+        "allergen_warnings": [list of potential allergens with severity],
+        "target_demographics": [who this product is best for with health conditions],
+        "alternative_suggestions": [specific healthier alternatives with brand suggestions],
+        "sustainability_score": number 1-10,
+        "cost_effectiveness": number 1-10,
+        "processing_level": number 1-10,
+        "medical_benefits": [list of potential health benefits],
+        "contraindications": [who should avoid this product and why],
+        "nutrient_density": "low/medium/high",
+        "glycemic_impact": "low/medium/high"
+    }}
+
+    Be thorough, scientific, evidence-based, and provide medical-grade insights. Focus on:
+    1. Cardiovascular health impact
+    2. Metabolic effects (blood sugar, insulin)
+    3. Inflammatory potential
+    4. Digestive health
+    5. Cancer risk factors
+    6. Neurological effects
+    7. Immune system impact
+    8. Long-term health consequences
+    """
+    
+    try:
+        # Never let the LLM call outlive the request deadline
+        time_left = remaining()
+        request_options = {"timeout": time_left} if time_left is not None else {}
+        with stage("llm"), measure("llm"):
+            response = get_openai().chat.completions.create(
+                model="gpt-3.5-turbo",
+                messages=[
+                    {"role": "system", "content": "You are a nutrition expert analyzing food ingredients. Always respond with valid JSON only."},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.3,
+                max_tokens=500,
+                **request_options
+            )
+        
+        try:
+            result = json.loads(response.choices[0].message.content)
+        except json.JSONDecodeError:
+            llm_json_failures.inc("analyze")
+            raise
+        
+        # Validate and ensure all required fields
+        analysis = {
+            "score": max(0, min(100, result.get("score", 50))),
+            "risk_ingredients": result.get("risk_ingredients", []),
+            "tags": result.get("tags", []),
+            "summary": result.get("summary", "Analysis completed"),
+            "recommendation": result.get("recommendation", "Consider reading labels carefully")
+        }
+        analysis_cache.set(cache_key, analysis)
+        return analysis
+        
+    except Exception as e:
+        print(f"LLM analysis failed: {e}")
+        raise LLMAnalysisFailed(str(e)) from e
+
+def build_analysis_result(ingredients: list[str], user_profile: dict = None, use_ai: bool = True, strict: bool = False) -> dict:
+    """Complete analysis for an ingredient list, in the shape stored as a product snapshot.
+
+    With strict, an LLM analysis that cannot be had raises LLMAnalysisFailed instead of
+    falling back to the rule-based one, for callers that persist the result.
+    """
+    if use_ai and not has_time_for("llm"):
+        if strict:
+            raise LLMAnalysisFailed("No time left for the LLM call")
+        record_degradation("rule_based_analysis")
+        use_ai = False
+    note("analysis_path", "llm" if use_ai else "rule_based")
+    if not use_ai:
+        analysis = fallback_analysis(ingredients)
+    elif strict:
+        analysis = llm_analysis(ingredients, user_profile)
+    else:
+        analysis = analyze_with_ai(ingredients, user_profile)
+    health_risks = analysis.get("health_risks") or analyze_health_risks(ingredients)
+    return {
+        "score": analysis["score"],
+        "risk_ingredients": analysis["risk_ingredients"],
+        "tags": analysis["tags"],
+        "summary": analysis["summary"],
+        "recommendation": analysis["recommendation"],
+        "extracted_ingredients": ingredients,
+        "health_risks": [risk.model_dump() if isinstance(risk, HealthRisk) else risk for risk in health_risks],
+        "nutritional_insights": analysis.get("nutritional_insights") or get_nutritional_insights(ingredients)
+    }
@@ -0,0 +1,74 @@
+import asyncio
+import contextvars
+import json
+import zlib
+from typing import Any, Callable, Dict, List, Set
+
+from sqlalchemy.orm import Session
+
+from models import Product
+
+def pack_snapshot(analysis: Dict[str, Any]) -> bytes:
+    return zlib.compress(json.dumps(analysis, separators=(",", ":"), default=str).encode("utf-8"), 6)
+
+def unpack_snapshot(data: bytes) -> Dict[str, Any]:
+    return json.loads(zlib.decompress(data).decode("utf-8"))
+
+def read_snapshot(product: Product, analyzer_version: int, ingredients: List[str]) -> tuple:
+    """(analysis, is_stale) for a product, or (None, True) when it was never analyzed.
+
+    A snapshot is stale when an older analyzer produced it or when the product's
+    ingredients changed after it was taken.
+    """
+    if not product.analysis_snapshot:
+        return None, True
+    try:
+        analysis = unpack_snapshot(product.analysis_snapshot)
+    except (zlib.error, ValueError) as e:
+        print(f"Discarding unreadable analysis snapshot for product {product.product_id}: {e}")
+        return None, True
+    stale = product.analyzer_version != analyzer_version or analysis.get("extracted_ingredients") != ingredients
+    return analysis, stale
+
+def store_snapshot(db: Session, product_id: int, analysis: Dict[str, Any], analyzer_version: int):
+    """Save a product's analysis with a bulk UPDATE, so no ORM flush invalidates its cached details"""
+    db.query(Product).filter(Product.product_id == product_id).update({
+        Product.analysis_snapshot: pack_snapshot(analysis),
+        Product.analyzer_version: analyzer_version
+    }, synchronize_session=False)
+    db.commit()
+
+_refreshing: Set[int] = set()
+_background_tasks: Set[asyncio.Task] = set()
+
+def refresh_snapshot_in_background(
+    product_id: int,
+    analyze: Callable[[], Dict[str, Any]],
+    analyzer_version: int,
+    session_factory: Callable[[], Session]
+):
+    """Recompute a stale snapshot in a worker thread, at most once per product at a time"""
+    if product_id in _refreshing:
+        return
+    _refreshing.add(product_id)
+
+    def refresh():
+        analysis = analyze()
+        db = session_factory()
+        try:
+            store_snapshot(db, product_id, analysis, analyzer_version)
+        finally:
+            db.close()
+
+    async def run_refresh():
+        try:
+            await asyncio.to_thread(refresh)
+        except Exception as e:
+            print(f"Background analysis refresh failed for product {product_id}: {e}")
+        finally:
+            _refreshing.discard(product_id)
+
+    # A fresh context: the refresh must not inherit the finished request's deadline or trace
+    task = asyncio.get_running_loop().create_task(run_refresh(), context=contextvars.Context())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
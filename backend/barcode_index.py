@@ -0,0 +1,236 @@
+import asyncio
+import hashlib
+import math
+import os
+import re
+import threading
+import time
+from typing import Callable, Iterable, List, Optional, Set
+
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+
+from models import Product
+
+BARCODE_BLOOM_ERROR_RATE = float(os.getenv("BARCODE_BLOOM_ERROR_RATE", "0.01"))
+BARCODE_BLOOM_MIN_CAPACITY = int(os.getenv("BARCODE_BLOOM_MIN_CAPACITY", "100000"))
+# Full reload interval; also picks up barcodes changed on existing products
+BARCODE_INDEX_REFRESH_INTERVAL = float(os.getenv("BARCODE_INDEX_REFRESH_INTERVAL", "300"))
+# How often a lookup first adds products inserted since the last sync (by other workers or the catalog importer)
+BARCODE_INDEX_SYNC_INTERVAL = float(os.getenv("BARCODE_INDEX_SYNC_INTERVAL", "5"))
+# A negative is only trusted this long after the last sync; past that, lookups fall through to the database
+BARCODE_NEGATIVE_TRUST_SECONDS = float(os.getenv("BARCODE_NEGATIVE_TRUST_SECONDS", "30"))
+BARCODE_DECODE_MAX_SIDE = int(os.getenv("BARCODE_DECODE_MAX_SIDE", "1600"))
+
+def normalize_barcode(code: str) -> str:
+    """Drop spaces and dashes, so '0 49000-00044 3' and '049000000443' match"""
+    return re.sub(r"[\s-]", "", code or "")
+
+def barcode_key(code: str) -> str:
+    """Canonical GTIN-14 form: UPC-A, EAN-13 and EAN-8 of the same item share one key"""
+    code = normalize_barcode(code)
+    if code.isdigit() and len(code) <= 14:
+        return code.zfill(14)
+    return code
+
+def barcode_variants(code: str) -> List[str]:
+    """Spellings a stored upc_barcode could use for the same item (zero-padded UPC/EAN lengths)"""
+    code = normalize_barcode(code)
+    if not code.isdigit() or len(code) > 14:
+        return [code]
+    stripped = code.lstrip("0") or "0"
+    return sorted({code} | {stripped.zfill(length) for length in (8, 12, 13, 14) if length >= len(stripped)})
+
+class BloomFilter:
+    """Fixed-size Bloom filter using double hashing over one blake2b digest"""
+
+    def __init__(self, capacity: int, error_rate: float = BARCODE_BLOOM_ERROR_RATE):
+        capacity = max(capacity, 1)
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str) -> Iterable[int]:
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+class BarcodeIndex:
+    """In-memory Bloom filter of known barcodes in front of the products.upc_barcode lookup.
+
+    A negative answer is definite, so scans of unknown barcodes never reach the
+    database. Products flushed in this worker are added immediately. Products
+    inserted elsewhere are added by a cheap sync of rows past the highest
+    product_id seen, at most every sync_interval seconds. If syncing stops (an
+    idle worker, a failing query), negatives older than negative_trust seconds
+    fall through to the database rather than 404 a product that exists.
+    """
+
+    def __init__(self, refresh_interval: float = BARCODE_INDEX_REFRESH_INTERVAL,
+                 sync_interval: float = BARCODE_INDEX_SYNC_INTERVAL,
+                 negative_trust: float = BARCODE_NEGATIVE_TRUST_SECONDS):
+        self.refresh_interval = refresh_interval
+        self.sync_interval = sync_interval
+        self.negative_trust = negative_trust
+        self.bloom: Optional[BloomFilter] = None
+        self.loaded_at = 0.0
+        self.synced_at = 0.0
+        self.max_product_id = 0
+        self.lock = threading.Lock()
+        self._loading = False
+        self._added_while_loading: Set[str] = set()
+        self._refresh_task: Optional[asyncio.Task] = None
+        self.lookups = 0
+        self.bloom_rejects = 0
+        self.untrusted_negatives = 0
+        self.synced_barcodes = 0
+        self.hits = 0
+
+    def load(self, db: Session) -> int:
+        """Rebuild the filter from the products table and swap it in"""
+        with self.lock:
+            self._loading = True
+            self._added_while_loading = set()
+        try:
+            # Taken before the scan: rows inserted during it are at worst added twice by the next sync
+            max_product_id = db.query(func.max(Product.product_id)).scalar() or 0
+            count = db.query(Product.upc_barcode).filter(Product.upc_barcode.isnot(None)).count()
+            bloom = BloomFilter(max(count * 2, BARCODE_BLOOM_MIN_CAPACITY))
+            for (code,) in db.query(Product.upc_barcode).filter(Product.upc_barcode.isnot(None)).yield_per(10000):
+                bloom.add(barcode_key(code))
+        finally:
+            with self.lock:
+                self._loading = False
+        with self.lock:
+            for key in self._added_while_loading:
+                bloom.add(key)
+            self.bloom = bloom
+            self.loaded_at = self.synced_at = time.monotonic()
+            self.max_product_id = max_product_id
+        print(f"Barcode index loaded with {bloom.count} barcodes")
+        return bloom.count
+
+    def add(self, codes: Iterable[str]):
+        with self.lock:
+            for code in codes:
+                key = barcode_key(code)
+                if self.bloom is not None:
+                    self.bloom.add(key)
+                if self._loading:
+                    self._added_while_loading.add(key)
+
+    def sync(self, db: Session) -> int:
+        """Add barcodes of products inserted since the last load or sync; an indexed range scan"""
+        after_id = self.max_product_id
+        rows = db.query(Product.product_id, Product.upc_barcode).filter(
+            Product.product_id > after_id
+        ).order_by(Product.product_id).all()
+        self.add(code for _, code in rows if code)
+        with self.lock:
+            if rows and self.max_product_id == after_id:
+                self.max_product_id = rows[-1].product_id
+            self.synced_at = time.monotonic()
+        self.synced_barcodes += len(rows)
+        return len(rows)
+
+    def needs_sync(self) -> bool:
+        return self.bloom is not None and time.monotonic() - self.synced_at > self.sync_interval
+
+    def is_stale(self) -> bool:
+        return self.bloom is None or time.monotonic() - self.loaded_at > self.refresh_interval
+
+    def refresh_in_background(self, session_factory: Callable[[], Session]):
+        """Reload the filter in a worker thread; lookups keep using the current one meanwhile"""
+        if self._refresh_task and not self._refresh_task.done():
+            return self._refresh_task
+
+        def reload():
+            db = session_factory()
+            try:
+                self.load(db)
+            finally:
+                db.close()
+
+        self._refresh_task = asyncio.get_running_loop().create_task(asyncio.to_thread(reload))
+        return self._refresh_task
+
+    def might_contain(self, code: str) -> bool:
+        # Until the first load finishes, fall through to the database rather than guess
+        return self.bloom is None or barcode_key(code) in self.bloom
+
+    def lookup(self, db: Session, code: str) -> Optional[Product]:
+        """Known product for a barcode, or None without a query when the filter rules it out"""
+        self.lookups += 1
+        if self.needs_sync():
+            try:
+                self.sync(db)
+            except Exception as e:
+                print(f"Warning: Barcode index sync failed: {e}")
+        if not self.might_contain(code):
+            if time.monotonic() - self.synced_at <= self.negative_trust:
+                self.bloom_rejects += 1
+                return None
+            self.untrusted_negatives += 1
+        product = db.query(Product).filter(Product.upc_barcode.in_(barcode_variants(code))).first()
+        if product:
+            self.hits += 1
+        return product
+
+    def stats(self) -> dict:
+        return {
+            "loaded": self.bloom is not None,
+            "barcodes": self.bloom.count if self.bloom else 0,
+            "filter_bytes": len(self.bloom.bits) if self.bloom else 0,
+            "lookups": self.lookups,
+            "bloom_rejects": self.bloom_rejects,
+            "untrusted_negatives": self.untrusted_negatives,
+            "synced_barcodes": self.synced_barcodes,
+            "seconds_since_sync": round(time.monotonic() - self.synced_at, 1) if self.bloom else None,
+            "hits": self.hits
+        }
+
+def decode_barcode(image_data: bytes) -> Optional[str]:
+    """First UPC/EAN barcode OpenCV can read from an image, or None"""
+    # OpenCV is only needed once an image arrives; keep it out of the API's import time
+    import cv2
+    import numpy as np
+
+    try:
+        image = cv2.imdecode(np.frombuffer(image_data, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+        if image is None:
+            return None
+        # Phone photos are far larger than a barcode needs; detection time grows with pixels
+        scale = BARCODE_DECODE_MAX_SIDE / max(image.shape)
+        if scale < 1:
+            image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        ok, decoded_info, _, _ = cv2.barcode.BarcodeDetector().detectAndDecodeMulti(image)
+        if ok:
+            for code in decoded_info:
+                if code:
+                    return code
+    except Exception as e:
+        print(f"Barcode decoding failed: {e}")
+    return None
+
+# Global barcode index instance
+barcode_index = BarcodeIndex()
+
+@event.listens_for(Session, "after_flush")
+def _add_flushed_barcodes(session, flush_context):
+    """New or re-barcoded products become visible to the filter without waiting for a reload"""
+    codes = [
+        obj.upc_barcode for obj in list(session.new) + list(session.dirty)
+        if isinstance(obj, Product) and obj.upc_barcode
+    ]
+    if codes:
+        barcode_index.add(codes)
@@ -0,0 +1,101 @@
+"""Concurrent request throughput with the sync Session vs the async session path.
+
+Each simulated request runs one deliberately slow query. A bench_sleep(ms) SQL
+function registered on every connection waits like a round trip to a busy
+database server. The sync handler blocks the event loop while the query runs;
+the async handler awaits it.
+
+Usage (from the backend directory):
+    python benchmarks/bench_async_db.py --requests 64 --concurrency 1 8 32
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from database import to_async_url
+
+SLOW_QUERY = "SELECT bench_sleep(:ms)"
+
+def bench_sleep(ms: float) -> int:
+    time.sleep(ms / 1000)
+    return 0
+
+def register_slow_function(sync_engine):
+    @event.listens_for(sync_engine, "connect")
+    def add_sleep_function(dbapi_connection, connection_record):
+        dbapi_connection.create_function("bench_sleep", 1, bench_sleep)
+
+async def run_load(handler, requests: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one_request():
+        async with semaphore:
+            start = time.perf_counter()
+            await handler()
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one_request() for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "requests_per_second": round(requests / elapsed, 1),
+        "p50_ms": round(latencies[len(latencies) // 2], 1),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1], 1),
+        "mean_ms": round(statistics.mean(latencies), 1)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--slow-ms", type=float, default=50, help="Duration of the slow query stand-in")
+    parser.add_argument("--database-url", default=f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_async.db')}")
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url)
+    async_engine = create_async_engine(to_async_url(args.database_url))
+    register_slow_function(engine)
+    register_slow_function(async_engine.sync_engine)
+    SyncSession = sessionmaker(bind=engine)
+    AsyncSession = async_sessionmaker(async_engine)
+    params = {"ms": args.slow_ms}
+
+    async def sync_handler():
+        # What the handlers did before: a blocking Session call inside `async def`
+        db = SyncSession()
+        try:
+            db.execute(text(SLOW_QUERY), params).scalar()
+        finally:
+            db.close()
+
+    async def async_handler():
+        async with AsyncSession() as db:
+            (await db.execute(text(SLOW_QUERY), params)).scalar()
+
+    async def run_all():
+        results = {}
+        for concurrency in args.concurrency:
+            results[f"concurrency_{concurrency}"] = {
+                "sync_session": await run_load(sync_handler, args.requests, concurrency),
+                "async_session": await run_load(async_handler, args.requests, concurrency)
+            }
+        await async_engine.dispose()
+        return results
+
+    print(json.dumps({"database_url": args.database_url, "slow_ms": args.slow_ms, **asyncio.run(run_all())}, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Hit latency of each cache tier, and shared-tier reads from several worker processes.
+
+Times get() on the in-process LRU, on the WAL-mode SQLite tier (memory tier
+emptied before every read), misses and set() for payloads shaped like OCR text,
+an analysis result and a research evidence entry. With --processes N the same
+shared-tier reads run in N processes at once, as uvicorn workers would.
+
+Usage (from the backend directory):
+    python benchmarks/bench_cache_tiers.py
+    python benchmarks/bench_cache_tiers.py --entries 5000 --processes 4 --path /dev/shm/bench-cache.sqlite3
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache_backend import MemoryTier, SQLiteTier, TieredCache
+
+PAYLOADS = {
+    "ocr_text": "INGREDIENTS: Carbonated Water, High Fructose Corn Syrup, Caramel Color, Phosphoric Acid, Natural Flavors, Caffeine " * 4,
+    "analysis": {
+        "score": 35,
+        "risk_ingredients": ["high fructose corn syrup", "phosphoric acid", "caramel color"],
+        "tags": ["High Sugar", "Ultra-Processed", "Contains Caffeine"],
+        "summary": "Sweetened soft drink with added phosphoric acid and caffeine. " * 3,
+        "recommendation": "Limit intake; choose unsweetened sparkling water instead. " * 2
+    },
+    "research_evidence": {
+        "evidence": {"health_effect": "metabolic", "evidence_level": "moderate", "summary": "Observational cohorts link intake to weight gain. " * 6},
+        "papers": [
+            {"title": f"Paper {i}", "authors": ["A. Author", "B. Author"], "abstract": "Abstract text. " * 60,
+             "published_date": "2023-01-01", "journal": "arXiv", "doi": None, "url": f"http://arxiv.org/abs/{i}", "relevance_score": 0.5}
+            for i in range(5)
+        ],
+        "updated_at": "2024-01-01T00:00:00"
+    }
+}
+
+def time_per_call(func, keys: list) -> dict:
+    """Microseconds per call over every key, as median and p99 of individual calls"""
+    samples = []
+    for key in keys:
+        start = time.perf_counter()
+        func(key)
+        samples.append((time.perf_counter() - start) * 1e6)
+    samples.sort()
+    return {
+        "median_us": round(statistics.median(samples), 2),
+        "p99_us": round(samples[min(len(samples) - 1, int(len(samples) * 0.99))], 2),
+        "calls": len(samples)
+    }
+
+def bench_payload(name: str, value, path: str, entries: int) -> dict:
+    shared = SQLiteTier(path, max_entries=entries * 4)
+    cache = TieredCache(f"bench_{name}", ttl=3600, memory=MemoryTier(entries), shared=shared)
+    keys = [f"{name}:{i}" for i in range(entries)]
+
+    results = {"set": time_per_call(lambda key: cache.set(key, value), keys)}
+    results["memory_hit"] = time_per_call(cache.get, keys)
+
+    def shared_hit(key):
+        cache.memory.clear()
+        cache.get(key)
+    results["shared_hit"] = time_per_call(shared_hit, keys)
+    results["miss"] = time_per_call(cache.get, [f"missing:{i}" for i in range(entries)])
+    results["payload_bytes"] = len(json.dumps(value))
+    return results
+
+def read_shared(args) -> float:
+    """Worker process: shared-tier hits per second over every key"""
+    path, namespace, keys = args
+    cache = TieredCache(namespace, ttl=3600, memory=MemoryTier(0), shared=SQLiteTier(path))
+    start = time.perf_counter()
+    for key in keys:
+        if cache.get(key) is None:
+            raise RuntimeError(f"Expected a shared-tier hit for {key}")
+    return len(keys) / (time.perf_counter() - start)
+
+def bench_processes(path: str, entries: int, processes: int) -> dict:
+    namespace = "bench_analysis"
+    keys = [f"analysis:{i}" for i in range(entries)]
+    # Spawn, like uvicorn --workers, so no worker inherits the parent's connection
+    with multiprocessing.get_context("spawn").Pool(processes) as pool:
+        rates = pool.map(read_shared, [(path, namespace, keys)] * processes)
+    return {
+        "processes": processes,
+        "reads_per_process": entries,
+        "per_process_reads_per_second": [round(rate) for rate in rates],
+        # Each worker times only its own reads, so process start-up is not counted
+        "aggregate_reads_per_second": round(sum(rates))
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, default=2000, help="Keys written and read per payload")
+    parser.add_argument("--processes", type=int, default=2, help="Concurrent shared-tier readers (0 to skip)")
+    parser.add_argument("--path", help="Shared-tier SQLite file (default: a new temporary file)")
+    args = parser.parse_args()
+
+    path = args.path or os.path.join(tempfile.mkdtemp(prefix="nutrisight-cache-"), "cache.sqlite3")
+    report = {"path": path, "payloads": {}}
+    for name, value in PAYLOADS.items():
+        report["payloads"][name] = bench_payload(name, value, path, args.entries)
+        tiers = report["payloads"][name]
+        print(f"{name:18s} memory {tiers['memory_hit']['median_us']:7.1f} us  shared {tiers['shared_hit']['median_us']:7.1f} us  "
+              f"miss {tiers['miss']['median_us']:7.1f} us  set {tiers['set']['median_us']:7.1f} us", file=sys.stderr)
+    if args.processes:
+        report["multi_process"] = bench_processes(path, args.entries, args.processes)
+
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Import-time budget for the API modules.
+
+Each sample imports the module in a fresh interpreter, so nothing is served from
+an already-warm sys.modules. The run fails (exit code 1) when the median import
+time exceeds the budget or when a heavy dependency that should load lazily
+(EasyOCR/torch, OpenAI, Stripe, arXiv, OpenCV) is imported eagerly.
+
+Usage (from the backend directory):
+    python benchmarks/bench_import_time.py
+    python benchmarks/bench_import_time.py --modules main database --budget 1.0 --repeat 7
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Loaded on first use; none of these may appear in sys.modules after importing the API
+LAZY_MODULES = ("easyocr", "torch", "openai", "stripe", "arxiv", "cv2")
+
+SAMPLE_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "eager": [name for name in {lazy!r} if name in sys.modules]}}))
+"""
+
+def sample_env(work_dir: str) -> dict:
+    env = dict(os.environ)
+    # Importing must not need a reachable database; point it at a throwaway file to be sure
+    env["DATABASE_URL"] = f"sqlite:///{os.path.join(work_dir, 'import.db')}"
+    return env
+
+def sample_import(module: str, env: dict) -> dict:
+    script = SAMPLE_SCRIPT.format(module=module, lazy=LAZY_MODULES)
+    result = subprocess.run([sys.executable, "-c", script], cwd=BACKEND_DIR, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr.strip()}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def slowest_imports(module: str, env: dict, limit: int) -> list:
+    """Top modules by cumulative import time, from python -X importtime"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=BACKEND_DIR, env=env, capture_output=True, text=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        try:
+            rows.append((int(cumulative), name.strip()))
+        except ValueError:
+            continue  # Header row
+    return [{"module": name, "cumulative_ms": round(micros / 1000, 1)} for micros, name in sorted(rows, reverse=True)[:limit]]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modules", nargs="+", default=["main"])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=1.5, help="Maximum median import time in seconds, per module")
+    parser.add_argument("--top", type=int, default=15, help="Slowest imports to list per module (0 to skip)")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="nutrisight-import-")
+    env = sample_env(work_dir)
+    # One untimed import so the timed samples start from compiled bytecode, as a deployed pod does
+    for module in args.modules:
+        sample_import(module, env)
+
+    report, failures = {}, []
+    for module in args.modules:
+        samples = [sample_import(module, env) for _ in range(args.repeat)]
+        seconds = [sample["seconds"] for sample in samples]
+        eager = sorted({name for sample in samples for name in sample["eager"]})
+        median = statistics.median(seconds)
+        report[module] = {
+            "median_seconds": round(median, 3),
+            "best_seconds": round(min(seconds), 3),
+            "budget_seconds": args.budget,
+            "eager_heavy_imports": eager
+        }
+        if args.top:
+            report[module]["slowest_imports"] = slowest_imports(module, env, args.top)
+        if median > args.budget:
+            failures.append(f"{module}: median import {median:.3f}s exceeds the {args.budget:.3f}s budget")
+        if eager:
+            failures.append(f"{module}: imports {', '.join(eager)} eagerly")
+        print(f"{module:20s} median {median:.3f}s  best {min(seconds):.3f}s", file=sys.stderr)
+
+    print(json.dumps({"modules": report, "failures": failures}, indent=2))
+    for failure in failures:
+        print(f"FAIL {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Memory high-water marks of the scan pipeline on the sample label photos.
+
+Each image is run through decode, barcode detection, OCR, ingredient parsing and
+rule-based analysis, optionally upscaled to mimic full-resolution phone photos.
+Per stage it reports the tracemalloc allocation peak (Python and numpy buffers)
+and the process RSS high-water mark, plus the resident cost of loading EasyOCR.
+
+Usage (from the backend directory):
+    python benchmarks/bench_memory.py --scales 1 2 4
+    python benchmarks/bench_memory.py --images ../test.jpg --skip-ocr
+"""
+import argparse
+import glob
+import io
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+
+from barcode_index import decode_barcode
+from ingredient_parser import parse_ingredients
+from memory_report import model_footprints, process_memory, record_model_footprint
+from scoring import fallback_analysis
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def measure(stages: dict, name: str, work):
+    tracemalloc.reset_peak()
+    start_traced = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    result = work()
+    elapsed = time.perf_counter() - start
+    memory = process_memory()
+    stages[name] = {
+        "seconds": round(elapsed, 4),
+        "traced_peak_bytes": tracemalloc.get_traced_memory()[1] - start_traced,
+        "rss_bytes": memory.get("rss_bytes"),
+        "peak_rss_bytes": memory.get("peak_rss_bytes")
+    }
+    return result
+
+def encode_scaled(path: str, scale: float) -> bytes:
+    image = Image.open(path).convert("RGB")
+    if scale != 1:
+        image = image.resize((int(image.width * scale), int(image.height * scale)))
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=90)
+    return buffer.getvalue()
+
+def run_scan(image_data: bytes, reader) -> dict:
+    stages = {}
+    image = measure(stages, "image_decode", lambda: Image.open(io.BytesIO(image_data)).convert("RGB"))
+    measure(stages, "barcode_decode", lambda: decode_barcode(image_data))
+    if reader is not None:
+        import numpy as np
+        pixels = np.asarray(image)
+        text = " ".join(measure(stages, "ocr", lambda: reader.readtext(pixels, detail=0)))
+    else:
+        text = "INGREDIENTS: Water, Sugar, Salt, Natural Flavors, Artificial Preservatives"
+    ingredients = measure(stages, "parse_ingredients", lambda: parse_ingredients(text))
+    measure(stages, "analysis", lambda: fallback_analysis(ingredients or ["water"]))
+    return {"width": image.width, "height": image.height, "ingredients": len(ingredients), "stages": stages}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--images", nargs="+", help="Label photos (default: the sample JPEGs in the repository root)")
+    parser.add_argument("--scales", nargs="+", type=float, default=[1.0, 2.0])
+    parser.add_argument("--skip-ocr", action="store_true", help="Do not load EasyOCR (decode, parse and analysis only)")
+    args = parser.parse_args()
+
+    images = args.images or sorted(glob.glob(os.path.join(REPO_ROOT, "*.jpg")))
+    if not images:
+        parser.error("No images given and no sample JPEGs found in the repository root")
+
+    baseline = process_memory()
+    reader = None
+    if not args.skip_ocr:
+        try:
+            import easyocr
+        except ImportError:
+            print("easyocr is not installed; skipping the OCR stage", file=sys.stderr)
+        else:
+            reader = record_model_footprint("easyocr", lambda: easyocr.Reader(['en'], verbose=False))
+
+    tracemalloc.start()
+    runs = []
+    for path in images:
+        for scale in args.scales:
+            image_data = encode_scaled(path, scale)
+            run = run_scan(image_data, reader)
+            run.update({"image": os.path.basename(path), "scale": scale, "upload_bytes": len(image_data)})
+            runs.append(run)
+            peaks = {name: stage["traced_peak_bytes"] for name, stage in run["stages"].items()}
+            print(f"{run['image']} x{scale} ({run['width']}x{run['height']}): traced peaks {peaks}", file=sys.stderr)
+    tracemalloc.stop()
+
+    stage_names = list(runs[0]["stages"]) if runs else []
+    print(json.dumps({
+        "baseline": baseline,
+        "models": model_footprints,
+        "final": process_memory(),
+        "max_traced_peak_bytes_by_stage": {
+            name: max(run["stages"][name]["traced_peak_bytes"] for run in runs if name in run["stages"])
+            for name in stage_names
+        },
+        "runs": runs
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""Compare the old LIKE product search with the full-text index on a synthetic catalog.
+
+Usage (from the backend directory):
+    python benchmarks/bench_product_search.py --products 1000000
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, insert, or_
+from sqlalchemy.orm import sessionmaker
+
+from models import Base, Product
+from product_search import ensure_search_index, full_text_search
+
+SYLLABLES = ["ka", "lo", "mi", "ra", "ven", "to", "sha", "dor", "bel", "qui", "no", "fa", "zu", "tri", "mon", "sel"]
+PRODUCT_TYPES = ["cola", "granola bar", "chocolate milk", "tomato soup", "crackers", "yogurt", "cereal", "lemonade",
+                 "peanut butter", "ice cream", "pasta sauce", "potato chips", "energy drink", "oatmeal", "salsa"]
+ADJECTIVES = ["classic", "organic", "light", "zero sugar", "crunchy", "creamy", "spicy", "original", "whole grain", "vanilla"]
+COMMON_INGREDIENTS = ["water", "sugar", "salt", "corn syrup", "citric acid", "natural flavors", "soybean oil",
+                      "wheat flour", "milk", "caramel color", "lecithin", "xanthan gum"]
+
+def make_vocabulary(rng: random.Random) -> dict:
+    """Thousands of brand names and rare ingredients so selectivity resembles a real catalog"""
+    def word(parts: int) -> str:
+        return "".join(rng.choice(SYLLABLES) for _ in range(parts))
+    return {
+        "brands": sorted({word(3) for _ in range(5000)}),
+        "rare_ingredients": sorted({f"{word(2)} extract" for _ in range(2000)})
+    }
+
+def build_catalog(engine, product_count: int, rng: random.Random, vocabulary: dict, batch_size: int = 50000) -> float:
+    Base.metadata.create_all(bind=engine)
+    ensure_search_index(engine)
+
+    start = time.perf_counter()
+    with engine.begin() as connection:
+        for offset in range(0, product_count, batch_size):
+            rows = []
+            for i in range(offset, min(offset + batch_size, product_count)):
+                name = f"{rng.choice(vocabulary['brands'])} {rng.choice(ADJECTIVES)} {rng.choice(PRODUCT_TYPES)}"
+                ingredients = rng.sample(COMMON_INGREDIENTS, rng.randint(2, 6))
+                ingredients += rng.sample(vocabulary["rare_ingredients"], rng.randint(0, 3))
+                rng.shuffle(ingredients)
+                rows.append({
+                    "name": name.title(),
+                    "upc_barcode": f"{i:013d}",
+                    "ingredients_text": ", ".join(ingredients),
+                    "ai_score": rng.randint(10, 95)
+                })
+            connection.execute(insert(Product), rows)
+    return time.perf_counter() - start
+
+def make_queries(rng: random.Random, vocabulary: dict, count: int = 20) -> dict:
+    brands = rng.sample(vocabulary["brands"], count)
+    return {
+        # Terms found in a large share of the catalog
+        "common": [rng.choice(PRODUCT_TYPES).split()[0] for _ in range(count)],
+        # A brand, optionally with a product type, or a brand prefix while typing
+        "selective": [f"{brand} {rng.choice(PRODUCT_TYPES)}" if i % 2 else brand[:5] for i, brand in enumerate(brands)],
+        # Nothing matches, the worst case for a substring scan
+        "miss": [f"quinoa{i}" for i in range(count)]
+    }
+
+def like_search(db, query: str, limit: int):
+    return db.query(Product).filter(
+        or_(Product.name.contains(query), Product.ingredients_text.contains(query))
+    ).limit(limit).all()
+
+def time_queries(search, db, queries: list, repeat: int, limit: int) -> dict:
+    latencies = []
+    for _ in range(repeat):
+        for query in queries:
+            start = time.perf_counter()
+            search(db, query, limit)
+            latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return {
+        "queries": len(latencies),
+        "mean_ms": round(statistics.mean(latencies), 3),
+        "p50_ms": round(latencies[len(latencies) // 2], 3),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1], 3),
+        "max_ms": round(latencies[-1], 3)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=1000000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--database", help="SQLite file to reuse (built if missing)")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    vocabulary = make_vocabulary(rng)
+    path = args.database or os.path.join(tempfile.mkdtemp(), "bench_search.db")
+    needs_build = not os.path.exists(path)
+    engine = create_engine(f"sqlite:///{path}")
+    build_seconds = build_catalog(engine, args.products, rng, vocabulary) if needs_build else None
+
+    db = sessionmaker(bind=engine)()
+    try:
+        results = {
+            "products": db.query(Product).count(),
+            "build_seconds": round(build_seconds, 2) if build_seconds is not None else None,
+            "queries": {}
+        }
+        for category, queries in make_queries(rng, vocabulary).items():
+            like = time_queries(like_search, db, queries, args.repeat, args.limit)
+            full_text = time_queries(full_text_search, db, queries, args.repeat, args.limit)
+            results["queries"][category] = {
+                "like": like,
+                "full_text": full_text,
+                "p50_speedup": round(like["p50_ms"] / max(full_text["p50_ms"], 1e-6), 1)
+            }
+    finally:
+        db.close()
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+"""Benchmark suite for the analysis hot paths, with baseline comparison.
+
+Covers OCR text correction and ingredient parsing on clean and garbled text, the
+rule-based scoring functions, find_existing_product against synthetic catalogs of
+increasing size, and POST /analyze end to end on the sample label photos with
+OCR and the LLM mocked out. Results are written as JSON; timings slower than the
+stored baseline by more than the threshold are flagged and fail the run.
+
+Timings depend on the machine, so no baseline is committed: capture one with
+--save-baseline on the machine (or CI runner) that will run the comparisons.
+Without a baseline nothing can regress; the run warns, or fails with --require-baseline.
+
+Usage (from the backend directory):
+    python benchmarks/run_benchmarks.py                      # run, compare with benchmarks/baseline.json
+    python benchmarks/run_benchmarks.py --save-baseline      # run and store the results as the new baseline
+    python benchmarks/run_benchmarks.py --require-baseline   # in CI: a missing baseline is an error
+    python benchmarks/run_benchmarks.py --quick --filter parse
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+from datetime import datetime
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Never let the suite touch a real database, and keep admission quotas from throttling the loop
+WORK_DIR = tempfile.mkdtemp(prefix="nutrisight-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(WORK_DIR, 'api.db')}"
+os.environ["ANALYZE_USER_RATE_PER_MINUTE"] = "1000000000"
+os.environ["ANALYZE_USER_BURST"] = "1000000000"
+# The host-shared cache file would carry results between runs; keep caching in-process only
+os.environ["CACHE_SHARED_PATH"] = ""
+
+from ingredient_parser import correct_ocr_errors, parse_ingredients
+from scoring import analyze_health_risks, fallback_analysis, get_nutritional_insights
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(os.path.dirname(BENCH_DIR))
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+DEFAULT_OUTPUT = os.path.join(BENCH_DIR, "results", "latest.json")
+SAMPLE_IMAGES = ["coca_cola_test.jpg", "test.jpg", "test_ingredients.jpg"]
+
+CLEAN_LABEL = (
+    "INGREDIENTS: Carbonated Water, High Fructose Corn Syrup, Caramel Color, Phosphoric Acid, "
+    "Natural Flavors, Caffeine. Nutrition Facts Serving Size 12 fl oz Sodium 45mg Total Carbohydrate 39g"
+)
+GARBLED_LABEL = (
+    "NUTRITION FACTS servmg size 12floz twalcambohydate 39g dben 0g cloredhel 0mg tans fat 0g usnurried "
+    "mamna 45mg amng cagumanduron INGREDIENTS: carbonated water, sucrose, caramel color, phosphoric acid, "
+    "natural flavors, caffeine wwwcoke com original formula concern ingredient analysis"
+)
+TYPICAL_INGREDIENTS = ["carbonated water", "high fructose corn syrup", "caramel color", "phosphoric acid",
+                       "natural flavors", "caffeine", "sodium benzoate", "red 40"]
+COMMON_INGREDIENTS = ["water", "sugar", "salt", "corn syrup", "citric acid", "natural flavors", "soybean oil",
+                      "wheat flour", "milk", "caramel color", "lecithin", "xanthan gum", "palm oil", "cocoa"]
+# What the mocked OCR "reads" from each sample photo
+MOCK_OCR_TEXT = {
+    "coca_cola_test.jpg": ["INGREDIENTS:", "Carbonated Water, Sucrose, Caramel Color,", "Phosphoric Acid, Natural Flavors, Caffeine"],
+    "test.jpg": ["Ingredients: Water, Sugar, Salt, Natural Flavors"],
+    "test_ingredients.jpg": ["INGREDIENTS: Whole Grain Oats, Sugar, Corn Syrup,", "Salt, Soybean Oil, Citric Acid, Lecithin"]
+}
+
+def time_callable(func, repeat: int, min_time: float) -> dict:
+    """Per-call time in microseconds: loops calibrated to last min_time, best and median of `repeat` runs"""
+    timer = timeit.Timer(func)
+    loops, _ = timer.autorange()
+    loops = max(1, int(loops * min_time / 0.2))
+    runs = [total / loops * 1e6 for total in timer.repeat(repeat=repeat, number=loops)]
+    return {"median_us": round(statistics.median(runs), 3), "best_us": round(min(runs), 3), "loops": loops, "repeats": repeat}
+
+def text_cases() -> dict:
+    return {
+        "correct_ocr_errors/clean": lambda: correct_ocr_errors(CLEAN_LABEL),
+        "correct_ocr_errors/garbled": lambda: correct_ocr_errors(GARBLED_LABEL),
+        "parse_ingredients/clean": lambda: parse_ingredients(CLEAN_LABEL),
+        "parse_ingredients/garbled": lambda: parse_ingredients(GARBLED_LABEL),
+        "analyze_health_risks": lambda: analyze_health_risks(TYPICAL_INGREDIENTS),
+        "get_nutritional_insights": lambda: get_nutritional_insights(TYPICAL_INGREDIENTS),
+        "fallback_analysis": lambda: fallback_analysis(TYPICAL_INGREDIENTS)
+    }
+
+def build_catalog(size: int, rng: random.Random):
+    """SQLite catalog of `size` products with similarity signatures; returns (session factory, sample ingredient lists)"""
+    from sqlalchemy import create_engine, insert
+    from sqlalchemy.orm import sessionmaker
+
+    from models import Base, Product
+    from product_index import index_products
+
+    engine = create_engine(f"sqlite:///{os.path.join(WORK_DIR, f'catalog_{size}.db')}")
+    Base.metadata.create_all(bind=engine)
+    rare = [f"extract {i}" for i in range(max(100, size // 10))]
+    samples = []
+    with engine.begin() as connection:
+        for offset in range(0, size, 10000):
+            products, indexed = [], []
+            for product_id in range(offset + 1, min(offset + 10000, size) + 1):
+                ingredients = rng.sample(COMMON_INGREDIENTS, rng.randint(2, 6)) + rng.sample(rare, rng.randint(1, 3))
+                products.append({"product_id": product_id, "name": f"Product {product_id}", "ingredients_text": ", ".join(ingredients)})
+                indexed.append((product_id, ingredients))
+                if len(samples) < 50 and rng.random() < 0.01:
+                    samples.append(ingredients)
+            connection.execute(insert(Product), products)
+            index_products(connection, indexed)
+    return sessionmaker(bind=engine), samples or [indexed[0][1]]
+
+def catalog_cases(sizes: list, rng: random.Random) -> dict:
+    from main import find_existing_product
+
+    cases = {}
+    for size in sizes:
+        start = time.perf_counter()
+        session_factory, samples = build_catalog(size, rng)
+        print(f"Built {size}-product catalog in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+        db = session_factory()
+        # Half the lookups are rescans of known products, half are unseen ingredient lists
+        queries = samples[:10] + [rng.sample(COMMON_INGREDIENTS, 4) + [f"novel {i}"] for i in range(10)]
+        state = {"i": 0}
+
+        def lookup(db=db, queries=queries, state=state):
+            state["i"] += 1
+            find_existing_product(db, queries[state["i"] % len(queries)], "")
+            db.expunge_all()
+
+        cases[f"find_existing_product/{size}"] = lookup
+    return cases
+
+def analyze_cases() -> dict:
+    """POST /analyze on each sample photo through the real app, with OCR and the LLM replaced by fakes"""
+    from fastapi.testclient import TestClient
+    import analysis_pipeline
+    import main
+
+    llm_reply = json.dumps({
+        "score": 42, "risk_ingredients": ["sucrose"], "tags": ["High Sugar"],
+        "summary": "Mocked analysis", "recommendation": "Mocked recommendation"
+    })
+
+    class MockReader:
+        def __init__(self):
+            self.lines = []
+
+        def readtext(self, path, detail=1):
+            return list(self.lines) if detail == 0 else [(None, line, 0.9) for line in self.lines]
+
+    reader = MockReader()
+    analysis_pipeline.get_ocr_reader = lambda: reader
+    mock_openai = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(
+        create=lambda **kwargs: SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=llm_reply))])
+    )))
+    analysis_pipeline.get_openai = lambda: mock_openai
+    # The client is not entered, so the startup hooks (and their background refreshes) never run
+    main.create_tables()
+    client = TestClient(main.app)
+
+    cases = {}
+    for name in SAMPLE_IMAGES:
+        path = os.path.join(REPO_ROOT, name)
+        if not os.path.exists(path):
+            print(f"Skipping {name}: not found", file=sys.stderr)
+            continue
+        with open(path, "rb") as f:
+            image_data = f.read()
+
+        def analyze(name=name, image_data=image_data):
+            # Time the full pipeline rather than OCR text and analysis cache hits
+            analysis_pipeline.ocr_text_cache.clear()
+            analysis_pipeline.analysis_cache.clear()
+            reader.lines = MOCK_OCR_TEXT[name]
+            response = client.post("/analyze", files={"file": (name, image_data, "image/jpeg")})
+            if response.status_code != 200:
+                raise RuntimeError(f"/analyze returned {response.status_code}: {response.text[:200]}")
+
+        cases[f"analyze_e2e/{name}"] = analyze
+    return cases
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=BENCH_DIR).stdout.strip()
+    except OSError:
+        return ""
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Benchmarks whose median got slower than the baseline by more than `threshold` (a fraction)"""
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get("results", {}).get(name)
+        if not before:
+            continue
+        change = result["median_us"] / before["median_us"] - 1
+        result["baseline_median_us"] = before["median_us"]
+        result["change"] = round(change, 4)
+        if change > threshold:
+            regressions.append(name)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filter", help="Only run benchmarks whose name contains this text")
+    parser.add_argument("--catalog-sizes", nargs="+", type=int, default=[1000, 10000, 100000])
+    parser.add_argument("--quick", action="store_true", help="Smaller catalogs and fewer repeats")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2, help="Seconds per timing run")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--threshold", type=float, default=0.2, help="Flag medians slower than baseline by this fraction")
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the baseline")
+    parser.add_argument("--require-baseline", action="store_true", help="Fail instead of warning when there is no baseline")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    if args.quick:
+        args.catalog_sizes = [size for size in args.catalog_sizes if size <= 10000] or [1000]
+        args.repeat = min(args.repeat, 3)
+        args.min_time = min(args.min_time, 0.1)
+
+    def wanted(prefix: str) -> bool:
+        return not args.filter or args.filter in prefix
+
+    rng = random.Random(args.seed)
+    results = {}
+    # The app logs every scan to stdout; keep that out of the timings and the report
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        cases = {name: case for name, case in text_cases().items() if wanted(name)}
+        if wanted("find_existing_product"):
+            cases.update(catalog_cases(args.catalog_sizes, rng))
+        if wanted("analyze_e2e"):
+            cases.update(analyze_cases())
+        cases = {name: case for name, case in cases.items() if wanted(name)}
+
+        for name, case in cases.items():
+            case()  # Warm up caches, lazy imports and compiled regexes
+            results[name] = time_callable(case, args.repeat, args.min_time)
+            print(f"{name:45s} {results[name]['median_us']:>12.1f} us", file=sys.stderr)
+
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    regressions = compare(results, baseline, args.threshold) if baseline else []
+    baseline_missing = not baseline and not args.save_baseline
+    if baseline_missing:
+        print(f"WARNING no baseline at {args.baseline}; regressions cannot be detected. "
+              f"Capture one with --save-baseline on this machine.", file=sys.stderr)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "threshold": args.threshold,
+            "baseline": args.baseline if baseline else None
+        },
+        "results": results,
+        "regressions": regressions
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved baseline to {args.baseline}", file=sys.stderr)
+
+    for name in regressions:
+        result = results[name]
+        print(f"REGRESSION {name}: {result['baseline_median_us']:.1f} -> {result['median_us']:.1f} us "
+              f"({result['change']:+.0%})", file=sys.stderr)
+    print(json.dumps({"output": args.output, "benchmarks": len(results), "regressions": regressions,
+                      "baseline_missing": baseline_missing}))
+    sys.exit(1 if regressions or (baseline_missing and args.require_baseline) else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+import json
+import os
+import sqlite3
+import stat
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from metrics import record_cache
+
+CACHE_MEMORY_ENTRIES = int(os.getenv("CACHE_MEMORY_ENTRIES", "1024"))
+# One SQLite file per host, shared by every uvicorn worker on it; set CACHE_SHARED_PATH empty to disable.
+# Kept in the app's own data directory: anyone who can write the file can feed every worker cached analyses.
+APP_DATA_DIR = os.getenv("APP_DATA_DIR", "data")
+CACHE_SHARED_PATH = os.getenv("CACHE_SHARED_PATH", os.path.join(APP_DATA_DIR, "nutrisight-cache.sqlite3"))
+CACHE_SHARED_MAX_ENTRIES = int(os.getenv("CACHE_SHARED_MAX_ENTRIES", "50000"))
+# Seconds a worker waits for another worker's write lock before treating the lookup as a miss
+CACHE_SHARED_BUSY_TIMEOUT = float(os.getenv("CACHE_SHARED_BUSY_TIMEOUT", "0.05"))
+ANALYSIS_CACHE_TTL = float(os.getenv("ANALYSIS_CACHE_TTL", str(24 * 3600)))
+OCR_TEXT_CACHE_TTL = float(os.getenv("OCR_TEXT_CACHE_TTL", str(7 * 24 * 3600)))
+RESEARCH_EVIDENCE_CACHE_TTL = float(os.getenv("RESEARCH_EVIDENCE_CACHE_TTL", str(3600)))
+# Shared-tier recency is only rewritten when older than this, so hits rarely need the write lock
+ACCESS_UPDATE_INTERVAL = 60.0
+PRUNE_EVERY_WRITES = 256
+
+def serialize(value: Any) -> str:
+    """Values are stored as compact JSON in both tiers, so every hit returns a fresh copy"""
+    return json.dumps(value, separators=(",", ":"), default=str)
+
+def deserialize(data: str) -> Any:
+    return json.loads(data)
+
+class MemoryTier:
+    """Bounded in-process LRU of serialized values with absolute (wall clock) expiry.
+
+    When full, expired entries are dropped first and only then the least recently used.
+    """
+
+    def __init__(self, max_entries: int = CACHE_MEMORY_ENTRIES):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[str, tuple]" = OrderedDict()
+        # Lower bound on the soonest expiry, so a full tier only scans for expired entries when one can exist
+        self.next_expiry = float("inf")
+        # OCR and analysis run in to_thread workers, so entries are touched off the event loop too
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, data: str, expires_at: float):
+        with self.lock:
+            self.entries[key] = (expires_at, data)
+            self.entries.move_to_end(key)
+            self.next_expiry = min(self.next_expiry, expires_at)
+            if len(self.entries) > self.max_entries:
+                self._drop_expired(time.time())
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def _drop_expired(self, now: float):
+        if now < self.next_expiry:
+            return
+        expired = [key for key, entry in self.entries.items() if entry[0] < now]
+        for key in expired:
+            del self.entries[key]
+        self.next_expiry = min((entry[0] for entry in self.entries.values()), default=float("inf"))
+
+    def delete(self, key: str):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.next_expiry = float("inf")
+
+class SQLiteTier:
+    """Host-shared tier: a WAL-mode SQLite file that every worker process reads and writes.
+
+    WAL lets readers proceed while one worker writes. Any SQLite error (a locked
+    file, a full disk) is logged and treated as a miss, so the cache can never fail
+    a request. Eviction is by expiry first, then least recently used. The file is
+    created owner-only; one owned by another user (or a symlink) disables the tier.
+    """
+
+    def __init__(self, path: str = CACHE_SHARED_PATH, max_entries: int = CACHE_SHARED_MAX_ENTRIES,
+                 busy_timeout: float = CACHE_SHARED_BUSY_TIMEOUT):
+        self.path = path
+        self.max_entries = max_entries
+        self.busy_timeout = busy_timeout
+        self.local = threading.local()
+        self.writes = 0
+        self.errors = 0
+        self.enabled: Optional[bool] = None
+
+    def available(self) -> bool:
+        """Whether the file is safe to use; checked once, and the tier stays off if it is not"""
+        if self.enabled is None:
+            try:
+                self.enabled = self._secure_path()
+            except OSError as e:
+                print(f"Warning: Shared cache {self.path} unusable ({e}), caching in memory only")
+                self.enabled = False
+        return self.enabled
+
+    def _secure_path(self) -> bool:
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        try:
+            os.close(os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o600))
+        except FileExistsError:
+            pass
+        # SQLite gives the WAL and shared-memory files the database file's permissions
+        for path in (self.path, self.path + "-wal", self.path + "-shm"):
+            try:
+                info = os.lstat(path)
+            except FileNotFoundError:
+                continue
+            if stat.S_ISLNK(info.st_mode) or info.st_uid != os.getuid():
+                print(f"Warning: Shared cache file {path} is a symlink or owned by another user, caching in memory only")
+                return False
+            if stat.S_IMODE(info.st_mode) & 0o077:
+                os.chmod(path, 0o600)
+        return True
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per thread and process; a forked worker must not reuse its parent's
+        connection = getattr(self.local, "connection", None)
+        if connection is not None and self.local.pid == os.getpid():
+            return connection
+        connection = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute("""
+            CREATE TABLE IF NOT EXISTS cache_entries (
+                namespace TEXT NOT NULL,
+                cache_key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (namespace, cache_key)
+            ) WITHOUT ROWID
+        """)
+        connection.execute("CREATE INDEX IF NOT EXISTS ix_cache_entries_accessed_at ON cache_entries (accessed_at)")
+        self.local.connection = connection
+        self.local.pid = os.getpid()
+        return connection
+
+    def _failed(self, action: str, error: Exception):
+        self.errors += 1
+        print(f"Warning: Shared cache {action} failed: {error}")
+
+    def get(self, namespace: str, key: str) -> Optional[tuple]:
+        """(data, expires_at) for a live entry, or None"""
+        try:
+            connection = self._connection()
+            row = connection.execute(
+                "SELECT value, expires_at, accessed_at FROM cache_entries WHERE namespace = ? AND cache_key = ?",
+                (namespace, key)
+            ).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            if row[1] < now:
+                connection.execute("DELETE FROM cache_entries WHERE namespace = ? AND cache_key = ?", (namespace, key))
+                return None
+            if now - row[2] > ACCESS_UPDATE_INTERVAL:
+                connection.execute(
+                    "UPDATE cache_entries SET accessed_at = ? WHERE namespace = ? AND cache_key = ?", (now, namespace, key)
+                )
+            return row[0], row[1]
+        except sqlite3.Error as e:
+            self._failed("read", e)
+            return None
+
+    def set(self, namespace: str, key: str, data: str, expires_at: float):
+        try:
+            connection = self._connection()
+            connection.execute(
+                "INSERT OR REPLACE INTO cache_entries (namespace, cache_key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (namespace, key, data, expires_at, time.time())
+            )
+            self.writes += 1
+            if self.writes % PRUNE_EVERY_WRITES == 0:
+                self.prune()
+        except sqlite3.Error as e:
+            self._failed("write", e)
+
+    def delete(self, namespace: str, key: str):
+        try:
+            self._connection().execute("DELETE FROM cache_entries WHERE namespace = ? AND cache_key = ?", (namespace, key))
+        except sqlite3.Error as e:
+            self._failed("delete", e)
+
+    def clear(self, namespace: str):
+        try:
+            self._connection().execute("DELETE FROM cache_entries WHERE namespace = ?", (namespace,))
+        except sqlite3.Error as e:
+            self._failed("clear", e)
+
+    def prune(self) -> int:
+        """Drop expired entries, then the least recently used ones beyond max_entries"""
+        try:
+            connection = self._connection()
+            removed = connection.execute("DELETE FROM cache_entries WHERE expires_at < ?", (time.time(),)).rowcount
+            excess = connection.execute("SELECT COUNT(*) FROM cache_entries").fetchone()[0] - self.max_entries
+            if excess > 0:
+                removed += connection.execute(
+                    "DELETE FROM cache_entries WHERE (namespace, cache_key) IN "
+                    "(SELECT namespace, cache_key FROM cache_entries ORDER BY accessed_at LIMIT ?)",
+                    (excess,)
+                ).rowcount
+            return removed
+        except sqlite3.Error as e:
+            self._failed("prune", e)
+            return 0
+
+    def entry_count(self, namespace: str) -> Optional[int]:
+        try:
+            return self._connection().execute("SELECT COUNT(*) FROM cache_entries WHERE namespace = ?", (namespace,)).fetchone()[0]
+        except sqlite3.Error as e:
+            self._failed("count", e)
+            return None
+
+class TieredCache:
+    """Read-through pair of tiers for one kind of value: this process's LRU, then the host-shared SQLite file.
+
+    A shared-tier hit is copied into the memory tier with the same expiry, so a
+    value never outlives its TTL by being promoted. Writes go to both tiers.
+    """
+
+    def __init__(self, namespace: str, ttl: float, memory: Optional[MemoryTier] = None, shared: Optional[SQLiteTier] = None):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.memory = memory or MemoryTier()
+        self.shared = shared
+        self.memory_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    def _shared(self) -> Optional[SQLiteTier]:
+        return self.shared if self.shared is not None and self.shared.available() else None
+
+    def get(self, key: str) -> Optional[Any]:
+        data = self.memory.get(key)
+        if data is not None:
+            self.memory_hits += 1
+            record_cache(self.namespace, "memory_hit")
+            return deserialize(data)
+        shared = self._shared()
+        if shared is not None:
+            entry = shared.get(self.namespace, key)
+            if entry is not None:
+                self.memory.set(key, entry[0], entry[1])
+                self.shared_hits += 1
+                record_cache(self.namespace, "shared_hit")
+                return deserialize(entry[0])
+        self.misses += 1
+        record_cache(self.namespace, "miss")
+        return None
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        data = serialize(value)
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        self.memory.set(key, data, expires_at)
+        shared = self._shared()
+        if shared is not None:
+            shared.set(self.namespace, key, data, expires_at)
+
+    def delete(self, key: str):
+        self.memory.delete(key)
+        shared = self._shared()
+        if shared is not None:
+            shared.delete(self.namespace, key)
+
+    def clear(self):
+        self.memory.clear()
+        shared = self._shared()
+        if shared is not None:
+            shared.clear(self.namespace)
+
+    def stats(self) -> dict:
+        total = self.memory_hits + self.shared_hits + self.misses
+        shared = self._shared()
+        return {
+            "ttl_seconds": self.ttl,
+            "memory_entries": len(self.memory.entries),
+            "memory_max_entries": self.memory.max_entries,
+            "shared_entries": shared.entry_count(self.namespace) if shared is not None else None,
+            "memory_hits": self.memory_hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.memory_hits + self.shared_hits) / total, 3) if total else 0.0
+        }
+
+# Global shared tier and the caches built on it
+shared_tier = SQLiteTier() if CACHE_SHARED_PATH else None
+analysis_cache = TieredCache("analysis", ANALYSIS_CACHE_TTL, shared=shared_tier)
+ocr_text_cache = TieredCache("ocr_text", OCR_TEXT_CACHE_TTL, shared=shared_tier)
+research_evidence_cache = TieredCache("research_evidence_tiered", RESEARCH_EVIDENCE_CACHE_TTL, shared=shared_tier)
+
+def cache_stats() -> dict:
+    stats = {cache.namespace: cache.stats() for cache in (analysis_cache, ocr_text_cache, research_evidence_cache)}
+    if shared_tier is not None:
+        stats["shared_tier"] = {
+            "path": shared_tier.path,
+            "enabled": shared_tier.available(),
+            "max_entries": shared_tier.max_entries,
+            "errors": shared_tier.errors
+        }
+    return stats
@@ -1,6 +1,8 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from models import Base
+from product_search import ensure_search_index
 import os
 
 # Database configuration
@@ -15,9 +17,82 @@ engine = create_engine(
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+def to_async_url(url: str) -> str:
+    """Map a sync DATABASE_URL onto its async driver (aiosqlite for SQLite, asyncpg for Postgres)"""
+    for prefix, async_prefix in (
+        ("sqlite:///", "sqlite+aiosqlite:///"),
+        ("postgresql+psycopg2://", "postgresql+asyncpg://"),
+        ("postgresql://", "postgresql+asyncpg://"),
+        ("postgres://", "postgresql+asyncpg://"),
+    ):
+        if url.startswith(prefix):
+            return async_prefix + url[len(prefix):]
+    return url
+
+# Async engine and session factory used by the FastAPI handlers
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", to_async_url(DATABASE_URL))
+async_engine = create_async_engine(ASYNC_DATABASE_URL)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+def add_missing_columns() -> set:
+    """Add model columns missing from existing tables (create_all only creates new tables); returns the (table, column) pairs added"""
+    inspector = inspect(engine)
+    added = set()
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+                    print(f"Added column {table.name}.{column.name}")
+                    added.add((table.name, column.name))
+    return added
+
 def create_tables():
     """Create all database tables"""
     Base.metadata.create_all(bind=engine)
+    added = add_missing_columns()
+    created_unique = ensure_rating_uniqueness()
+    if ("products", "rating_sum") in added or created_unique:
+        backfill_rating_sums()
+    ensure_search_index(engine)
+
+def ensure_rating_uniqueness() -> bool:
+    """Add the one-rating-per-user constraint to a user_ratings table created before it existed.
+
+    submit_rating relies on it to catch two concurrent first ratings. Duplicate
+    (product_id, user_id) rows are deleted first, keeping the latest (highest
+    rating_id). Returns True when the index had to be created.
+    """
+    name = "uq_user_ratings_product_user"
+    inspector = inspect(engine)
+    existing = {c["name"] for c in inspector.get_unique_constraints("user_ratings")}
+    existing |= {i["name"] for i in inspector.get_indexes("user_ratings") if i.get("unique")}
+    if name in existing:
+        return False
+    with engine.begin() as connection:
+        removed = connection.execute(text(
+            "DELETE FROM user_ratings WHERE rating_id NOT IN "
+            "(SELECT latest FROM (SELECT MAX(rating_id) AS latest FROM user_ratings GROUP BY product_id, user_id) AS latest_ratings)"
+        )).rowcount
+        connection.execute(text(f"CREATE UNIQUE INDEX IF NOT EXISTS {name} ON user_ratings (product_id, user_id)"))
+    print(f"Created {name}, removing {removed} duplicate ratings")
+    return True
+
+def backfill_rating_sums():
+    """Recompute the aggregates from user_ratings after a migration (a fresh NULL rating_sum, or removed duplicate ratings)"""
+    # Imported here: rating_aggregates pulls in the product cache, which database must not depend on at import
+    from rating_aggregates import reconcile_rating_aggregates
+
+    db = SessionLocal()
+    try:
+        report = reconcile_rating_aggregates(db, fix=True)
+        print(f"Backfilled rating aggregates for {report['products_drifted']} products")
+    finally:
+        db.close()
 
 def get_db():
     """Dependency to get database session"""
@@ -27,9 +102,12 @@ def get_db():
     finally:
         db.close()
 
-# Initialize database on import (with error handling)
-try:
+async def get_async_db():
+    """Dependency to get an async database session that does not block the event loop"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+if __name__ == "__main__":
+    # Schema setup as an explicit deploy step: python database.py
     create_tables()
     print("Database tables created successfully")
-except Exception as e:
-    print(f"Warning: Could not create database tables: {e}")
@@ -0,0 +1,89 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+DEADLINE_HEADER = "X-Deadline-Ms"
+SCAN_DEADLINE_SECONDS = float(os.getenv("SCAN_DEADLINE_SECONDS", "15"))
+SCAN_DEADLINE_MAX_SECONDS = float(os.getenv("SCAN_DEADLINE_MAX_SECONDS", "60"))
+# Longest image side OCR'd when the budget cannot cover a full-resolution pass
+DEADLINE_DOWNSCALE_MAX_SIDE = int(os.getenv("DEADLINE_DOWNSCALE_MAX_SIDE", "1024"))
+# Starting cost estimates (seconds) per stage, refined from observed timings
+STAGE_DEFAULT_ESTIMATES = {
+    "ocr_pass": float(os.getenv("DEADLINE_OCR_PASS_ESTIMATE", "3.0")),
+    "product_match": float(os.getenv("DEADLINE_PRODUCT_MATCH_ESTIMATE", "0.2")),
+    "llm": float(os.getenv("DEADLINE_LLM_ESTIMATE", "5.0"))
+}
+ESTIMATE_SMOOTHING = 0.2
+
+class Deadline:
+    """Time budget for one request plus the degradations applied to stay within it"""
+
+    def __init__(self, seconds: float):
+        self.budget = seconds
+        self.expires_at = time.monotonic() + seconds
+        self.degradations: List[str] = []
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+class StageEstimates:
+    """Smoothed duration of each stage, shared by all requests in the process"""
+
+    def __init__(self, defaults: Dict[str, float]):
+        self.lock = threading.Lock()
+        self.estimates = dict(defaults)
+
+    def get(self, stage: str) -> float:
+        return self.estimates.get(stage, 0.0)
+
+    def observe(self, stage: str, seconds: float):
+        with self.lock:
+            previous = self.estimates.get(stage, seconds)
+            self.estimates[stage] = previous + ESTIMATE_SMOOTHING * (seconds - previous)
+
+_current_deadline: ContextVar[Optional[Deadline]] = ContextVar("request_deadline", default=None)
+stage_estimates = StageEstimates(STAGE_DEFAULT_ESTIMATES)
+
+def start_deadline(header_value: Optional[str] = None) -> Deadline:
+    """Start the current request's deadline from the X-Deadline-Ms header, else SCAN_DEADLINE_SECONDS.
+
+    The deadline lives in a context variable, so stages running via asyncio.to_thread see it too.
+    """
+    seconds = SCAN_DEADLINE_SECONDS
+    if header_value:
+        try:
+            seconds = min(max(float(header_value) / 1000.0, 0.0), SCAN_DEADLINE_MAX_SECONDS)
+        except ValueError:
+            print(f"Ignoring invalid {DEADLINE_HEADER} header: {header_value!r}")
+    deadline = Deadline(seconds)
+    _current_deadline.set(deadline)
+    return deadline
+
+def remaining() -> Optional[float]:
+    """Seconds left for the current request, or None when it has no deadline"""
+    deadline = _current_deadline.get()
+    return deadline.remaining() if deadline else None
+
+def has_time_for(stage: str) -> bool:
+    """Whether the remaining budget covers the stage's estimated cost (always true without a deadline)"""
+    left = remaining()
+    return left is None or left >= stage_estimates.get(stage)
+
+def record_degradation(name: str):
+    deadline = _current_deadline.get()
+    if deadline is not None and name not in deadline.degradations:
+        deadline.degradations.append(name)
+
+def current_degradations() -> List[str]:
+    deadline = _current_deadline.get()
+    return list(deadline.degradations) if deadline else []
+
+@contextmanager
+def measure(stage: str):
+    """Time a stage and feed successful runs into its cost estimate"""
+    start = time.perf_counter()
+    yield
+    stage_estimates.observe(stage, time.perf_counter() - start)
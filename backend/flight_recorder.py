@@ -0,0 +1,162 @@
+import heapq
+import itertools
+import json
+import os
+import time
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+FLIGHT_RECORDER_TOP_N = int(os.getenv("FLIGHT_RECORDER_TOP_N", "20"))
+FLIGHT_RECORDER_WINDOW = int(os.getenv("FLIGHT_RECORDER_WINDOW", "3600"))
+# The window is tracked in this many slots; the slowest N are kept per slot, so memory is N x slots per endpoint
+FLIGHT_RECORDER_SLOTS = int(os.getenv("FLIGHT_RECORDER_SLOTS", "6"))
+FLIGHT_RECORDER_DUMP_DIR = os.getenv("FLIGHT_RECORDER_DUMP_DIR", "flight_recorder")
+MAX_STAGES_PER_TRACE = 64
+
+class RequestTrace:
+    """What one request did: stage timings plus notes such as image size or the analysis path taken"""
+    __slots__ = ("stages", "notes", "caches")
+
+    def __init__(self):
+        self.stages: List[list] = []
+        self.notes: Dict[str, Any] = {}
+        self.caches: Dict[str, str] = {}
+
+_current_trace: ContextVar[Optional[RequestTrace]] = ContextVar("flight_recorder_trace", default=None)
+
+def add_stage(name: str, seconds: float):
+    trace = _current_trace.get()
+    if trace is not None and len(trace.stages) < MAX_STAGES_PER_TRACE:
+        trace.stages.append([name, round(seconds * 1000, 2)])
+
+def note(key: str, value: Any):
+    """Attach a detail to the current request's trace (no-op outside a traced request)"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.notes[key] = value
+
+def note_cache(cache: str, result: str):
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.caches[cache] = result
+
+class FlightRecorder:
+    """Slowest requests per endpoint over a rolling window.
+
+    Requests are recorded by the ASGI middleware on the event loop thread, so the
+    per-slot heaps need no lock; a heap push or replace is the only work done for a
+    request that makes the cut, and a single comparison for one that does not.
+    """
+
+    def __init__(self, top_n: int = FLIGHT_RECORDER_TOP_N, window: int = FLIGHT_RECORDER_WINDOW, slots: int = FLIGHT_RECORDER_SLOTS):
+        self.top_n = top_n
+        self.window = window
+        self.slot_seconds = max(1.0, window / max(slots, 1))
+        # endpoint -> slot number -> min-heap of (duration_ms, seq, entry)
+        self.endpoints: Dict[str, Dict[int, list]] = {}
+        self.sequence = itertools.count()
+        self.recorded = 0
+
+    def record(self, endpoint: str, method: str, status: int, started: float, duration: float, trace: RequestTrace):
+        self.recorded += 1
+        slot = int(started // self.slot_seconds)
+        slots = self.endpoints.get(endpoint)
+        if slots is None:
+            slots = self.endpoints[endpoint] = {}
+        heap = slots.get(slot)
+        if heap is None:
+            heap = slots[slot] = []
+            oldest = slot - int(self.window // self.slot_seconds)
+            for expired in [s for s in slots if s < oldest]:
+                del slots[expired]
+
+        duration_ms = round(duration * 1000, 2)
+        if len(heap) >= self.top_n and duration_ms <= heap[0][0]:
+            return
+        entry = {
+            "endpoint": endpoint,
+            "method": method,
+            "status": status,
+            "started_at": datetime.fromtimestamp(started).isoformat(),
+            "duration_ms": duration_ms,
+            "stages": trace.stages,
+            "caches": trace.caches,
+            **trace.notes
+        }
+        item = (duration_ms, next(self.sequence), entry)
+        if len(heap) < self.top_n:
+            heapq.heappush(heap, item)
+        else:
+            heapq.heapreplace(heap, item)
+
+    def slowest(self, endpoint: Optional[str] = None, limit: Optional[int] = None) -> Dict[str, List[dict]]:
+        """Slowest requests within the window, per endpoint, slowest first"""
+        limit = limit or self.top_n
+        cutoff = time.time() - self.window
+        result = {}
+        for name, slots in list(self.endpoints.items()):
+            if endpoint and name != endpoint:
+                continue
+            items = [item for heap in list(slots.values()) for item in heap]
+            entries = [entry for _, _, entry in heapq.nlargest(limit, items)
+                       if datetime.fromisoformat(entry["started_at"]).timestamp() >= cutoff]
+            if entries:
+                result[name] = entries
+        return result
+
+    def dump_jsonl(self, directory: str = FLIGHT_RECORDER_DUMP_DIR) -> dict:
+        """Write the current slowest requests to a timestamped JSONL file, one request per line"""
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"slow-requests-{datetime.now().strftime('%Y%m%d-%H%M%S')}.jsonl")
+        count = 0
+        with open(path, "w") as f:
+            for entries in self.slowest().values():
+                for entry in entries:
+                    f.write(json.dumps(entry, default=str) + "\n")
+                    count += 1
+        return {"path": path, "requests": count}
+
+    def stats(self) -> dict:
+        return {
+            "top_n": self.top_n,
+            "window_seconds": self.window,
+            "slot_seconds": self.slot_seconds,
+            "requests_recorded": self.recorded,
+            "entries_held": sum(len(heap) for slots in self.endpoints.values() for heap in slots.values())
+        }
+
+# Global flight recorder instance
+flight_recorder = FlightRecorder()
+
+class FlightRecorderMiddleware:
+    """Plain ASGI middleware that traces each HTTP request and offers it to the flight recorder"""
+
+    def __init__(self, app, recorder: FlightRecorder = flight_recorder):
+        self.app = app
+        self.recorder = recorder
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace = RequestTrace()
+        token = _current_trace.set(trace)
+        status = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        started = time.time()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _current_trace.reset(token)
+            # Route templates keep the number of endpoints bounded (no per-id entries)
+            route = scope.get("route")
+            endpoint = getattr(route, "path", None) or "unmatched"
+            self.recorder.record(endpoint, scope["method"], status[0], started, time.perf_counter() - start, trace)
@@ -0,0 +1,274 @@
+import csv
+import gzip
+import json
+import os
+import sys
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from models import Ingredient, Product, ProductIngredient
+from product_cache import product_cache
+from product_index import canonicalize_ingredient, index_products, split_ingredients_text
+
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "2000"))
+# Ingredient name -> id lookups kept between chunks; cleared when it grows past this
+INGREDIENT_ID_CACHE_SIZE = 200000
+# Keeps IN (...) lists under SQLite's bound-parameter limit
+LOOKUP_BATCH_SIZE = 5000
+
+# Field names tried in order, covering our own schema and Open Food Facts dumps
+NAME_FIELDS = ["name", "product_name", "product_name_en", "generic_name"]
+BARCODE_FIELDS = ["upc_barcode", "barcode", "code", "upc", "ean"]
+INGREDIENT_FIELDS = ["ingredients_text", "ingredients_text_en", "ingredients"]
+
+def strip_gzip(path: str) -> str:
+    return path[:-3] if path.endswith(".gz") else path
+
+def open_text(path: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    return open(path, "r", encoding="utf-8", newline="")
+
+def detect_format(path: str) -> str:
+    name = strip_gzip(path)
+    if name.endswith((".jsonl", ".ndjson", ".json")):
+        return "jsonl"
+    if name.endswith((".tsv", ".csv")):
+        return "csv"
+    raise ValueError(f"Cannot tell the format of {path}, pass --format")
+
+def read_records(path: str, file_format: str, delimiter: Optional[str] = None) -> Iterator[dict]:
+    """Yield input records one at a time so memory stays flat regardless of file size"""
+    with open_text(path) as handle:
+        if file_format == "jsonl":
+            for line in handle:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+        else:
+            if delimiter is None:
+                delimiter = "\t" if strip_gzip(path).endswith(".tsv") else ","
+            csv.field_size_limit(sys.maxsize)
+            yield from csv.DictReader(handle, delimiter=delimiter)
+
+def first_field(record: dict, fields: List[str]) -> str:
+    for field in fields:
+        value = record.get(field)
+        if isinstance(value, list):
+            value = ", ".join(str(v) for v in value)
+        if value not in (None, ""):
+            return str(value).strip()
+    return ""
+
+def normalize_record(record: dict) -> Optional[dict]:
+    """Map an input record onto product columns plus its ordered, canonical ingredient list"""
+    name = first_field(record, NAME_FIELDS)
+    barcode = first_field(record, BARCODE_FIELDS)
+    if not name or not barcode:
+        return None
+
+    ingredients_text = first_field(record, INGREDIENT_FIELDS)
+    ingredients, seen = [], set()
+    for part in split_ingredients_text(ingredients_text):
+        canonical = canonicalize_ingredient(part)[:255]
+        if canonical and canonical not in seen:
+            seen.add(canonical)
+            ingredients.append(canonical)
+    return {
+        "name": name[:255],
+        "upc_barcode": barcode[:50],
+        "ingredients_text": ingredients_text,
+        "ingredients": ingredients
+    }
+
+def dialect_insert(db: Session):
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as upsert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as upsert
+    else:
+        raise ValueError(f"Bulk upserts are not supported on {dialect}")
+    return upsert
+
+class CatalogImporter:
+    """Upserts normalized catalog records chunk by chunk through Core bulk statements"""
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.upsert = dialect_insert(db)
+        self.ingredient_ids: Dict[str, int] = {}
+
+    def resolve_ingredient_ids(self, names: set) -> Dict[str, int]:
+        if len(self.ingredient_ids) > INGREDIENT_ID_CACHE_SIZE:
+            self.ingredient_ids.clear()
+        missing = [name for name in names if name not in self.ingredient_ids]
+        if missing:
+            connection = self.db.connection()
+            connection.execute(
+                self.upsert(Ingredient).on_conflict_do_nothing(index_elements=["standard_name"]),
+                [{"standard_name": name} for name in missing]
+            )
+            for offset in range(0, len(missing), LOOKUP_BATCH_SIZE):
+                batch = missing[offset:offset + LOOKUP_BATCH_SIZE]
+                for row in connection.execute(
+                    select(Ingredient.ingredient_id, Ingredient.standard_name).where(Ingredient.standard_name.in_(batch))
+                ):
+                    self.ingredient_ids[row.standard_name] = row.ingredient_id
+        return self.ingredient_ids
+
+    def import_chunk(self, records: List[dict]) -> Tuple[int, int]:
+        """Write one chunk in the current transaction and return (inserted, updated) counts"""
+        # Later rows for the same barcode win, as they would with row-at-a-time upserts
+        by_barcode = {record["upc_barcode"]: record for record in records}
+        barcodes = list(by_barcode)
+        connection = self.db.connection()
+
+        existing_ids = [
+            row.product_id for row in connection.execute(
+                select(Product.product_id).where(Product.upc_barcode.in_(barcodes))
+            )
+        ]
+        statement = self.upsert(Product)
+        connection.execute(
+            statement.on_conflict_do_update(
+                index_elements=["upc_barcode"],
+                set_={
+                    "name": statement.excluded.name,
+                    "ingredients_text": statement.excluded.ingredients_text,
+                    "updated_at": func.now()
+                }
+            ),
+            [
+                {"name": r["name"], "upc_barcode": r["upc_barcode"], "ingredients_text": r["ingredients_text"]}
+                for r in by_barcode.values()
+            ]
+        )
+        product_ids = {
+            row.upc_barcode: row.product_id for row in connection.execute(
+                select(Product.product_id, Product.upc_barcode).where(Product.upc_barcode.in_(barcodes))
+            )
+        }
+
+        ingredient_ids = self.resolve_ingredient_ids({name for r in by_barcode.values() for name in r["ingredients"]})
+        connection.execute(delete(ProductIngredient).where(ProductIngredient.product_id.in_(list(product_ids.values()))))
+        links = [
+            {"product_id": product_ids[barcode], "ingredient_id": ingredient_ids[name], "order_in_list": position}
+            for barcode, record in by_barcode.items()
+            for position, name in enumerate(record["ingredients"], start=1)
+        ]
+        if links:
+            connection.execute(insert(ProductIngredient), links)
+
+        index_products(connection, [(product_ids[barcode], r["ingredients"]) for barcode, r in by_barcode.items()])
+        product_cache.invalidate(self.db, existing_ids)
+        return len(by_barcode) - len(existing_ids), len(existing_ids)
+
+def load_checkpoint(path: str, source: str) -> int:
+    """Number of input rows already committed by a previous run of the same file"""
+    if not os.path.exists(path):
+        return 0
+    with open(path) as handle:
+        checkpoint = json.load(handle)
+    if checkpoint.get("source") != os.path.abspath(source):
+        raise ValueError(f"Checkpoint {path} belongs to {checkpoint.get('source')}, not {source}")
+    return checkpoint["rows_done"]
+
+def save_checkpoint(path: str, source: str, rows_done: int):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w") as handle:
+        json.dump({"source": os.path.abspath(source), "rows_done": rows_done, "saved_at": time.time()}, handle)
+    os.replace(temp_path, path)
+
+def import_catalog(
+    db: Session,
+    path: str,
+    file_format: Optional[str] = None,
+    delimiter: Optional[str] = None,
+    chunk_size: int = IMPORT_CHUNK_SIZE,
+    checkpoint_path: Optional[str] = None,
+    limit: Optional[int] = None
+) -> dict:
+    """Stream a CSV/JSONL dump into products, ingredients and product_ingredients.
+
+    Each chunk commits before the checkpoint advances. A crash replays at most one
+    chunk, and the upserts make that replay harmless.
+    """
+    importer = CatalogImporter(db)
+    rows_done = load_checkpoint(checkpoint_path, path) if checkpoint_path else 0
+    resumed_from = rows_done
+    stats = {"inserted": 0, "updated": 0, "skipped": 0}
+    chunk: List[dict] = []
+    chunk_rows = 0
+    start = time.perf_counter()
+
+    def flush():
+        nonlocal chunk, chunk_rows, rows_done
+        if chunk:
+            inserted, updated = importer.import_chunk(chunk)
+            stats["inserted"] += inserted
+            stats["updated"] += updated
+        db.commit()
+        rows_done += chunk_rows
+        if checkpoint_path:
+            save_checkpoint(checkpoint_path, path, rows_done)
+        elapsed = time.perf_counter() - start
+        print(f"{rows_done} rows ({(rows_done - resumed_from) / max(elapsed, 1e-9):.0f} rows/sec)")
+        chunk, chunk_rows = [], 0
+
+    for row_number, record in enumerate(read_records(path, file_format or detect_format(path), delimiter)):
+        if row_number < rows_done:
+            continue
+        if limit is not None and row_number >= resumed_from + limit:
+            break
+        chunk_rows += 1
+        normalized = normalize_record(record)
+        if normalized is None:
+            stats["skipped"] += 1
+        else:
+            chunk.append(normalized)
+        if chunk_rows >= chunk_size:
+            flush()
+    if chunk_rows:
+        flush()
+
+    elapsed = time.perf_counter() - start
+    processed = rows_done - resumed_from
+    return {
+        "source": path,
+        "resumed_from_row": resumed_from,
+        "rows_processed": processed,
+        **stats,
+        "seconds": round(elapsed, 2),
+        "rows_per_second": round(processed / elapsed, 1) if elapsed else 0.0
+    }
+
+if __name__ == "__main__":
+    import argparse
+    from database import SessionLocal, create_tables
+
+    parser = argparse.ArgumentParser(description="Bulk import products and ingredients from a CSV or JSONL dump")
+    parser.add_argument("path", help="CSV, TSV or JSONL file, optionally gzipped")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="Input format (default: from the file extension)")
+    parser.add_argument("--delimiter", help="CSV delimiter (default: tab for .tsv, comma otherwise)")
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE, help="Rows per transaction")
+    parser.add_argument("--checkpoint", help="Checkpoint file; an existing one resumes the import where it stopped")
+    parser.add_argument("--limit", type=int, help="Stop after this many input rows")
+    args = parser.parse_args()
+
+    create_tables()
+    db = SessionLocal()
+    try:
+        print(json.dumps(import_catalog(
+            db, args.path,
+            file_format=args.format,
+            delimiter=args.delimiter,
+            chunk_size=args.chunk_size,
+            checkpoint_path=args.checkpoint,
+            limit=args.limit
+        ), indent=2))
+    finally:
+        db.close()
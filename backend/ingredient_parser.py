@@ -0,0 +1,125 @@
+import json
+import re
+from typing import Optional
+
+# Bump whenever correct_ocr_errors or parse_ingredients changes; stored OCR text is then
+# re-parsed by `python reprocess_submissions.py` instead of running OCR again
+PARSER_VERSION = 1
+
+def correct_ocr_errors(text: str) -> str:
+    """Correct common OCR spelling mistakes in food labels"""
+    corrections = {
+        # Common OCR mistakes
+        'twalcambohydate': 'total carbohydrate',
+        'dben': 'fiber',
+        'cloredhel': 'cholesterol',
+        'usnurried': 'unsaturated',
+        'tans fat': 'trans fat',
+        'mamna': 'sodium',
+        'amng': 'among',
+        'cagumanduron': 'carbohydrates',
+        'wwwcoke com': 'www.coke.com',
+        'floz': 'fl oz',
+        'mg': 'mg',
+        '%': '%',
+        'natural sodium': 'sodium',
+        'phosphoric acid': 'phosphoric acid',
+        'caramel color': 'caramel color',
+        'natural flavors': 'natural flavors',
+        'artificial flavors': 'artificial flavors',
+        'caffeine': 'caffeine',
+        'sucrose': 'sucrose',
+        'dietary fiber': 'dietary fiber',
+        'original formula': 'original formula',
+        'concern': '',  # Remove concern labels
+        'ingredient analysis': '',  # Remove headers
+        'nutrition facts': '',  # Remove headers
+        'serving size': '',  # Remove headers
+    }
+    
+    corrected_text = text.lower()
+    for mistake, correction in corrections.items():
+        corrected_text = corrected_text.replace(mistake, correction)
+    
+    # Clean up extra spaces and remove empty lines
+    corrected_text = re.sub(r'\s+', ' ', corrected_text)
+    corrected_text = re.sub(r'\n\s*\n', '\n', corrected_text)
+    
+    return corrected_text.strip()
+
+def parse_ingredients(text: str) -> list[str]:
+    """Extract ingredient list from OCR text with improved error correction"""
+    # First correct common OCR errors
+    corrected_text = correct_ocr_errors(text)
+    
+    # Look for common food ingredients in the corrected text
+    common_ingredients = [
+        'sucrose', 'sugar', 'caramel color', 'phosphoric acid', 'sodium',
+        'natural flavors', 'artificial flavors', 'caffeine', 'water',
+        'dietary fiber', 'cholesterol', 'trans fat', 'unsaturated fat',
+        'total carbohydrate', 'carbohydrates', 'protein', 'vitamins',
+        'phosphoric acid', 'natural sodium', 'flavors', 'salt', 'corn syrup',
+        'high fructose corn syrup', 'citric acid', 'ascorbic acid', 'vitamin c',
+        'calcium', 'iron', 'zinc', 'potassium', 'magnesium', 'fiber',
+        'starch', 'modified starch', 'lecithin', 'glycerin', 'xanthan gum',
+        'guar gum', 'carrageenan', 'baking soda', 'baking powder', 'yeast',
+        'milk', 'cream', 'butter', 'cheese', 'eggs', 'wheat', 'flour',
+        'rice', 'oats', 'barley', 'soy', 'soybean', 'canola oil', 'vegetable oil',
+        'palm oil', 'coconut oil', 'olive oil', 'sunflower oil', 'corn oil'
+    ]
+    
+    ingredients = []
+    corrected_lower = corrected_text.lower()
+    
+    # Check for each common ingredient
+    for ingredient in common_ingredients:
+        if ingredient in corrected_lower:
+            ingredients.append(ingredient)
+    
+    # If we found ingredients, return them
+    if ingredients:
+        return ingredients[:20]
+    
+    # For garbled OCR text, try to find recognizable patterns
+    # Look for words that might be ingredients even if partially garbled
+    words = corrected_text.lower().split()
+    potential_ingredients = []
+    
+    for word in words:
+        # Clean the word
+        clean_word = re.sub(r'[^a-zA-Z]', '', word)
+        
+        # Skip very short words or numbers
+        if len(clean_word) < 3 or re.match(r'^\d+$', clean_word):
+            continue
+            
+        # Check if this word is similar to known ingredients
+        for known_ingredient in common_ingredients:
+            if (clean_word in known_ingredient or 
+                known_ingredient in clean_word or
+                # Check for partial matches (at least 4 characters)
+                (len(clean_word) >= 4 and any(clean_word[i:i+4] in known_ingredient for i in range(len(clean_word)-3)))):
+                potential_ingredients.append(known_ingredient)
+                break
+    
+    # Remove duplicates and return
+    unique_ingredients = list(set(potential_ingredients))
+    
+    # If still no ingredients found, try to extract any meaningful words
+    if not unique_ingredients:
+        meaningful_words = []
+        for word in words:
+            clean_word = re.sub(r'[^a-zA-Z]', '', word)
+            if len(clean_word) >= 4 and not re.match(r'^(ingredients|nutrition|facts|serving|size|calories|total|daily|value|percent|mg|g|ml|oz|fl)$', clean_word):
+                meaningful_words.append(clean_word)
+        
+        unique_ingredients = meaningful_words[:10]  # Limit to 10 most likely ingredients
+    
+    return unique_ingredients[:20]  # Limit to first 20 ingredients
+
+def derive_ingredient_fields(extracted_text: Optional[str]) -> dict:
+    """Columns derived from raw OCR text, stamped with the parser version that produced them"""
+    return {
+        "parsed_ingredients": json.dumps(parse_ingredients(extracted_text)) if extracted_text else None,
+        "parser_version": PARSER_VERSION
+    }
@@ -0,0 +1,165 @@
+import json
+import os
+import random
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from sqlalchemy import and_, delete, func, or_
+from sqlalchemy.orm import Session
+
+from models import Job
+
+JOB_VISIBILITY_TIMEOUT = int(os.getenv("JOB_VISIBILITY_TIMEOUT", "300"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+JOB_RETRY_BASE_DELAY = float(os.getenv("JOB_RETRY_BASE_DELAY", "10"))
+JOB_RETRY_MAX_DELAY = float(os.getenv("JOB_RETRY_MAX_DELAY", "3600"))
+JOB_RETENTION = timedelta(days=int(os.getenv("JOB_RETENTION_DAYS", "7")))
+MAX_CLAIM_ATTEMPTS = 5
+
+def enqueue(db: Session, queue: str, payload: Dict[str, Any], max_attempts: int = JOB_MAX_ATTEMPTS) -> Job:
+    """Add a job to the caller's transaction, so it is durable exactly when the caller commits"""
+    now = datetime.utcnow()
+    job = Job(
+        queue=queue,
+        payload=json.dumps(payload),
+        status="pending",
+        attempts=0,
+        max_attempts=max_attempts,
+        available_at=now,
+        created_at=now
+    )
+    db.add(job)
+    return job
+
+def _claimable(now: datetime):
+    """Ready pending jobs, plus running jobs whose worker let the visibility timeout lapse"""
+    return and_(
+        Job.attempts < Job.max_attempts,
+        or_(
+            and_(Job.status == "pending", Job.available_at <= now),
+            and_(Job.status == "running", Job.locked_until < now)
+        )
+    )
+
+def claim(db: Session, queue: str, worker_id: str, visibility_timeout: int = JOB_VISIBILITY_TIMEOUT) -> Optional[Job]:
+    """Lease the oldest claimable job to this worker, or None when the queue is idle.
+
+    The lease is a compare-and-set UPDATE, so concurrent workers never both win
+    a job and no database-specific row locking is needed.
+    """
+    for _ in range(MAX_CLAIM_ATTEMPTS):
+        now = datetime.utcnow()
+        candidate = db.query(Job.job_id).filter(Job.queue == queue, _claimable(now)).order_by(
+            Job.available_at, Job.job_id
+        ).first()
+        if candidate is None:
+            db.rollback()
+            return None
+        claimed = db.query(Job).filter(Job.job_id == candidate.job_id, _claimable(now)).update({
+            Job.status: "running",
+            Job.locked_by: worker_id,
+            Job.locked_until: now + timedelta(seconds=visibility_timeout),
+            Job.attempts: Job.attempts + 1,
+            Job.started_at: now
+        }, synchronize_session=False)
+        db.commit()
+        if claimed:
+            return db.get(Job, candidate.job_id, populate_existing=True)
+    return None
+
+def _owned(job: Job, worker_id: str):
+    return and_(Job.job_id == job.job_id, Job.status == "running", Job.locked_by == worker_id)
+
+def complete(db: Session, job: Job, worker_id: str) -> bool:
+    """Mark a job done in the caller's transaction; False if the lease was lost to another worker"""
+    return bool(db.query(Job).filter(_owned(job, worker_id)).update({
+        Job.status: "done",
+        Job.locked_until: None,
+        Job.finished_at: datetime.utcnow(),
+        Job.last_error: None
+    }, synchronize_session=False))
+
+def retry_delay(attempts: int) -> float:
+    """Exponential backoff with jitter: base, 2x base, 4x base, ... up to the cap"""
+    delay = min(JOB_RETRY_BASE_DELAY * (2 ** max(attempts - 1, 0)), JOB_RETRY_MAX_DELAY)
+    return delay * random.uniform(0.8, 1.2)
+
+def fail(db: Session, job: Job, worker_id: str, error: str) -> bool:
+    """Schedule a retry with backoff, or mark the job failed once its attempts are used up"""
+    now = datetime.utcnow()
+    exhausted = job.attempts >= job.max_attempts
+    updated = db.query(Job).filter(_owned(job, worker_id)).update({
+        Job.status: "failed" if exhausted else "pending",
+        Job.locked_by: None,
+        Job.locked_until: None,
+        Job.available_at: now if exhausted else now + timedelta(seconds=retry_delay(job.attempts)),
+        Job.finished_at: now if exhausted else None,
+        Job.last_error: error[:4000]
+    }, synchronize_session=False)
+    db.commit()
+    return bool(updated)
+
+def fail_abandoned(db: Session) -> int:
+    """Fail running jobs whose lease expired on their final attempt (e.g. the worker kept crashing)"""
+    updated = db.query(Job).filter(
+        Job.status == "running",
+        Job.locked_until < datetime.utcnow(),
+        Job.attempts >= Job.max_attempts
+    ).update({
+        Job.status: "failed",
+        Job.finished_at: datetime.utcnow(),
+        Job.last_error: "Visibility timeout expired on the final attempt"
+    }, synchronize_session=False)
+    db.commit()
+    return updated
+
+def purge_finished(db: Session, retention: timedelta = JOB_RETENTION) -> int:
+    deleted = db.execute(delete(Job).where(
+        Job.status.in_(["done", "failed"]),
+        Job.finished_at < datetime.utcnow() - retention
+    )).rowcount
+    db.commit()
+    return deleted
+
+def queue_depths(db: Session) -> Dict[str, int]:
+    """Pending jobs per queue; a single grouped count, cheap enough for every metrics scrape"""
+    return dict(db.query(Job.queue, func.count()).filter(Job.status == "pending").group_by(Job.queue).all())
+
+def queue_stats(db: Session) -> Dict[str, dict]:
+    """Per-queue depth, lag and throughput"""
+    now = datetime.utcnow()
+    stats: Dict[str, dict] = {}
+
+    for queue, status, count in db.query(Job.queue, Job.status, func.count()).group_by(Job.queue, Job.status):
+        stats.setdefault(queue, {"pending": 0, "running": 0, "done": 0, "failed": 0})[status] = count
+
+    for row in db.query(
+        Job.queue,
+        func.count().label("ready"),
+        func.min(Job.available_at).label("oldest_ready")
+    ).filter(Job.status == "pending", Job.available_at <= now).group_by(Job.queue):
+        stats[row.queue]["ready"] = row.ready
+        stats[row.queue]["lag_seconds"] = round((now - row.oldest_ready).total_seconds(), 1)
+
+    last_minute = now - timedelta(minutes=1)
+    durations: Dict[str, list] = {}
+    waits: Dict[str, list] = {}
+    completed_last_minute: Dict[str, int] = {}
+    for queue, finished_at, started_at, created_at in db.query(
+        Job.queue, Job.finished_at, Job.started_at, Job.created_at
+    ).filter(Job.status == "done", Job.finished_at >= now - timedelta(hours=1)):
+        durations.setdefault(queue, []).append((finished_at - started_at).total_seconds())
+        waits.setdefault(queue, []).append((started_at - created_at).total_seconds())
+        if finished_at >= last_minute:
+            completed_last_minute[queue] = completed_last_minute.get(queue, 0) + 1
+
+    for queue, entry in stats.items():
+        entry.setdefault("ready", 0)
+        entry.setdefault("lag_seconds", 0.0)
+        queue_durations = durations.get(queue, [])
+        queue_waits = waits.get(queue, [])
+        entry["completed_last_minute"] = completed_last_minute.get(queue, 0)
+        entry["completed_last_hour"] = len(queue_durations)
+        entry["avg_processing_seconds"] = round(sum(queue_durations) / len(queue_durations), 2) if queue_durations else None
+        entry["avg_wait_seconds"] = round(sum(queue_waits) / len(queue_waits), 2) if queue_waits else None
+    return stats
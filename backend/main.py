@@ -1,10 +1,11 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, Depends, Query, Request
+from fastapi import FastAPI, File, Form, UploadFile, HTTPException, Depends, Query, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import func, or_, and_
-import easyocr
-import openai
+from sqlalchemy import func, or_, and_, select
+import asyncio
 import os
 import io
 from PIL import Image
@@ -14,12 +15,33 @@ import re
 from typing import List, Optional
 from datetime import datetime
 import uuid
-import stripe
 
 # Import database and models
-from database import get_db, create_tables
+from admin_auth import require_admin
+from admission import FULL, admission_stats, analyze_admission, premium_admission, requester_key
+from analysis_pipeline import ANALYZER_VERSION, LLMAnalysisFailed, analyze_with_ai, build_analysis_result, cached_label_text, get_ocr_reader, note_llm_fallback
+from analysis_snapshots import read_snapshot, refresh_snapshot_in_background, store_snapshot
+from barcode_index import barcode_index, decode_barcode
+from cache_backend import cache_stats
+from database import SessionLocal, get_async_db, create_tables
+from deadline import DEADLINE_HEADER, current_degradations, has_time_for, measure, record_degradation, start_deadline
+from flight_recorder import FlightRecorderMiddleware, flight_recorder, note
 from models import Product, Ingredient, ProductIngredient, User, UserRating, ProductSubmission, SubmissionStatus
+from premium_jobs import JobCapacityExceeded, premium_jobs
+from product_cache import product_cache
+from product_index import find_similar_products, split_ingredients_text
+from product_search import full_text_search
+from profiling import ProfilingMiddleware
+from ingredient_parser import parse_ingredients
+from job_queue import enqueue, queue_depths, queue_stats
+from memory_report import memory_report, start_tracing, stop_tracing
+from metrics import CONTENT_TYPE, InFlightMiddleware, in_flight, ocr_fallbacks, queue_depth, record_cache, registry, stage
+from rating_aggregates import submit_rating
+from scoring import HealthRisk, analyze_health_risks, fallback_analysis, get_nutritional_insights
+from submission_worker import SUBMISSION_QUEUE
+from upload_storage import StorageQuotaExceeded, upload_storage
 from research_service import research_service
+from research_scheduler import research_prefetch_scheduler
 # from ai_service import ai_service
 
 # Load environment variables
@@ -46,24 +68,12 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(InFlightMiddleware)
+app.add_middleware(FlightRecorderMiddleware)
+app.add_middleware(ProfilingMiddleware)
 
-# Initialize EasyOCR reader (lazy loading to avoid startup issues)
-reader = None
-
-# Initialize OpenAI client
-openai.api_key = os.getenv("OPENAI_API_KEY")
-
-def get_ocr_reader():
-    global reader
-    if reader is None:
-        reader = easyocr.Reader(['en'])
-    return reader
-
-class HealthRisk(BaseModel):
-    risk_type: str
-    severity: str  # low, medium, high
-    description: str
-    affected_ingredients: list[str]
+# Create the schema on startup; deployments that run `python database.py` as a migration step can turn this off
+CREATE_TABLES_ON_STARTUP = os.getenv("CREATE_TABLES_ON_STARTUP", "true").lower() == "true"
 
 class AnalysisResult(BaseModel):
     score: int
@@ -78,6 +88,8 @@ class AnalysisResult(BaseModel):
     is_existing_product: bool = False
     avg_user_rating: Optional[float] = None
     total_ratings: Optional[int] = None
+    barcode: Optional[str] = None
+    degradations: list[str] = []  # Cheaper strategies applied to meet the request deadline or shed load
 
 class ProductSubmissionRequest(BaseModel):
     product_name: str
@@ -94,6 +106,23 @@ class ProductSearchRequest(BaseModel):
     query: str
     limit: int = 10
 
+@app.on_event("startup")
+async def start_background_services():
+    if CREATE_TABLES_ON_STARTUP:
+        try:
+            await asyncio.to_thread(create_tables)
+            print("Database tables created successfully")
+        except Exception as e:
+            print(f"Warning: Could not create database tables: {e}")
+    research_prefetch_scheduler.start()
+    barcode_index.refresh_in_background(SessionLocal)
+    research_service.warm_index()
+
+@app.on_event("shutdown")
+async def stop_background_services():
+    await research_prefetch_scheduler.stop()
+    premium_jobs.shutdown()
+
 @app.get("/health")
 async def health_check():
     return {"status": "healthy", "message": "NutriSight API is running"}
@@ -102,80 +131,160 @@ async def health_check():
 async def root():
     return {"message": "NutriSight API", "version": "1.0.0", "docs": "/docs"}
 
-@app.post("/premium-analyze")
-async def premium_analyze_ingredients(file: UploadFile = File(...), health_profile: str = None):
-    """Premium AI analysis with comprehensive insights - requires subscription"""
-    try:
-        # Validate file
-        if not file.content_type or not file.content_type.startswith('image/'):
-            raise HTTPException(status_code=400, detail="File must be an image")
-        
-        if file.size == 0:
-            raise HTTPException(status_code=400, detail="File is empty")
-        
-        # Read and process image
-        image_data = await file.read()
+def run_premium_analysis(image_data: bytes, health_profile: Optional[str] = None, use_ai: bool = True) -> dict:
+    """OCR an image and run the comprehensive AI analysis (blocking; run off the event loop for jobs)"""
+    with stage("image_decode"):
         image = Image.open(io.BytesIO(image_data))
         
         # Convert to RGB if necessary
         if image.mode != 'RGB':
             image = image.convert('RGB')
         
+        note("image_size", list(image.size))
+        
         # Save to temporary file for OCR
         temp_path = f"/tmp/temp_image_{uuid.uuid4().hex}.jpg"
         image.save(temp_path, "JPEG")
-        
-        # Perform OCR
-        try:
-            reader = get_ocr_reader()
+    
+    # Perform OCR
+    try:
+        reader = get_ocr_reader()
+        with stage("ocr"):
             results = reader.readtext(temp_path)
-            print(f"OCR successful, found {len(results)} text regions")
-        except Exception as ocr_error:
-            print(f"OCR failed: {ocr_error}")
-            results = [(None, "INGREDIENTS: Water, Sugar, Salt, Natural Flavors", None)]
-        
-        # Clean up temporary file
-        import os
-        try:
-            os.remove(temp_path)
-        except:
-            pass
-        
-        # Extract and parse ingredients
-        extracted_text = " ".join([result[1] for result in results])
+        print(f"OCR successful, found {len(results)} text regions")
+        note("ocr_regions", len(results))
+        note("ocr_path", "single_pass")
+    except Exception as ocr_error:
+        print(f"OCR failed: {ocr_error}")
+        ocr_fallbacks.inc("error")
+        note("ocr_path", "fallback_error")
+        results = [(None, "INGREDIENTS: Water, Sugar, Salt, Natural Flavors", None)]
+    
+    # Clean up temporary file
+    try:
+        os.remove(temp_path)
+    except:
+        pass
+    
+    # Extract and parse ingredients
+    extracted_text = " ".join([result[1] for result in results])
+    with stage("parse_ingredients"):
         ingredients = parse_ingredients(extracted_text)
+    
+    if not ingredients:
+        ingredients = ["water", "sugar", "salt", "natural flavors"]
+    note("ingredient_count", len(ingredients))
+    
+    # Parse health profile if provided
+    user_profile = None
+    if health_profile:
+        try:
+            user_profile = json.loads(health_profile)
+            print(f"Using health profile for premium analysis: {user_profile}")
+        except json.JSONDecodeError:
+            print("Invalid health profile JSON, proceeding without personalization")
+    
+    # Comprehensive AI Analysis (rule-based when shedding load)
+    note("analysis_path", "llm" if use_ai else "rule_based")
+    comprehensive_analysis = analyze_with_ai(ingredients, user_profile) if use_ai else fallback_analysis(ingredients)
+    
+    return {
+        "status": "success",
+        "analysis_type": "premium_ai" if use_ai else "premium_fallback",
+        "ingredients_analyzed": ingredients,
+        "comprehensive_analysis": comprehensive_analysis,
+        "timestamp": datetime.now().isoformat()
+    }
+
+@app.post("/premium-analyze")
+async def premium_analyze_ingredients(
+    request: Request,
+    file: UploadFile = File(...),
+    health_profile: str = None,
+    user_id: Optional[str] = None
+):
+    """Premium AI analysis with comprehensive insights - requires subscription"""
+    try:
+        # Validate file
+        if not file.content_type or not file.content_type.startswith('image/'):
+            raise HTTPException(status_code=400, detail="File must be an image")
         
-        if not ingredients:
-            ingredients = ["water", "sugar", "salt", "natural flavors"]
-        
-        # Parse health profile if provided
-        user_profile = None
-        if health_profile:
-            try:
-                user_profile = json.loads(health_profile)
-                print(f"Using health profile for premium analysis: {user_profile}")
-            except json.JSONDecodeError:
-                print("Invalid health profile JSON, proceeding without personalization")
-        
-        # Comprehensive AI Analysis
-        comprehensive_analysis = analyze_with_ai(ingredients, user_profile)
+        if file.size == 0:
+            raise HTTPException(status_code=400, detail="File is empty")
         
-        return {
-            "status": "success",
-            "analysis_type": "premium_ai",
-            "ingredients_analyzed": ingredients,
-            "comprehensive_analysis": comprehensive_analysis,
-            "timestamp": datetime.now().isoformat()
-        }
+        # Read and process image
+        with stage("upload_read"):
+            image_data = await file.read()
+        async with premium_admission.admit(requester_key(user_id, request)) as tier:
+            return await asyncio.to_thread(run_premium_analysis, image_data, health_profile, tier == FULL)
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Premium analysis failed: {str(e)}")
 
+@app.post("/premium-analyze/jobs", status_code=202)
+async def create_premium_analysis_job(
+    request: Request,
+    file: UploadFile = File(...),
+    health_profile: str = None,
+    user_id: Optional[str] = None
+):
+    """Start a premium analysis in the background; poll /jobs/{job_id} or subscribe to /jobs/{job_id}/ws"""
+    if not file.content_type or not file.content_type.startswith('image/'):
+        raise HTTPException(status_code=400, detail="File must be an image")
+    
+    with stage("upload_read"):
+        image_data = await file.read()
+    if not image_data:
+        raise HTTPException(status_code=400, detail="File is empty")
+    
+    premium_admission.check_quota(requester_key(user_id, request))
+    try:
+        job = premium_jobs.submit(run_premium_analysis, image_data, health_profile)
+    except JobCapacityExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
+    
+    return {
+        "job_id": job.job_id,
+        "status": job.status,
+        "status_url": f"/jobs/{job.job_id}",
+        "websocket_url": f"/jobs/{job.job_id}/ws"
+    }
+
+@app.get("/jobs/{job_id}")
+async def get_premium_analysis_job(job_id: str):
+    """Status of a premium analysis job, with its result once finished"""
+    job = premium_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return job.as_dict()
+
+@app.websocket("/jobs/{job_id}/ws")
+async def premium_analysis_job_updates(websocket: WebSocket, job_id: str):
+    """Send the job's current status, then its final state as soon as it finishes"""
+    await websocket.accept()
+    job = premium_jobs.get(job_id)
+    if job is None:
+        await websocket.send_json({"job_id": job_id, "error": "Job not found or expired"})
+        await websocket.close(code=4404)
+        return
+    
+    try:
+        if not job.finished:
+            await websocket.send_json({"job_id": job.job_id, "status": job.status})
+            await job.done.wait()
+        await websocket.send_json(job.as_dict())
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+
 @app.post("/research-analyze")
 async def research_analyze_ingredients(ingredients: List[str]):
     """Analyze ingredients using real-time research data"""
     try:
         research_results = []
+        research_prefetch_scheduler.record(ingredients[:5])
         
         for ingredient in ingredients[:5]:  # Limit to first 5 ingredients for performance
             evidence = await research_service.get_ingredient_scientific_evidence(ingredient)
@@ -198,6 +307,67 @@ async def research_analyze_ingredients(ingredients: List[str]):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Research analysis failed: {str(e)}")
 
+@app.get("/queue/stats")
+async def get_queue_stats(db: AsyncSession = Depends(get_async_db)):
+    """Depth, lag and throughput of the background job queues"""
+    return await db.run_sync(queue_stats)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics(db: AsyncSession = Depends(get_async_db)):
+    """Prometheus text exposition of stage timings, cache and fallback counters, queue depths and in-flight work"""
+    depths = {f"jobs:{queue}": depth for queue, depth in (await db.run_sync(queue_depths)).items()}
+    # Drained queues drop out of the grouped count; report them as empty rather than at their last depth
+    for (label,) in list(queue_depth.values):
+        if label.startswith("jobs:") and label not in depths:
+            depths[label] = 0
+    for label, depth in depths.items():
+        queue_depth.set(depth, label)
+    queue_depth.set(premium_jobs.active_count(), "premium_jobs")
+    queue_depth.set(len(research_prefetch_scheduler.queue), "research_prefetch")
+    for name, gate in admission_stats().items():
+        queue_depth.set(gate["waiting"], f"admission:{name}")
+        in_flight.set(gate["in_flight"], name)
+    return PlainTextResponse(registry.render(), media_type=CONTENT_TYPE)
+
+@app.get("/admin/slow-requests", dependencies=[Depends(require_admin)])
+async def get_slow_requests(endpoint: Optional[str] = None, limit: Optional[int] = Query(None, ge=1)):
+    """Slowest recent requests per endpoint with their stage-by-stage breakdown"""
+    return {"recorder": flight_recorder.stats(), "endpoints": flight_recorder.slowest(endpoint, limit)}
+
+@app.post("/admin/slow-requests/dump", dependencies=[Depends(require_admin)])
+async def dump_slow_requests():
+    """Write the flight recorder's slowest requests to a JSONL file on the server"""
+    return await asyncio.to_thread(flight_recorder.dump_jsonl)
+
+@app.get("/admin/memory", dependencies=[Depends(require_admin)])
+async def get_memory_report(top: int = Query(20, ge=1, le=200)):
+    """Process RSS, OCR model footprint, estimated cache sizes, per-stage allocation peaks and tracemalloc top sites"""
+    return await asyncio.to_thread(memory_report, top)
+
+@app.post("/admin/memory/tracemalloc/{action}", dependencies=[Depends(require_admin)])
+async def toggle_tracemalloc(action: str, frames: int = Query(10, ge=1, le=100)):
+    """Start or stop allocation tracing; tracing slows every allocation, so stop it when done"""
+    if action == "start":
+        return {"tracing": True, "started": start_tracing(frames)}
+    if action == "stop":
+        return {"tracing": False, "stopped": stop_tracing()}
+    raise HTTPException(status_code=400, detail="Action must be start or stop")
+
+@app.get("/admission/stats")
+async def get_admission_stats():
+    """Concurrency, queueing and shedding counters for the expensive endpoints"""
+    return admission_stats()
+
+@app.get("/cache/stats")
+async def get_cache_stats():
+    """Per-tier hit counts and sizes of the analysis, OCR text and research evidence caches"""
+    return await asyncio.to_thread(cache_stats)
+
+@app.get("/research/prefetch-status")
+async def research_prefetch_status():
+    """Background research prefetch queue, budget and refresh times"""
+    return research_prefetch_scheduler.status()
+
 @app.post("/test-analyze")
 async def test_analyze():
     """Test endpoint that returns mock analysis without image processing"""
@@ -240,234 +410,233 @@ async def simple_analyze(file: UploadFile = File(...)):
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
 @app.post("/analyze", response_model=AnalysisResult)
-async def analyze_ingredients(file: UploadFile = File(...), health_profile: str = None, db: Session = Depends(get_db)):
+async def analyze_ingredients(
+    request: Request,
+    response: Response,
+    file: Optional[UploadFile] = File(None),
+    barcode: Optional[str] = Form(None),
+    health_profile: str = None,
+    user_id: Optional[str] = Form(None),
+    db: AsyncSession = Depends(get_async_db)
+):
+    deadline = start_deadline(request.headers.get(DEADLINE_HEADER))
+    note("degradations", deadline.degradations)
     try:
-        # Validate file type
-        if not file.content_type.startswith("image/"):
-            raise HTTPException(status_code=400, detail="File must be an image")
-        
-        # Read and process image
-        image_data = await file.read()
-        
-        # Validate image data
-        if not image_data:
-            raise HTTPException(status_code=400, detail="Empty image file")
+        if file is None and not barcode:
+            raise HTTPException(status_code=400, detail="Provide an image or a barcode")
+        
+        image_data = None
+        if file is not None:
+            # Validate file type
+            if not file.content_type.startswith("image/"):
+                raise HTTPException(status_code=400, detail="File must be an image")
+            
+            # Read and process image
+            with stage("upload_read"):
+                image_data = await file.read()
+            
+            # Validate image data
+            if not image_data:
+                raise HTTPException(status_code=400, detail="Empty image file")
+        
+        # Barcode fast path: a known product skips OCR and analysis entirely
+        if not barcode:
+            barcode = await asyncio.to_thread(decode_barcode, image_data)
+        if barcode:
+            if barcode_index.is_stale():
+                barcode_index.refresh_in_background(SessionLocal)
+            with stage("db_lookup"):
+                product = await db.run_sync(barcode_index.lookup, barcode)
+            record_cache("barcode_index", "hit" if product else "miss")
+            if product:
+                if product.analysis_snapshot:
+                    # A stored snapshot is served without the LLM (stale ones refresh in the background)
+                    return await existing_product_result(db, product, [], barcode, use_ai=False)
+                # First analysis of this product calls the LLM, so it is admitted like any other scan
+                async with analyze_admission.admit(requester_key(user_id, request)) as tier:
+                    response.headers["X-Analysis-Tier"] = tier
+                    if tier != FULL:
+                        record_degradation("load_shed")
+                    return await existing_product_result(db, product, [], barcode, use_ai=tier == FULL)
+            if image_data is None:
+                raise HTTPException(status_code=404, detail="Unknown barcode, upload a photo of the ingredient list")
         
         try:
             image = Image.open(io.BytesIO(image_data))
         except Exception as e:
             raise HTTPException(status_code=400, detail=f"Invalid image format: {str(e)}")
         
-        # Convert to RGB if necessary
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
-        
-        # Save to temporary file for EasyOCR
-        temp_path = f"/tmp/temp_image_{hash(image_data)}.jpg"
-        image.save(temp_path, "JPEG", quality=95)
-        
-        # Perform OCR on the temporary file
-        try:
-            ocr_reader = get_ocr_reader()
-            results = ocr_reader.readtext(temp_path, detail=0)
-            print(f"OCR successful, found {len(results)} text regions")
+        # OCR and the LLM are the expensive part: they run under the endpoint's admission budget
+        async with analyze_admission.admit(requester_key(user_id, request)) as tier:
+            response.headers["X-Analysis-Tier"] = tier
+            if tier != FULL:
+                record_degradation("load_shed")
             
-            # If no text found, try with different parameters
-            if not results or len(results) == 0:
-                print("No text found with default settings, trying with detail=1")
-                results = ocr_reader.readtext(temp_path, detail=1)
-                if results:
-                    results = [result[1] for result in results]  # Extract text only
-                else:
-                    print("Still no text found, using fallback")
-                    results = ["INGREDIENTS: Water, Sugar, Salt, Natural Flavors, Artificial Preservatives"]
-        except Exception as ocr_error:
-            print(f"OCR failed: {ocr_error}")
-            # Fallback: return mock data for testing
-            results = ["INGREDIENTS: Water, Sugar, Salt, Natural Flavors, Artificial Preservatives"]
-        
-        # Clean up temporary file
-        import os
-        try:
-            os.remove(temp_path)
-        except:
-            pass
-        
-        # Extract text from OCR results
-        if not results:
-            extracted_text = "INGREDIENTS: Water, Sugar, Salt, Natural Flavors, Artificial Preservatives"
-        elif isinstance(results[0], str):
-            # Results are already text strings
-            extracted_text = " ".join(results)
-        else:
-            # Results are tuples with (bbox, text, confidence)
-            extracted_text = " ".join([result[1] for result in results])
-        
-        # Parse ingredients from text
-        ingredients = parse_ingredients(extracted_text)
-        
-        if not ingredients:
-            # If no ingredients found, use fallback ingredients for testing
-            ingredients = ["water", "sugar", "salt", "natural flavors", "artificial preservatives"]
-            print(f"No ingredients parsed, using fallback: {ingredients}")
-        
-        # Check if product already exists (with error handling)
-        existing_product = None
-        try:
-            existing_product = find_existing_product(db, ingredients, extracted_text)
-        except Exception as e:
-            print(f"Warning: Could not check for existing products: {e}")
-            # Continue with analysis even if database check fails
-        
-        if existing_product:
-            # Return existing product data
-            return AnalysisResult(
-                score=int(existing_product.ai_score or 0),
-                risk_ingredients=[],  # Could be populated from ingredient analysis
-                tags=[],  # Could be populated from product tags
-                summary=f"Found existing product: {existing_product.name}",
-                recommendation="This product has been analyzed before by our community.",
-                extracted_ingredients=ingredients,
-                product_id=existing_product.product_id,
-                is_existing_product=True,
-                avg_user_rating=existing_product.avg_user_rating,
-                total_ratings=existing_product.total_ratings
-            )
-        
-        # Parse health profile if provided
-        user_profile = None
-        if health_profile:
+            # OCR blocks for seconds, so keep it off the event loop
+            extracted_text = await asyncio.to_thread(cached_label_text, image_data, image)
+            
+            # Parse ingredients from text
+            with stage("parse_ingredients"):
+                ingredients = parse_ingredients(extracted_text)
+            
+            if not ingredients:
+                # If no ingredients found, use fallback ingredients for testing
+                ingredients = ["water", "sugar", "salt", "natural flavors", "artificial preservatives"]
+                print(f"No ingredients parsed, using fallback: {ingredients}")
+            else:
+                research_prefetch_scheduler.record(ingredients)
+            note("ingredient_count", len(ingredients))
+            
+            # Check if product already exists (with error handling)
+            existing_product = None
             try:
-                user_profile = json.loads(health_profile)
-                print(f"Using health profile for personalized analysis: {user_profile}")
-            except json.JSONDecodeError:
-                print("Invalid health profile JSON, proceeding without personalization")
-        
-        # Analyze ingredients with AI for new product
-        analysis = analyze_with_ai(ingredients, user_profile)
-        
-        return AnalysisResult(
-            score=analysis["score"],
-            risk_ingredients=analysis["risk_ingredients"],
-            tags=analysis["tags"],
-            summary=analysis["summary"],
-            recommendation=analysis["recommendation"],
-            extracted_ingredients=ingredients,
-            is_existing_product=False
-        )
+                existing_product = await db.run_sync(find_existing_product, ingredients, extracted_text)
+            except Exception as e:
+                print(f"Warning: Could not check for existing products: {e}")
+                # Continue with analysis even if database check fails
+            
+            if existing_product:
+                # Return existing product data
+                return await existing_product_result(db, existing_product, ingredients, barcode, use_ai=tier == FULL)
+            
+            # Parse health profile if provided
+            user_profile = None
+            if health_profile:
+                try:
+                    user_profile = json.loads(health_profile)
+                    print(f"Using health profile for personalized analysis: {user_profile}")
+                except json.JSONDecodeError:
+                    print("Invalid health profile JSON, proceeding without personalization")
+            
+            # Analyze ingredients for the new product; the degraded tier skips the LLM
+            analysis = await asyncio.to_thread(build_analysis_result, ingredients, user_profile, tier == FULL)
+            
+            return AnalysisResult(**analysis, is_existing_product=False, barcode=barcode, degradations=current_degradations())
         
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         error_details = traceback.format_exc()
         print(f"Full error details: {error_details}")
         raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
 
-def find_existing_product(db: Session, ingredients: list[str], extracted_text: str) -> Optional[Product]:
-    """Find existing product by ingredient similarity"""
+async def existing_product_result(
+    db: AsyncSession,
+    product: Product,
+    scanned_ingredients: list[str],
+    barcode: Optional[str] = None,
+    use_ai: bool = True
+) -> AnalysisResult:
+    """Stored analysis snapshot for a known product, computed on first use and refreshed lazily when stale.
+
+    Without use_ai a missing snapshot is answered with the rule-based analysis and not stored.
+    """
+    community = {
+        "product_id": product.product_id,
+        "is_existing_product": True,
+        "avg_user_rating": product.avg_user_rating,
+        "total_ratings": product.total_ratings,
+        "barcode": barcode or product.upc_barcode
+    }
+    ingredients = split_ingredients_text(product.ingredients_text or "") or scanned_ingredients
     if not ingredients:
-        return None
-    
-    # Create a search query for similar ingredients
-    ingredient_query = " ".join(ingredients[:5])  # Use first 5 ingredients for matching
-    
-    # Search for products with similar ingredient text
-    products = db.query(Product).filter(
-        or_(
-            Product.ingredients_text.contains(ingredient_query),
-            Product.ingredients_text.contains(ingredients[0]) if ingredients else False
+        return AnalysisResult(
+            score=int(product.ai_score or 0),
+            risk_ingredients=[],
+            tags=[],
+            summary=f"Found existing product: {product.name}",
+            recommendation="This product has been analyzed before by our community.",
+            extracted_ingredients=[],
+            **community
         )
-    ).limit(5).all()
     
-    # Simple similarity check (could be enhanced with more sophisticated matching)
-    for product in products:
-        if product.ingredients_text:
-            # Check if at least 3 ingredients match
-            product_ingredients = [ing.strip().lower() for ing in product.ingredients_text.split(',')]
-            matches = sum(1 for ing in ingredients[:10] if any(ing.lower() in prod_ing for prod_ing in product_ingredients))
-            if matches >= 3:
-                return product
+    analysis, stale = read_snapshot(product, ANALYZER_VERSION, ingredients)
+    record_cache("analysis_snapshot", "miss" if analysis is None else "stale" if stale else "hit")
+    if analysis is None and use_ai and not has_time_for("llm"):
+        record_degradation("rule_based_analysis")
+        use_ai = False
+    if analysis is None and not use_ai:
+        analysis = build_analysis_result(ingredients, use_ai=False)
+    elif analysis is None:
+        # Only a real LLM answer becomes the snapshot; a rule-based stand-in would look fresh until the next version bump
+        try:
+            analysis = await asyncio.to_thread(build_analysis_result, ingredients, None, True, True)
+        except LLMAnalysisFailed:
+            analysis = build_analysis_result(ingredients, use_ai=False)
+            note_llm_fallback()
+        else:
+            await db.run_sync(store_snapshot, product.product_id, analysis, ANALYZER_VERSION)
+    elif stale:
+        note("analysis_path", "stale_snapshot")
+        refresh_snapshot_in_background(
+            product.product_id, lambda: build_analysis_result(ingredients, strict=True), ANALYZER_VERSION, SessionLocal
+        )
+    else:
+        note("analysis_path", "snapshot")
+    return AnalysisResult(**analysis, **community, degradations=current_degradations())
+
+def find_existing_product(db: Session, ingredients: list[str], extracted_text: str) -> Optional[Product]:
+    """Find the existing product whose ingredient set is most similar (MinHash/LSH + Jaccard)"""
+    if not ingredients:
+        return None
+    if not has_time_for("product_match"):
+        record_degradation("skipped_product_match")
+        return None
     
-    return None
+    with stage("db_lookup"), measure("product_match"):
+        matches = find_similar_products(db, ingredients, limit=1)
+    return matches[0][0] if matches else None
 
 @app.post("/submit-product")
 async def submit_product(
     submission: ProductSubmissionRequest,
     file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Submit a new product for community review"""
     try:
-        # Save uploaded image
-        image_data = await file.read()
-        image_filename = f"submission_{uuid.uuid4()}.jpg"
-        image_path = f"uploads/{image_filename}"
-        
-        # Create uploads directory if it doesn't exist
-        os.makedirs("uploads", exist_ok=True)
-        
-        with open(image_path, "wb") as f:
-            f.write(image_data)
+        # Save uploaded image (content-addressed, so identical uploads are stored once)
+        with stage("upload_read"):
+            image_data = await file.read()
+        try:
+            stored = await upload_storage.save(image_data)
+        except StorageQuotaExceeded as e:
+            raise HTTPException(status_code=507, detail=str(e))
         
         # Create submission record
         db_submission = ProductSubmission(
             user_id=submission.user_id,
             product_name=submission.product_name,
             upc_barcode=submission.upc_barcode,
-            raw_image_url=image_path,
+            raw_image_url=stored.path,
             moderator_status=SubmissionStatus.PENDING
         )
         
         db.add(db_submission)
-        db.commit()
-        db.refresh(db_submission)
+        await db.flush()
+        
+        # OCR, parsing and analysis run in submission_worker.py; the job commits with the row
+        job = enqueue(db, SUBMISSION_QUEUE, {"submission_id": db_submission.submission_id})
+        await db.commit()
         
         return {
             "message": "Product submitted successfully for review",
             "submission_id": db_submission.submission_id,
-            "status": "pending"
+            "status": "pending",
+            "job_id": job.job_id
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error submitting product: {str(e)}")
 
 @app.post("/rate-product")
-async def rate_product(rating: UserRatingRequest, db: Session = Depends(get_db)):
+async def rate_product(rating: UserRatingRequest, db: AsyncSession = Depends(get_async_db)):
     """Rate a product"""
     try:
-        # Check if user already rated this product
-        existing_rating = db.query(UserRating).filter(
-            and_(
-                UserRating.product_id == rating.product_id,
-                UserRating.user_id == rating.user_id
-            )
-        ).first()
-        
-        if existing_rating:
-            # Update existing rating
-            existing_rating.star_rating = rating.star_rating
-            existing_rating.review_text = rating.review_text
-        else:
-            # Create new rating
-            new_rating = UserRating(
-                product_id=rating.product_id,
-                user_id=rating.user_id,
-                star_rating=rating.star_rating,
-                review_text=rating.review_text
-            )
-            db.add(new_rating)
-        
-        # Update product's average rating
-        product = db.query(Product).filter(Product.product_id == rating.product_id).first()
-        if product:
-            # Recalculate average rating
-            ratings = db.query(UserRating).filter(UserRating.product_id == rating.product_id).all()
-            if ratings:
-                avg_rating = sum(r.star_rating for r in ratings) / len(ratings)
-                product.avg_user_rating = round(avg_rating, 1)
-                product.total_ratings = len(ratings)
-        
-        db.commit()
-        
+        await db.run_sync(submit_rating, rating.product_id, rating.user_id, rating.star_rating, rating.review_text)
         return {"message": "Rating submitted successfully"}
         
     except Exception as e:
@@ -477,16 +646,11 @@ async def rate_product(rating: UserRatingRequest, db: Session = Depends(get_db))
 async def search_products(
     query: str = Query(..., description="Search query"),
     limit: int = Query(10, description="Number of results to return"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Search for products by name or ingredients"""
+    """Search for products by name or ingredients, best matches first with prefix matching for type-ahead"""
     try:
-        products = db.query(Product).filter(
-            or_(
-                Product.name.contains(query),
-                Product.ingredients_text.contains(query)
-            )
-        ).limit(limit).all()
+        products = await db.run_sync(full_text_search, query, limit)
         
         return {
             "products": [
@@ -506,19 +670,29 @@ async def search_products(
         raise HTTPException(status_code=500, detail=f"Error searching products: {str(e)}")
 
 @app.get("/products/{product_id}")
-async def get_product(product_id: int, db: Session = Depends(get_db)):
+async def get_product(product_id: int, db: AsyncSession = Depends(get_async_db)):
     """Get detailed product information"""
     try:
-        product = db.query(Product).filter(Product.product_id == product_id).first()
-        if not product:
-            raise HTTPException(status_code=404, detail="Product not found")
-        
-        # Get recent ratings
-        ratings = db.query(UserRating).filter(
-            UserRating.product_id == product_id
-        ).order_by(UserRating.created_at.desc()).limit(10).all()
-        
-        return {
+        if product_cache.needs_sync():
+            await db.run_sync(product_cache.sync)
+        cached = product_cache.get(product_id)
+        if cached is not None:
+            return cached
+        generation = product_cache.generation(product_id)
+        
+        with stage("db_lookup"):
+            product = await db.get(Product, product_id)
+            if not product:
+                raise HTTPException(status_code=404, detail="Product not found")
+            
+            # Get recent ratings
+            ratings = (await db.execute(
+                select(UserRating).where(
+                    UserRating.product_id == product_id
+                ).order_by(UserRating.created_at.desc()).limit(10)
+            )).scalars().all()
+        
+        payload = {
             "product_id": product.product_id,
             "name": product.name,
             "upc_barcode": product.upc_barcode,
@@ -537,492 +711,20 @@ async def get_product(product_id: int, db: Session = Depends(get_db)):
                 for r in ratings
             ]
         }
+        product_cache.set(product_id, payload, generation)
+        return payload
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching product: {str(e)}")
 
-def correct_ocr_errors(text: str) -> str:
-    """Correct common OCR spelling mistakes in food labels"""
-    corrections = {
-        # Common OCR mistakes
-        'twalcambohydate': 'total carbohydrate',
-        'dben': 'fiber',
-        'cloredhel': 'cholesterol',
-        'usnurried': 'unsaturated',
-        'tans fat': 'trans fat',
-        'mamna': 'sodium',
-        'amng': 'among',
-        'cagumanduron': 'carbohydrates',
-        'wwwcoke com': 'www.coke.com',
-        'floz': 'fl oz',
-        'mg': 'mg',
-        '%': '%',
-        'natural sodium': 'sodium',
-        'phosphoric acid': 'phosphoric acid',
-        'caramel color': 'caramel color',
-        'natural flavors': 'natural flavors',
-        'artificial flavors': 'artificial flavors',
-        'caffeine': 'caffeine',
-        'sucrose': 'sucrose',
-        'dietary fiber': 'dietary fiber',
-        'original formula': 'original formula',
-        'concern': '',  # Remove concern labels
-        'ingredient analysis': '',  # Remove headers
-        'nutrition facts': '',  # Remove headers
-        'serving size': '',  # Remove headers
-    }
-    
-    corrected_text = text.lower()
-    for mistake, correction in corrections.items():
-        corrected_text = corrected_text.replace(mistake, correction)
-    
-    # Clean up extra spaces and remove empty lines
-    corrected_text = re.sub(r'\s+', ' ', corrected_text)
-    corrected_text = re.sub(r'\n\s*\n', '\n', corrected_text)
-    
-    return corrected_text.strip()
-
-def parse_ingredients(text: str) -> list[str]:
-    """Extract ingredient list from OCR text with improved error correction"""
-    # First correct common OCR errors
-    corrected_text = correct_ocr_errors(text)
-    
-    # Look for common food ingredients in the corrected text
-    common_ingredients = [
-        'sucrose', 'sugar', 'caramel color', 'phosphoric acid', 'sodium',
-        'natural flavors', 'artificial flavors', 'caffeine', 'water',
-        'dietary fiber', 'cholesterol', 'trans fat', 'unsaturated fat',
-        'total carbohydrate', 'carbohydrates', 'protein', 'vitamins',
-        'phosphoric acid', 'natural sodium', 'flavors', 'salt', 'corn syrup',
-        'high fructose corn syrup', 'citric acid', 'ascorbic acid', 'vitamin c',
-        'calcium', 'iron', 'zinc', 'potassium', 'magnesium', 'fiber',
-        'starch', 'modified starch', 'lecithin', 'glycerin', 'xanthan gum',
-        'guar gum', 'carrageenan', 'baking soda', 'baking powder', 'yeast',
-        'milk', 'cream', 'butter', 'cheese', 'eggs', 'wheat', 'flour',
-        'rice', 'oats', 'barley', 'soy', 'soybean', 'canola oil', 'vegetable oil',
-        'palm oil', 'coconut oil', 'olive oil', 'sunflower oil', 'corn oil'
-    ]
-    
-    ingredients = []
-    corrected_lower = corrected_text.lower()
-    
-    # Check for each common ingredient
-    for ingredient in common_ingredients:
-        if ingredient in corrected_lower:
-            ingredients.append(ingredient)
-    
-    # If we found ingredients, return them
-    if ingredients:
-        return ingredients[:20]
-    
-    # For garbled OCR text, try to find recognizable patterns
-    # Look for words that might be ingredients even if partially garbled
-    words = corrected_text.lower().split()
-    potential_ingredients = []
-    
-    for word in words:
-        # Clean the word
-        clean_word = re.sub(r'[^a-zA-Z]', '', word)
-        
-        # Skip very short words or numbers
-        if len(clean_word) < 3 or re.match(r'^\d+$', clean_word):
-            continue
-            
-        # Check if this word is similar to known ingredients
-        for known_ingredient in common_ingredients:
-            if (clean_word in known_ingredient or 
-                known_ingredient in clean_word or
-                # Check for partial matches (at least 4 characters)
-                (len(clean_word) >= 4 and any(clean_word[i:i+4] in known_ingredient for i in range(len(clean_word)-3)))):
-                potential_ingredients.append(known_ingredient)
-                break
-    
-    # Remove duplicates and return
-    unique_ingredients = list(set(potential_ingredients))
-    
-    # If still no ingredients found, try to extract any meaningful words
-    if not unique_ingredients:
-        meaningful_words = []
-        for word in words:
-            clean_word = re.sub(r'[^a-zA-Z]', '', word)
-            if len(clean_word) >= 4 and not re.match(r'^(ingredients|nutrition|facts|serving|size|calories|total|daily|value|percent|mg|g|ml|oz|fl)$', clean_word):
-                meaningful_words.append(clean_word)
-        
-        unique_ingredients = meaningful_words[:10]  # Limit to 10 most likely ingredients
-    
-    return unique_ingredients[:20]  # Limit to first 20 ingredients
-
-def analyze_with_ai(ingredients: list[str], user_profile: dict = None) -> dict:
-    """Analyze ingredients using OpenAI API with comprehensive medical-grade analysis"""
-    
-    # Build personalized context
-    profile_context = ""
-    if user_profile:
-        profile_context = f"""
-    
-    USER HEALTH PROFILE:
-    - Primary Goal: {user_profile.get('primary_goal', 'Not specified')}
-    - Diet Type: {user_profile.get('diet_type', 'Not specified')}
-    - Health Conditions: {', '.join([k for k, v in user_profile.items() if v is True and k in ['diabetes', 'blood_pressure', 'pcos_thyroid', 'heart_conditions', 'digestive_issues']]) or 'None'}
-    - Dietary Restrictions: {', '.join(user_profile.get('restrictions', [])) or 'None'}
-    - Activity Level: {user_profile.get('activity_level', 'Not specified')}
-    
-    IMPORTANT: Adjust your analysis, scoring, and recommendations based on this user's specific health goals and conditions.
-    """
-    
-    prompt = f"""
-    You are a world-class nutritionist, food scientist, and medical researcher. Provide a comprehensive medical-grade analysis of these ingredients tailored to the user's health profile:
-    
-    {profile_context}
-    
-    Ingredients: {', '.join(ingredients)}
-    
-    Return a detailed JSON response with:
-    {{
-        "score": number 0-100 (health score),
-        "risk_ingredients": [list of concerning ingredients with detailed reasons],
-        "tags": [descriptive tags like "High Protein", "Keto-Friendly", "Vegan", "Gluten-Free", "Ultra-Processed", "Natural", "High Sugar", "Low Sodium", "Heart-Healthy", "Anti-Inflammatory"],
-        "summary": "3-4 sentence comprehensive health assessment with medical context",
-        "recommendation": "Specific actionable medical advice for the consumer",
-        "health_risks": [
-            {{
-                "risk_type": "specific health concern (e.g., cardiovascular_disease, diabetes_risk, inflammation, digestive_health, cancer_risk)",
-                "severity": "low/medium/high",
-                "description": "detailed medical explanation with scientific context",
-                "affected_ingredients": [list of problematic ingredients],
-                "scientific_evidence": "brief summary of research findings",
-                "prevention_tips": [specific actionable prevention strategies]
-            }}
-        ],
-        "nutritional_insights": {{
-            "protein_content": "low/medium/high",
-            "fiber_content": "low/medium/high", 
-            "vitamin_content": "low/medium/high",
-            "mineral_content": "low/medium/high",
-            "processing_level": "minimal/moderate/high/ultra-processed",
-            "sugar_level": "low/medium/high",
-            "sodium_level": "low/medium/high",
-            "fat_quality": "excellent/good/fair/poor",
-            "antioxidant_content": "low/medium/high",
-            "inflammatory_potential": "low/medium/high"
-        }},
-        "allergen_warnings": [list of potential allergens with severity],
-        "target_demographics": [who this product is best for with health conditions],
-        "alternative_suggestions": [specific healthier alternatives with brand suggestions],
-        "sustainability_score": number 1-10,
-        "cost_effectiveness": number 1-10,
-        "processing_level": number 1-10,
-        "medical_benefits": [list of potential health benefits],
-        "contraindications": [who should avoid this product and why],
-        "nutrient_density": "low/medium/high",
-        "glycemic_impact": "low/medium/high"
-    }}
-
-    Be thorough, scientific, evidence-based, and provide medical-grade insights. Focus on:
-    1. Cardiovascular health impact
-    2. Metabolic effects (blood sugar, insulin)
-    3. Inflammatory potential
-    4. Digestive health
-    5. Cancer risk factors
-    6. Neurological effects
-    7. Immune system impact
-    8. Long-term health consequences
-    """
-    
-    try:
-        response = openai.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a nutrition expert analyzing food ingredients. Always respond with valid JSON only."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.3,
-            max_tokens=500
-        )
-        
-        result = json.loads(response.choices[0].message.content)
-        
-        # Validate and ensure all required fields
-        return {
-            "score": max(0, min(100, result.get("score", 50))),
-            "risk_ingredients": result.get("risk_ingredients", []),
-            "tags": result.get("tags", []),
-            "summary": result.get("summary", "Analysis completed"),
-            "recommendation": result.get("recommendation", "Consider reading labels carefully")
-        }
-        
-    except Exception as e:
-        # Fallback analysis if AI fails
-        return fallback_analysis(ingredients)
-
-def analyze_health_risks(ingredients: list[str]) -> list[HealthRisk]:
-    """Analyze ingredients for specific health risks"""
-    health_risks = []
-    ingredients_lower = [ing.lower() for ing in ingredients]
-    
-    # Cholesterol and Heart Health Risks
-    cholesterol_risks = []
-    if any('trans fat' in ing or 'hydrogenated' in ing for ing in ingredients_lower):
-        cholesterol_risks.extend([ing for ing in ingredients if 'trans fat' in ing.lower() or 'hydrogenated' in ing.lower()])
-    if any('saturated fat' in ing for ing in ingredients_lower):
-        cholesterol_risks.extend([ing for ing in ingredients if 'saturated fat' in ing.lower()])
-    if any('palm oil' in ing for ing in ingredients_lower):
-        cholesterol_risks.extend([ing for ing in ingredients if 'palm oil' in ing.lower()])
-    
-    if cholesterol_risks:
-        severity = "high" if len(cholesterol_risks) > 2 else "medium"
-        health_risks.append(HealthRisk(
-            risk_type="Heart Health & Cholesterol",
-            severity=severity,
-            description="Contains ingredients that may raise LDL cholesterol and increase cardiovascular risk",
-            affected_ingredients=cholesterol_risks
-        ))
-    
-    # Diabetes and Blood Sugar Risks
-    sugar_risks = []
-    if any('sugar' in ing or 'syrup' in ing or 'dextrose' in ing or 'fructose' in ing or 'sucrose' in ing for ing in ingredients_lower):
-        sugar_risks.extend([ing for ing in ingredients if any(s in ing.lower() for s in ['sugar', 'syrup', 'dextrose', 'fructose', 'glucose', 'sucrose'])])
-    
-    if sugar_risks:
-        severity = "high" if len(sugar_risks) > 3 else "medium"
-        health_risks.append(HealthRisk(
-            risk_type="Diabetes & Blood Sugar",
-            severity=severity,
-            description="High sugar content may contribute to insulin resistance and diabetes risk",
-            affected_ingredients=sugar_risks
-        ))
-    
-    # Blood Pressure Risks
-    sodium_risks = []
-    if any('sodium' in ing or 'salt' in ing for ing in ingredients_lower):
-        sodium_risks.extend([ing for ing in ingredients if 'sodium' in ing.lower() or 'salt' in ing.lower()])
-    
-    if sodium_risks:
-        health_risks.append(HealthRisk(
-            risk_type="Blood Pressure",
-            severity="medium",
-            description="High sodium content may contribute to hypertension",
-            affected_ingredients=sodium_risks
-        ))
-    
-    # Cancer and Carcinogen Risks
-    carcinogen_risks = []
-    carcinogen_patterns = ['nitrate', 'nitrite', 'bht', 'bha', 'artificial color', 'artificial flavor', 'caramel color']
-    for pattern in carcinogen_patterns:
-        if any(pattern in ing for ing in ingredients_lower):
-            carcinogen_risks.extend([ing for ing in ingredients if pattern in ing.lower()])
-    
-    # Add phosphoric acid as a separate health concern
-    if any('phosphoric acid' in ing for ing in ingredients_lower):
-        health_risks.append(HealthRisk(
-            risk_type="Dental & Bone Health",
-            severity="medium",
-            description="Phosphoric acid can erode tooth enamel and may affect bone density with excessive consumption",
-            affected_ingredients=[ing for ing in ingredients if 'phosphoric acid' in ing.lower()]
-        ))
-    
-    # Add caffeine as a separate health concern
-    if any('caffeine' in ing for ing in ingredients_lower):
-        health_risks.append(HealthRisk(
-            risk_type="Caffeine Sensitivity",
-            severity="low",
-            description="Contains caffeine which may cause jitteriness, insomnia, or anxiety in sensitive individuals",
-            affected_ingredients=[ing for ing in ingredients if 'caffeine' in ing.lower()]
-        ))
-    
-    if carcinogen_risks:
-        health_risks.append(HealthRisk(
-            risk_type="Cancer Risk",
-            severity="medium",
-            description="Contains potential carcinogens or ingredients linked to cancer risk",
-            affected_ingredients=carcinogen_risks
-        ))
-    
-    # Digestive Health Risks
-    digestive_risks = []
-    if any('artificial sweetener' in ing or 'aspartame' in ing or 'sucralose' in ing for ing in ingredients_lower):
-        digestive_risks.extend([ing for ing in ingredients if any(s in ing.lower() for s in ['artificial sweetener', 'aspartame', 'sucralose', 'saccharin'])])
-    
-    if digestive_risks:
-        health_risks.append(HealthRisk(
-            risk_type="Digestive Health",
-            severity="low",
-            description="Artificial sweeteners may affect gut microbiome and digestive health",
-            affected_ingredients=digestive_risks
-        ))
-    
-    # Allergic Reactions
-    allergen_risks = []
-    common_allergens = ['soy', 'wheat', 'gluten', 'dairy', 'nuts', 'eggs', 'shellfish']
-    for allergen in common_allergens:
-        if any(allergen in ing for ing in ingredients_lower):
-            allergen_risks.extend([ing for ing in ingredients if allergen in ing.lower()])
-    
-    if allergen_risks:
-        health_risks.append(HealthRisk(
-            risk_type="Allergic Reactions",
-            severity="high",
-            description="Contains common allergens that may cause severe reactions in sensitive individuals",
-            affected_ingredients=allergen_risks
-        ))
-    
-    return health_risks
-
-def get_nutritional_insights(ingredients: list[str]) -> dict:
-    """Get nutritional insights and recommendations"""
-    ingredients_lower = [ing.lower() for ing in ingredients]
-    
-    insights = {
-        "fiber_content": "low",
-        "protein_content": "low", 
-        "vitamin_content": "low",
-        "mineral_content": "low",
-        "processing_level": "high"
-    }
-    
-    # Check for beneficial nutrients
-    if any('whole grain' in ing or 'fiber' in ing for ing in ingredients_lower):
-        insights["fiber_content"] = "moderate"
-    
-    if any('protein' in ing or 'soy' in ing or 'nuts' in ing for ing in ingredients_lower):
-        insights["protein_content"] = "moderate"
-    
-    if any('vitamin' in ing or 'mineral' in ing for ing in ingredients_lower):
-        insights["vitamin_content"] = "moderate"
-        insights["mineral_content"] = "moderate"
-    
-    # Check processing level
-    natural_ingredients = sum(1 for ing in ingredients_lower if any(natural in ing for natural in ['natural', 'organic', 'whole', 'fresh']))
-    if natural_ingredients > len(ingredients) * 0.5:
-        insights["processing_level"] = "low"
-    elif natural_ingredients > len(ingredients) * 0.2:
-        insights["processing_level"] = "moderate"
-    
-    return insights
-
-def fallback_analysis(ingredients: list[str]) -> dict:
-    """Enhanced fallback analysis with comprehensive medical-grade insights"""
-    risk_ingredients = []
-    tags = []
-    score = 70  # Default moderate score
-    allergen_warnings = []
-    target_demographics = []
-    alternative_suggestions = []
-    health_risks = []
-    medical_benefits = []
-    contraindications = []
-    
-    # Comprehensive risk ingredient patterns with medical context
-    risk_patterns = {
-        'artificial': ['artificial', 'synthetic', 'lab-made'],
-        'preservatives': ['preservative', 'sodium benzoate', 'bht', 'bha', 'sulfites'],
-        'colors': ['color', 'dye', 'red 40', 'yellow 5', 'blue 1'],
-        'flavors': ['artificial flavor', 'natural flavor', 'flavoring'],
-        'sweeteners': ['high fructose', 'corn syrup', 'aspartame', 'sucralose', 'saccharin'],
-        'fats': ['hydrogenated', 'trans fat', 'partially hydrogenated'],
-        'additives': ['msg', 'nitrate', 'nitrite', 'carrageenan', 'xanthan gum'],
-        'sodium': ['sodium', 'salt', 'sodium chloride'],
-        'sugar': ['sugar', 'sucrose', 'fructose', 'glucose', 'dextrose']
-    }
-    
-    # Analyze each ingredient
-    for ingredient in ingredients:
-        ingredient_lower = ingredient.lower()
-        
-        # Check for risk patterns
-        for category, patterns in risk_patterns.items():
-            if any(pattern in ingredient_lower for pattern in patterns):
-                risk_ingredients.append(f"{ingredient} ({category})")
-                break
-    
-    # Comprehensive tag analysis
-    if any('organic' in ing.lower() for ing in ingredients):
-        tags.append("Organic")
-        score += 15
-    
-    if any('natural' in ing.lower() and 'artificial' not in ing.lower() for ing in ingredients):
-        tags.append("Natural")
-        score += 10
-    
-    if any('protein' in ing.lower() or 'whey' in ing.lower() or 'soy' in ing.lower() for ing in ingredients):
-        tags.append("High Protein")
-        score += 5
-    
-    if any('fiber' in ing.lower() or 'whole grain' in ing.lower() for ing in ingredients):
-        tags.append("High Fiber")
-        score += 5
-    
-    if any('sugar' in ing.lower() or 'syrup' in ing.lower() or 'honey' in ing.lower() for ing in ingredients):
-        tags.append("Contains Sugar")
-        score -= 10
-    
-    if any('salt' in ing.lower() or 'sodium' in ing.lower() for ing in ingredients):
-        tags.append("Contains Sodium")
-        score -= 5
-    
-    if len(risk_ingredients) > 3:
-        tags.append("Ultra-Processed")
-        score -= 25
-    elif len(risk_ingredients) > 1:
-        tags.append("Processed")
-        score -= 15
-    elif len(risk_ingredients) == 0:
-        tags.append("Clean Ingredients")
-        score += 15
-    
-    # Allergen detection
-    allergens = {
-        'gluten': ['wheat', 'barley', 'rye', 'gluten'],
-        'dairy': ['milk', 'cheese', 'butter', 'cream', 'whey', 'casein'],
-        'nuts': ['almond', 'walnut', 'peanut', 'cashew', 'pistachio'],
-        'soy': ['soy', 'soybean', 'tofu', 'tempeh'],
-        'eggs': ['egg', 'albumin', 'lecithin'],
-        'shellfish': ['shrimp', 'crab', 'lobster', 'shellfish']
-    }
-    
-    for allergen, patterns in allergens.items():
-        if any(pattern in ing.lower() for ing in ingredients for pattern in patterns):
-            allergen_warnings.append(allergen.title())
-    
-    # Target demographics
-    if 'protein' in ' '.join(ingredients).lower():
-        target_demographics.append("Athletes & Fitness Enthusiasts")
-    if 'fiber' in ' '.join(ingredients).lower():
-        target_demographics.append("Health-Conscious Consumers")
-    if len(risk_ingredients) == 0:
-        target_demographics.append("Clean Eating Advocates")
-    if any('organic' in ing.lower() for ing in ingredients):
-        target_demographics.append("Organic Food Buyers")
-    
-    # Alternative suggestions
-    if len(risk_ingredients) > 2:
-        alternative_suggestions.append("Look for products with fewer artificial additives")
-        alternative_suggestions.append("Consider homemade alternatives")
-    if any('sugar' in ing.lower() for ing in ingredients):
-        alternative_suggestions.append("Try products sweetened with natural alternatives like stevia")
-    
-    # Enhanced health risks and nutritional insights
-    health_risks = analyze_health_risks(ingredients)
-    nutritional_insights = get_nutritional_insights(ingredients)
-    
-    return {
-        "score": max(0, min(100, score)),
-        "risk_ingredients": risk_ingredients,
-        "tags": tags,
-        "summary": f"Comprehensive analysis: {len(risk_ingredients)} concerning ingredients detected. {'High quality natural product' if len(risk_ingredients) == 0 else 'Contains processed additives'}.",
-        "recommendation": "Excellent choice for health-conscious consumers" if len(risk_ingredients) == 0 else "Consider alternatives with fewer artificial ingredients for better health outcomes",
-        "health_risks": health_risks,
-        "nutritional_insights": nutritional_insights,
-        "allergen_warnings": allergen_warnings,
-        "target_demographics": target_demographics,
-        "alternative_suggestions": alternative_suggestions,
-        "sustainability_score": 8 if len(risk_ingredients) == 0 else 5,
-        "cost_effectiveness": 7 if len(risk_ingredients) == 0 else 6,
-        "processing_level": 2 if len(risk_ingredients) == 0 else 7
-    }
-
 # Stripe Configuration
-stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
+def get_stripe():
+    """The Stripe SDK, imported when a payment endpoint is first used"""
+    import stripe
+    stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
+    return stripe
 
 class CheckoutRequest(BaseModel):
     plan_type: str
@@ -1042,7 +744,7 @@ async def create_checkout_session(request: CheckoutRequest):
             raise HTTPException(status_code=400, detail="Invalid plan type or price ID not configured")
         
         # Create checkout session
-        checkout_session = stripe.checkout.Session.create(
+        checkout_session = get_stripe().checkout.Session.create(
             payment_method_types=['card'],
             line_items=[{
                 'price': price_ids[request.plan_type],
@@ -1071,7 +773,7 @@ async def stripe_webhook(request: Request):
         sig_header = request.headers.get('stripe-signature')
         
         # Verify webhook signature
-        event = stripe.Webhook.construct_event(
+        event = get_stripe().Webhook.construct_event(
             payload, sig_header, os.getenv("STRIPE_WEBHOOK_SECRET")
         )
         
@@ -0,0 +1,182 @@
+import gc
+import os
+import resource
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, Optional
+
+from metrics import stage_peak_memory
+
+TRACEMALLOC_FRAMES = int(os.getenv("TRACEMALLOC_FRAMES", "10"))
+# Containers larger than this are sized from a sample of their items and extrapolated
+SIZE_SAMPLE_ITEMS = 200
+SIZE_MAX_DEPTH = 8
+
+# name -> footprint measured when a model was loaded in this process
+model_footprints: Dict[str, dict] = {}
+
+def process_memory() -> dict:
+    """Resident set size now and its high-water mark, in bytes"""
+    memory = {}
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("VmRSS", "VmHWM"):
+                    memory["rss_bytes" if key == "VmRSS" else "peak_rss_bytes"] = int(value.split()[0]) * 1024
+    except OSError:
+        pass
+    if "peak_rss_bytes" not in memory:
+        # ru_maxrss is KiB on Linux, bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        memory["peak_rss_bytes"] = peak if sys.platform == "darwin" else peak * 1024
+    return memory
+
+def record_model_footprint(name: str, load: Callable[[], Any]) -> Any:
+    """Load a model and remember how much resident memory and time loading it cost"""
+    before = process_memory()
+    start = time.perf_counter()
+    model = load()
+    after = process_memory()
+    footprint = {
+        "load_seconds": round(time.perf_counter() - start, 2),
+        "rss_before_bytes": before.get("rss_bytes"),
+        "rss_after_bytes": after.get("rss_bytes"),
+        "rss_delta_bytes": after["rss_bytes"] - before["rss_bytes"] if "rss_bytes" in before and "rss_bytes" in after else None
+    }
+    parameter_bytes = torch_parameter_bytes(model)
+    if parameter_bytes:
+        footprint["parameter_bytes"] = parameter_bytes
+    model_footprints[name] = footprint
+    print(f"Loaded {name}: {footprint}")
+    return model
+
+def torch_parameter_bytes(model: Any) -> Optional[int]:
+    """Bytes held by the parameters of any torch modules hanging off the model (EasyOCR's detector/recognizer)"""
+    total = 0
+    for attribute in ("detector", "recognizer"):
+        module = getattr(model, attribute, None)
+        parameters = getattr(module, "parameters", None)
+        if parameters is None:
+            continue
+        try:
+            total += sum(p.numel() * p.element_size() for p in parameters())
+        except Exception:
+            continue
+    return total or None
+
+def estimate_size(obj: Any, seen: Optional[set] = None, depth: int = 0) -> int:
+    """Approximate deep size of an object graph; big containers are extrapolated from a sample"""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen or depth > SIZE_MAX_DEPTH:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj, 0)
+
+    if isinstance(obj, (str, bytes, bytearray, int, float, bool, type(None))):
+        return size
+    if isinstance(obj, dict):
+        items = obj.items()
+        count = len(obj)
+        sample = [estimate_size(k, seen, depth + 1) + estimate_size(v, seen, depth + 1)
+                  for _, (k, v) in zip(range(SIZE_SAMPLE_ITEMS), items)]
+    elif isinstance(obj, (list, tuple, set, frozenset)) or hasattr(obj, "__iter__") and hasattr(obj, "__len__") and not hasattr(obj, "__dict__"):
+        count = len(obj)
+        sample = [estimate_size(item, seen, depth + 1) for _, item in zip(range(SIZE_SAMPLE_ITEMS), obj)]
+    else:
+        attributes = getattr(obj, "__dict__", None)
+        if attributes is None and hasattr(obj, "__slots__"):
+            attributes = {name: getattr(obj, name) for name in obj.__slots__ if hasattr(obj, name)}
+        return size + (estimate_size(attributes, seen, depth + 1) if attributes else 0)
+
+    if sample and count > len(sample):
+        return size + int(sum(sample) / len(sample) * count)
+    return size + sum(sample)
+
+def cache_sizes() -> Dict[str, dict]:
+    """Estimated size of each in-process cache or index"""
+    # Imported here so benchmarks can use this module without loading the API's caches
+    from admission import analyze_admission, premium_admission
+    from barcode_index import barcode_index
+    from cache_backend import analysis_cache, ocr_text_cache, research_evidence_cache
+    from flight_recorder import flight_recorder
+    from metrics import registry
+    from premium_jobs import premium_jobs
+    from product_cache import product_cache
+    from research_index import research_index
+    from research_scheduler import research_prefetch_scheduler
+
+    caches = {
+        "product_detail": ([product_cache.entries, product_cache.generations], len(product_cache.entries)),
+        "barcode_bloom": ([barcode_index.bloom], barcode_index.bloom.count if barcode_index.bloom else 0),
+        "research_bm25_index": (
+            [research_index.postings, research_index.doc_terms, research_index.doc_lengths], len(research_index.doc_lengths)
+        ),
+        "research_prefetch": (
+            [research_prefetch_scheduler.request_counts, research_prefetch_scheduler.last_refreshed, research_prefetch_scheduler.queue],
+            len(research_prefetch_scheduler.request_counts)
+        ),
+        "premium_jobs": ([premium_jobs.jobs], len(premium_jobs.jobs)),
+        "flight_recorder": ([flight_recorder.endpoints], flight_recorder.stats()["entries_held"]),
+        "admission_quotas": (
+            [analyze_admission.quota.buckets, premium_admission.quota.buckets],
+            len(analyze_admission.quota.buckets) + len(premium_admission.quota.buckets)
+        ),
+        "metrics": ([registry.metrics], len(registry.metrics))
+    }
+    for tiered in (analysis_cache, ocr_text_cache, research_evidence_cache):
+        caches[f"{tiered.namespace}_memory_tier"] = ([tiered.memory.entries], len(tiered.memory.entries))
+    sizes = {}
+    for name, (objects, entries) in caches.items():
+        try:
+            sizes[name] = {"entries": entries, "estimated_bytes": estimate_size(objects)}
+        except RuntimeError as e:
+            # A background refresh resized the container mid-walk; report it next time
+            sizes[name] = {"entries": entries, "estimated_bytes": None, "error": str(e)}
+    return sizes
+
+def start_tracing(frames: int = TRACEMALLOC_FRAMES) -> bool:
+    """Start tracemalloc (slows allocations noticeably); False if it was already running"""
+    if tracemalloc.is_tracing():
+        return False
+    tracemalloc.start(frames)
+    return True
+
+def stop_tracing() -> bool:
+    if not tracemalloc.is_tracing():
+        return False
+    tracemalloc.stop()
+    return True
+
+def tracemalloc_top(limit: int = 20, group_by: str = "lineno") -> dict:
+    """Largest allocation sites in a fresh snapshot (requires tracing to be on)"""
+    if not tracemalloc.is_tracing():
+        return {"tracing": False}
+    gc.collect()
+    snapshot = tracemalloc.take_snapshot().filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>")
+    ])
+    current, peak = tracemalloc.get_traced_memory()
+    return {
+        "tracing": True,
+        "traced_bytes": current,
+        "traced_peak_bytes": peak,
+        "overhead_bytes": tracemalloc.get_tracemalloc_memory(),
+        "top": [
+            {"location": str(stat.traceback[0]) if stat.traceback else "?", "size_bytes": stat.size, "count": stat.count}
+            for stat in snapshot.statistics(group_by)[:limit]
+        ]
+    }
+
+def memory_report(top: int = 20) -> dict:
+    return {
+        "pid": os.getpid(),
+        "process": process_memory(),
+        "models": model_footprints,
+        "caches": cache_sizes(),
+        "stage_peak_bytes": {labels[0]: value for labels, value in sorted(stage_peak_memory.values.items())},
+        "tracemalloc": tracemalloc_top(top)
+    }
@@ -0,0 +1,234 @@
+import threading
+import time
+import tracemalloc
+from bisect import bisect_left
+from contextvars import ContextVar
+from functools import wraps
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from flight_recorder import add_stage, note_cache
+
+# Starlette appends the charset
+CONTENT_TYPE = "text/plain; version=0.0.4"
+# Stage durations range from sub-millisecond parsing to multi-second OCR and LLM calls
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in sorted(self.values.items())
+        ]
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, *labels: str):
+        self.values[labels] = value
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def dec(self, *labels: str, amount: float = 1.0):
+        self.inc(*labels, amount=-amount)
+
+    def render(self) -> List[str]:
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in sorted(self.values.items())
+        ]
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = (), buckets: Tuple[float, ...] = STAGE_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [non-cumulative bucket counts (last is +Inf), sum, count]
+        self.series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        with self.lock:
+            snapshot = [(labels, list(counts), total, count) for labels, (counts, total, count) in self.series.items()]
+        for labels, counts, total, count in sorted(snapshot):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total!r}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+# Global metrics registry
+registry = Registry()
+
+stage_duration = registry.register(Histogram(
+    "nutrisight_stage_duration_seconds", "Time spent in each scan pipeline stage", ["stage"]
+))
+cache_requests = registry.register(Counter(
+    "nutrisight_cache_requests_total", "Cache lookups by cache and result (hit, stale, miss)", ["cache", "result"]
+))
+ocr_fallbacks = registry.register(Counter(
+    "nutrisight_ocr_fallbacks_total", "OCR runs that fell back to placeholder text", ["reason"]
+))
+llm_json_failures = registry.register(Counter(
+    "nutrisight_llm_json_failures_total", "LLM responses that were not valid JSON", ["caller"]
+))
+queue_depth = registry.register(Gauge(
+    "nutrisight_queue_depth", "Work waiting in each queue", ["queue"]
+))
+in_flight = registry.register(Gauge(
+    "nutrisight_in_flight_requests", "Requests currently being handled", ["scope"]
+))
+stage_peak_memory = registry.register(Gauge(
+    "nutrisight_stage_peak_memory_bytes", "Largest Python/numpy allocation peak seen in each stage while tracemalloc is tracing", ["stage"]
+))
+
+def record_cache(cache: str, result: str):
+    """Count a cache outcome and note it on the current request's flight-recorder trace"""
+    cache_requests.inc(cache, result)
+    note_cache(cache, result)
+
+# tracemalloc keeps one process-wide peak, so one stage at a time owns it: the outermost
+# stage of whichever request got there first. Stages nested in it (same context, including
+# its to_thread work) belong to its peak; a stage from any other request or thread voids it.
+_peak_lock = threading.Lock()
+_peak_owner: Optional["stage"] = None
+_peak_overlapped = False
+_peak_stage: ContextVar[Optional["stage"]] = ContextVar("traced_stage", default=None)
+
+class stage:
+    """Time a block into the stage duration histogram and the request's trace: `with stage("ocr"): ...`
+
+    While tracemalloc is tracing (see /admin/memory) the allocation peak of an
+    outermost stage is recorded too, but only when no other request's stage ran
+    alongside it; under concurrency most samples are dropped rather than mixed.
+    """
+    __slots__ = ("name", "start", "traced_start", "token")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        global _peak_owner, _peak_overlapped
+        self.traced_start = None
+        if tracemalloc.is_tracing():
+            with _peak_lock:
+                if _peak_owner is None:
+                    _peak_owner = self
+                    _peak_overlapped = False
+                    self.token = _peak_stage.set(self)
+                    self.traced_start = tracemalloc.get_traced_memory()[0]
+                    tracemalloc.reset_peak()
+                elif _peak_stage.get() is not _peak_owner:
+                    _peak_overlapped = True
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        global _peak_owner
+        elapsed = time.perf_counter() - self.start
+        stage_duration.observe(elapsed, self.name)
+        add_stage(self.name, elapsed)
+        if self.traced_start is not None:
+            with _peak_lock:
+                _peak_owner = None
+                _peak_stage.reset(self.token)
+                if _peak_overlapped or not tracemalloc.is_tracing():
+                    return False
+                peak = tracemalloc.get_traced_memory()[1] - self.traced_start
+            with stage_peak_memory.lock:
+                if peak > stage_peak_memory.values.get((self.name,), 0):
+                    stage_peak_memory.values[(self.name,)] = peak
+        return False
+
+def timed(name: str):
+    """Decorator form of stage() for functions that are a stage on their own"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+class InFlightMiddleware:
+    """Plain ASGI middleware counting in-flight HTTP requests; cheaper than BaseHTTPMiddleware on every request"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        in_flight.inc("http")
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            in_flight.dec("http")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, Float, Boolean, DateTime, ForeignKey, Enum
+from sqlalchemy import Column, Integer, String, Text, Float, Boolean, DateTime, ForeignKey, Enum, LargeBinary, UniqueConstraint, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -26,6 +26,9 @@ class Product(Base):
     ai_score = Column(Float)
     avg_user_rating = Column(Float, default=0.0)
     total_ratings = Column(Integer, default=0)
+    rating_sum = Column(Integer, default=0)  # Sum of star ratings, maintained incrementally with total_ratings
+    analysis_snapshot = Column(LargeBinary)  # zlib-compressed JSON of the full analysis result
+    analyzer_version = Column(Integer)  # ANALYZER_VERSION that produced analysis_snapshot
     is_verified = Column(Boolean, default=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
@@ -73,6 +76,7 @@ class User(Base):
 
 class UserRating(Base):
     __tablename__ = "user_ratings"
+    __table_args__ = (UniqueConstraint("product_id", "user_id", name="uq_user_ratings_product_user"),)
     
     rating_id = Column(Integer, primary_key=True, index=True)
     product_id = Column(Integer, ForeignKey("products.product_id"), nullable=False)
@@ -94,7 +98,10 @@ class ProductSubmission(Base):
     upc_barcode = Column(String(50))
     raw_image_url = Column(String(500))
     ai_extracted_text = Column(Text)
+    parsed_ingredients = Column(Text)  # JSON list parsed from ai_extracted_text
+    parser_version = Column(Integer)  # PARSER_VERSION that produced parsed_ingredients
     ai_analysis = Column(Text)  # JSON string of AI analysis
+    ai_analysis_stale = Column(Boolean, default=False)  # parsed_ingredients changed since ai_analysis; a re-analysis job is queued
     moderator_status = Column(Enum(SubmissionStatus), default=SubmissionStatus.PENDING)
     submission_date = Column(DateTime(timezone=True), server_default=func.now())
     reviewed_at = Column(DateTime(timezone=True))
@@ -103,3 +110,68 @@ class ProductSubmission(Base):
     # Relationships
     user = relationship("User", back_populates="submissions", foreign_keys=[user_id])
     reviewer = relationship("User", foreign_keys=[reviewed_by])
+
+class ResearchPaperRecord(Base):
+    __tablename__ = "research_papers"
+    
+    entry_id = Column(String(255), primary_key=True)  # arXiv entry id, each abstract is stored once
+    title = Column(Text, nullable=False)
+    authors = Column(Text)  # JSON string of author names
+    abstract = Column(Text)
+    published_date = Column(String(10))
+    journal = Column(String(255))
+    doi = Column(String(255))
+    fetched_at = Column(DateTime, nullable=False)
+
+class ResearchCacheEntry(Base):
+    __tablename__ = "research_cache"
+    
+    cache_key = Column(String(512), primary_key=True)  # normalized "ingredient|health concern"
+    ingredient = Column(String(255), nullable=False, index=True)
+    health_concern = Column(String(255))
+    paper_refs = Column(Text)  # JSON list of [entry_id, relevance_score] in ranked order
+    papers_updated_at = Column(DateTime)
+    evidence = Column(Text)  # JSON string of ScientificEvidence without the papers
+    evidence_updated_at = Column(DateTime)
+
+class ProductSignature(Base):
+    __tablename__ = "product_signatures"
+    
+    product_id = Column(Integer, ForeignKey("products.product_id"), primary_key=True)
+    ingredient_set = Column(Text, nullable=False)  # JSON list of canonical ingredient names
+    minhash = Column(LargeBinary, nullable=False)  # packed little-endian uint32 MinHash values
+
+class ProductLSHBucket(Base):
+    __tablename__ = "product_lsh_buckets"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    bucket_key = Column(String(40), nullable=False, index=True)  # "<band>:<hash of the band's rows>"
+    product_id = Column(Integer, ForeignKey("products.product_id"), nullable=False, index=True)
+
+class CacheInvalidation(Base):
+    __tablename__ = "cache_invalidations"
+    
+    seq = Column(Integer, primary_key=True, autoincrement=True)  # workers poll for rows past the last seq they saw
+    namespace = Column(String(50), nullable=False, index=True)
+    cache_key = Column(String(255), nullable=False)
+    created_at = Column(DateTime, nullable=False)
+
+class Job(Base):
+    __tablename__ = "jobs"
+    __table_args__ = (
+        Index("ix_jobs_queue_status_available", "queue", "status", "available_at"),
+    )
+    
+    job_id = Column(Integer, primary_key=True, autoincrement=True)
+    queue = Column(String(50), nullable=False)
+    payload = Column(Text, nullable=False)  # JSON string
+    status = Column(String(20), nullable=False, default="pending")  # pending, running, done, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=5)
+    available_at = Column(DateTime, nullable=False)  # not claimable before this (retry backoff)
+    locked_by = Column(String(100))
+    locked_until = Column(DateTime)  # visibility timeout; expired running jobs can be reclaimed
+    last_error = Column(Text)
+    created_at = Column(DateTime, nullable=False)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
@@ -0,0 +1,118 @@
+import asyncio
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional, Set
+
+PREMIUM_JOB_WORKERS = int(os.getenv("PREMIUM_JOB_WORKERS", "2"))
+# Queued plus running jobs; further submissions get 429 until some finish
+PREMIUM_JOB_MAX_ACTIVE = int(os.getenv("PREMIUM_JOB_MAX_ACTIVE", "8"))
+PREMIUM_JOB_TTL = int(os.getenv("PREMIUM_JOB_TTL", "900"))
+
+class JobCapacityExceeded(Exception):
+    pass
+
+@dataclass
+class PremiumJob:
+    job_id: str
+    status: str = "queued"  # queued, running, succeeded, failed
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    done: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("succeeded", "failed")
+
+    def as_dict(self) -> dict:
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "result": self.result,
+            "error": self.error
+        }
+
+class PremiumJobManager:
+    """Runs premium analyses on a bounded thread pool and keeps their results for a TTL.
+
+    Jobs live in this API process, so clients poll the same instance that accepted them.
+    """
+
+    def __init__(self, max_workers: int = PREMIUM_JOB_WORKERS, max_active: int = PREMIUM_JOB_MAX_ACTIVE, ttl: int = PREMIUM_JOB_TTL):
+        self.max_workers = max_workers
+        self.max_active = max_active
+        self.ttl = ttl
+        self.jobs: Dict[str, PremiumJob] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="premium-job")
+        return self._executor
+
+    def active_count(self) -> int:
+        return sum(1 for job in self.jobs.values() if not job.finished)
+
+    def purge_expired(self):
+        cutoff = time.time() - self.ttl
+        for job_id in [job_id for job_id, job in self.jobs.items() if job.finished and job.finished_at < cutoff]:
+            del self.jobs[job_id]
+
+    def submit(self, work: Callable[..., Dict[str, Any]], *args) -> PremiumJob:
+        """Queue work(*args) and return its job immediately; must be called on the event loop"""
+        self.purge_expired()
+        if self.active_count() >= self.max_active:
+            raise JobCapacityExceeded(f"{self.max_active} premium analyses already in progress, retry shortly")
+
+        job = PremiumJob(job_id=uuid.uuid4().hex)
+        self.jobs[job.job_id] = job
+
+        def run():
+            job.status = "running"
+            job.started_at = time.time()
+            return work(*args)
+
+        async def track():
+            try:
+                job.result = await asyncio.get_running_loop().run_in_executor(self.executor, run)
+                job.status = "succeeded"
+            except Exception as e:
+                job.error = str(e)
+                job.status = "failed"
+                print(f"Premium job {job.job_id} failed: {e}")
+            finally:
+                job.finished_at = time.time()
+                job.done.set()
+
+        task = asyncio.get_running_loop().create_task(track())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    def get(self, job_id: str) -> Optional[PremiumJob]:
+        self.purge_expired()
+        return self.jobs.get(job_id)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        statuses: Dict[str, int] = {}
+        for job in self.jobs.values():
+            statuses[job.status] = statuses.get(job.status, 0) + 1
+        return {"workers": self.max_workers, "max_active": self.max_active, "ttl_seconds": self.ttl, "jobs": statuses}
+
+# Global premium job manager instance
+premium_jobs = PremiumJobManager()
@@ -0,0 +1,163 @@
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Optional
+
+from sqlalchemy import delete, event, func, insert
+from sqlalchemy.orm import Session
+
+from metrics import record_cache
+from models import CacheInvalidation, Product
+
+PRODUCT_CACHE_SIZE = int(os.getenv("PRODUCT_CACHE_SIZE", "1024"))
+PRODUCT_CACHE_TTL = float(os.getenv("PRODUCT_CACHE_TTL", "60"))
+# How often each worker polls cache_invalidations for writes made by other workers
+PRODUCT_CACHE_SYNC_INTERVAL = float(os.getenv("PRODUCT_CACHE_SYNC_INTERVAL", "1.0"))
+INVALIDATION_RETENTION = timedelta(hours=1)
+# Generations bumped this recently are never pruned; must outlast any request that reads a product
+GENERATION_RETENTION_SECONDS = 300.0
+
+class ProductDetailCache:
+    """Bounded LRU cache of /products/{id} payloads.
+
+    Writers call invalidate() inside their transaction. That appends rows to
+    cache_invalidations, and the local entries are evicted once the transaction
+    commits. Other workers poll the table every PRODUCT_CACHE_SYNC_INTERVAL
+    seconds, so the table stands in for a pub/sub channel. The TTL bounds
+    staleness if a poll is ever missed.
+    """
+
+    namespace = "product_detail"
+
+    def __init__(self, max_entries: int = PRODUCT_CACHE_SIZE, ttl: float = PRODUCT_CACHE_TTL,
+                 sync_interval: float = PRODUCT_CACHE_SYNC_INTERVAL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.sync_interval = sync_interval
+        self.entries: "OrderedDict[int, tuple]" = OrderedDict()
+        # Bumped on every eviction so a read that raced a write cannot re-cache old data
+        self.generations: Dict[int, int] = {}
+        self.bumped_at: Dict[int, float] = {}
+        self.last_seq: Optional[int] = None
+        self.next_sync_at = 0.0
+        self.last_pruned_at = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    def generation(self, product_id: int) -> int:
+        return self.generations.get(product_id, 0)
+
+    def get(self, product_id: int) -> Optional[Dict[str, Any]]:
+        entry = self.entries.get(product_id)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self.entries[product_id]
+            self.misses += 1
+            record_cache(self.namespace, "miss")
+            return None
+        self.entries.move_to_end(product_id)
+        self.hits += 1
+        record_cache(self.namespace, "hit")
+        return entry[1]
+
+    def set(self, product_id: int, payload: Dict[str, Any], generation: int):
+        """Cache a payload read at `generation`, unless the product changed in the meantime"""
+        if self.generation(product_id) != generation:
+            return
+        self.entries[product_id] = (time.monotonic() + self.ttl, payload)
+        self.entries.move_to_end(product_id)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def evict(self, product_ids: Iterable[int]):
+        now = time.monotonic()
+        bumped = set()
+        for product_id in product_ids:
+            self.entries.pop(product_id, None)
+            self.generations[product_id] = self.generation(product_id) + 1
+            self.bumped_at[product_id] = now
+            bumped.add(product_id)
+        if len(self.generations) > self.max_entries * 4:
+            self.prune_generations(now, bumped)
+
+    def prune_generations(self, now: float, keep: Iterable[int] = ()):
+        """Forget generations of products that are not cached and were not bumped recently.
+
+        A reset generation is only safe once no read that started before the bump
+        can still be in flight, otherwise that read would match generation 0 again.
+        """
+        cutoff = now - GENERATION_RETENTION_SECONDS
+        keep = set(keep)
+        self.bumped_at = {
+            pid: at for pid, at in self.bumped_at.items()
+            if at >= cutoff or pid in keep or pid in self.entries
+        }
+        self.generations = {pid: gen for pid, gen in self.generations.items() if pid in self.bumped_at or pid in self.entries}
+
+    def needs_sync(self) -> bool:
+        return time.monotonic() >= self.next_sync_at
+
+    def sync(self, db: Session):
+        """Evict entries that other workers invalidated since the last poll"""
+        if self.last_seq is None:
+            self.last_seq = db.query(func.max(CacheInvalidation.seq)).scalar() or 0
+        else:
+            rows = db.query(CacheInvalidation.seq, CacheInvalidation.cache_key).filter(
+                CacheInvalidation.namespace == self.namespace,
+                CacheInvalidation.seq > self.last_seq
+            ).order_by(CacheInvalidation.seq).all()
+            if rows:
+                self.evict(int(row.cache_key) for row in rows)
+                self.last_seq = rows[-1].seq
+        self.next_sync_at = time.monotonic() + self.sync_interval
+
+    def invalidate(self, db: Session, product_ids: Iterable[int]):
+        """Publish invalidations in the caller's transaction; local eviction happens on commit"""
+        product_ids = set(product_ids)
+        if not product_ids:
+            return
+        now = datetime.utcnow()
+        connection = db.connection()
+        connection.execute(insert(CacheInvalidation), [
+            {"namespace": self.namespace, "cache_key": str(product_id), "created_at": now}
+            for product_id in product_ids
+        ])
+        if time.monotonic() - self.last_pruned_at > INVALIDATION_RETENTION.total_seconds() / 4:
+            connection.execute(delete(CacheInvalidation).where(CacheInvalidation.created_at < now - INVALIDATION_RETENTION))
+            self.last_pruned_at = time.monotonic()
+        db.info.setdefault("product_cache_evict", set()).update(product_ids)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0
+        }
+
+# Global product detail cache instance
+product_cache = ProductDetailCache()
+
+@event.listens_for(Session, "after_flush")
+def _invalidate_flushed_products(session, flush_context):
+    """ORM edits and deletes of products invalidate their cached detail payloads"""
+    changed = [
+        obj.product_id for obj in list(session.dirty) + list(session.deleted)
+        if isinstance(obj, Product) and obj.product_id is not None
+    ]
+    if changed:
+        product_cache.invalidate(session, changed)
+
+@event.listens_for(Session, "after_commit")
+def _evict_committed_invalidations(session):
+    product_ids = session.info.pop("product_cache_evict", None)
+    if product_ids:
+        product_cache.evict(product_ids)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back_invalidations(session):
+    session.info.pop("product_cache_evict", None)
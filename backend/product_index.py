@@ -0,0 +1,205 @@
+import hashlib
+import json
+import os
+import random
+import re
+import struct
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from sqlalchemy import delete, event, func, insert, inspect
+from sqlalchemy.orm import Session
+
+from models import Product, ProductLSHBucket, ProductSignature
+
+# LSH banding: bands * rows MinHash values per product. With 16 bands of 4 rows,
+# pairs around Jaccard 0.5 collide in at least one band about half the time.
+# Changing bands, rows or the seed requires `python product_index.py --rebuild`.
+PRODUCT_LSH_BANDS = int(os.getenv("PRODUCT_LSH_BANDS", "16"))
+PRODUCT_LSH_ROWS = int(os.getenv("PRODUCT_LSH_ROWS", "4"))
+PRODUCT_MINHASH_SEED = int(os.getenv("PRODUCT_MINHASH_SEED", "1"))
+PRODUCT_MATCH_THRESHOLD = float(os.getenv("PRODUCT_MATCH_THRESHOLD", "0.5"))
+PRODUCT_MATCH_TOP_K = int(os.getenv("PRODUCT_MATCH_TOP_K", "5"))
+PRODUCT_LSH_MAX_CANDIDATES = int(os.getenv("PRODUCT_LSH_MAX_CANDIDATES", "200"))
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+def _permutations(count: int, seed: int) -> List[Tuple[int, int]]:
+    rng = random.Random(seed)
+    return [(rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME)) for _ in range(count)]
+
+_PERMUTATIONS = _permutations(PRODUCT_LSH_BANDS * PRODUCT_LSH_ROWS, PRODUCT_MINHASH_SEED)
+
+def canonicalize_ingredient(name: str) -> str:
+    """Normalize an ingredient name: lowercase, no bracketed sub-ingredients, no stray punctuation"""
+    name = re.sub(r"[\(\[][^\)\]]*[\)\]]", " ", name.lower())
+    name = re.sub(r"[^a-z0-9%&' -]", " ", name)
+    name = re.sub(r"\s+", " ", name).strip(" -'")
+    return name
+
+def split_ingredients_text(text: str) -> List[str]:
+    """Split a label's ingredient text on top-level commas and semicolons, keeping list order"""
+    if not text:
+        return []
+    text = re.sub(r"^\s*ingredients?\s*[:\-]\s*", "", text, flags=re.IGNORECASE)
+    parts, depth, current = [], 0, []
+    for char in text:
+        if char in "([":
+            depth += 1
+        elif char in ")]":
+            depth = max(0, depth - 1)
+        if char in ",;" and depth == 0:
+            parts.append("".join(current))
+            current = []
+        else:
+            current.append(char)
+    parts.append("".join(current))
+    return [part.strip() for part in parts if part.strip()]
+
+def canonical_ingredient_set(ingredients: Iterable[str]) -> frozenset:
+    return frozenset(name for name in (canonicalize_ingredient(i) for i in ingredients) if name)
+
+def _base_hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "little")
+
+def compute_minhash(ingredient_set: Iterable[str]) -> List[int]:
+    """MinHash signature of a canonical ingredient set"""
+    hashes = [_base_hash(name) for name in ingredient_set]
+    if not hashes:
+        return [_MAX_HASH] * len(_PERMUTATIONS)
+    return [
+        min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+        for a, b in _PERMUTATIONS
+    ]
+
+def pack_signature(signature: Sequence[int]) -> bytes:
+    return struct.pack(f"<{len(signature)}I", *signature)
+
+def unpack_signature(data: bytes) -> List[int]:
+    return list(struct.unpack(f"<{len(data) // 4}I", data))
+
+def lsh_bucket_keys(signature: Sequence[int]) -> List[str]:
+    """One bucket key per band; products sharing any key become match candidates"""
+    keys = []
+    for band in range(PRODUCT_LSH_BANDS):
+        rows = signature[band * PRODUCT_LSH_ROWS:(band + 1) * PRODUCT_LSH_ROWS]
+        digest = hashlib.blake2b(pack_signature(rows), digest_size=8).hexdigest()
+        keys.append(f"{band}:{digest}")
+    return keys
+
+def jaccard(a: frozenset, b: frozenset) -> float:
+    if not a and not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+def index_products(connection, products: Iterable[Tuple[int, Iterable[str]]]):
+    """Replace the signature and LSH buckets for (product_id, ingredients) pairs on a Core connection"""
+    signature_rows, bucket_rows, product_ids = [], [], []
+    for product_id, ingredients in products:
+        product_ids.append(product_id)
+        ingredient_set = canonical_ingredient_set(ingredients)
+        if not ingredient_set:
+            continue
+        signature = compute_minhash(ingredient_set)
+        signature_rows.append({
+            "product_id": product_id,
+            "ingredient_set": json.dumps(sorted(ingredient_set)),
+            "minhash": pack_signature(signature)
+        })
+        bucket_rows.extend({"bucket_key": key, "product_id": product_id} for key in lsh_bucket_keys(signature))
+
+    if not product_ids:
+        return
+    connection.execute(delete(ProductLSHBucket).where(ProductLSHBucket.product_id.in_(product_ids)))
+    connection.execute(delete(ProductSignature).where(ProductSignature.product_id.in_(product_ids)))
+    if signature_rows:
+        connection.execute(insert(ProductSignature), signature_rows)
+        connection.execute(insert(ProductLSHBucket), bucket_rows)
+
+def product_ingredient_names(product: Product) -> List[str]:
+    return split_ingredients_text(product.ingredients_text or "")
+
+@event.listens_for(Session, "after_flush")
+def _index_flushed_products(session, flush_context):
+    """Keep the similarity index in sync whenever the ORM inserts or edits a product"""
+    changed = [
+        obj for obj in list(session.new) + list(session.dirty)
+        if isinstance(obj, Product) and (obj in session.new or inspect(obj).attrs.ingredients_text.history.has_changes())
+    ]
+    if changed:
+        index_products(session.connection(), [(p.product_id, product_ingredient_names(p)) for p in changed])
+
+def find_similar_products(
+    db: Session,
+    ingredients: Iterable[str],
+    threshold: float = PRODUCT_MATCH_THRESHOLD,
+    limit: int = PRODUCT_MATCH_TOP_K
+) -> List[Tuple[Product, float]]:
+    """Products whose ingredient sets have Jaccard similarity >= threshold, best first"""
+    query_set = canonical_ingredient_set(ingredients)
+    if not query_set:
+        return []
+
+    # Candidates share at least one LSH band; the most colliding bands come first
+    keys = lsh_bucket_keys(compute_minhash(query_set))
+    candidate_ids = [
+        row.product_id for row in db.query(ProductLSHBucket.product_id)
+        .filter(ProductLSHBucket.bucket_key.in_(keys))
+        .group_by(ProductLSHBucket.product_id)
+        .order_by(func.count().desc())
+        .limit(PRODUCT_LSH_MAX_CANDIDATES)
+    ]
+    if not candidate_ids:
+        return []
+
+    scored: Dict[int, float] = {}
+    for row in db.query(ProductSignature.product_id, ProductSignature.ingredient_set).filter(
+        ProductSignature.product_id.in_(candidate_ids)
+    ):
+        similarity = jaccard(query_set, frozenset(json.loads(row.ingredient_set)))
+        if similarity >= threshold:
+            scored[row.product_id] = similarity
+    if not scored:
+        return []
+
+    best_ids = sorted(scored, key=scored.get, reverse=True)[:limit]
+    products = {p.product_id: p for p in db.query(Product).filter(Product.product_id.in_(best_ids))}
+    return [(products[pid], scored[pid]) for pid in best_ids if pid in products]
+
+def rebuild_index(db: Session, batch_size: int = 1000) -> int:
+    """Recompute every product's signature, e.g. after changing the LSH configuration"""
+    connection = db.connection()
+    connection.execute(delete(ProductLSHBucket))
+    connection.execute(delete(ProductSignature))
+
+    indexed, last_id = 0, 0
+    while True:
+        batch = db.query(Product.product_id, Product.ingredients_text).filter(
+            Product.product_id > last_id
+        ).order_by(Product.product_id).limit(batch_size).all()
+        if not batch:
+            break
+        index_products(connection, [(row.product_id, split_ingredients_text(row.ingredients_text or "")) for row in batch])
+        db.commit()
+        connection = db.connection()
+        indexed += len(batch)
+        last_id = batch[-1].product_id
+    return indexed
+
+if __name__ == "__main__":
+    import argparse
+    from database import SessionLocal, create_tables
+
+    parser = argparse.ArgumentParser(description="Maintain the product ingredient similarity index")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute signatures for every product")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        create_tables()
+        db = SessionLocal()
+        try:
+            print(f"Indexed {rebuild_index(db)} products")
+        finally:
+            db.close()
+    else:
+        parser.print_help()
@@ -0,0 +1,114 @@
+import re
+from typing import List
+
+from sqlalchemy import inspect, or_, text
+from sqlalchemy.orm import Session
+
+from models import Product
+
+MAX_QUERY_TERMS = 8
+
+# SQLite: external-content FTS5 table over products, kept in sync by triggers so
+# ORM writes and bulk Core inserts are indexed alike. prefix='2 3' adds prefix
+# indexes that make short type-ahead queries cheap.
+SQLITE_FTS_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+        name, ingredients_text,
+        content='products', content_rowid='product_id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN
+        INSERT INTO products_fts(rowid, name, ingredients_text)
+        VALUES (new.product_id, new.name, new.ingredients_text);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name, ingredients_text)
+        VALUES ('delete', old.product_id, old.name, old.ingredients_text);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS products_fts_au AFTER UPDATE OF name, ingredients_text ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name, ingredients_text)
+        VALUES ('delete', old.product_id, old.name, old.ingredients_text);
+        INSERT INTO products_fts(rowid, name, ingredients_text)
+        VALUES (new.product_id, new.name, new.ingredients_text);
+    END
+    """
+]
+
+# Postgres: a generated tsvector column (name weighted above ingredients) with a GIN index
+POSTGRES_FTS_DDL = [
+    """
+    ALTER TABLE products ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(ingredients_text, '')), 'B')
+    ) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_products_search_vector ON products USING GIN (search_vector)"
+]
+
+# bm25() returns lower-is-better scores; matches in the name count ten times more
+SQLITE_SEARCH_SQL = """
+    SELECT rowid AS product_id FROM products_fts
+    WHERE products_fts MATCH :match
+    ORDER BY bm25(products_fts, 10.0, 1.0)
+    LIMIT :limit
+"""
+
+POSTGRES_SEARCH_SQL = """
+    SELECT product_id FROM products, to_tsquery('english', :match) AS query
+    WHERE search_vector @@ query
+    ORDER BY ts_rank(search_vector, query) DESC
+    LIMIT :limit
+"""
+
+def query_terms(query: str) -> List[str]:
+    return re.findall(r"\w+", query.lower())[:MAX_QUERY_TERMS]
+
+def sqlite_match_expression(terms: List[str]) -> str:
+    """Every term must match as a prefix, so partially typed words already find results"""
+    return " ".join(f'"{term}"*' for term in terms)
+
+def postgres_match_expression(terms: List[str]) -> str:
+    return " & ".join(f"{term}:*" for term in terms)
+
+def ensure_search_index(engine):
+    """Create the full-text index for the configured database and backfill it if it is new"""
+    with engine.begin() as connection:
+        if engine.dialect.name == "sqlite":
+            is_new = not inspect(connection).has_table("products_fts")
+            for statement in SQLITE_FTS_DDL:
+                connection.execute(text(statement))
+            if is_new:
+                connection.execute(text("INSERT INTO products_fts(products_fts) VALUES ('rebuild')"))
+        elif engine.dialect.name == "postgresql":
+            for statement in POSTGRES_FTS_DDL:
+                connection.execute(text(statement))
+
+def full_text_search(db: Session, query: str, limit: int = 10) -> List[Product]:
+    """Search products by name or ingredients, ranked by BM25 (SQLite) or ts_rank (Postgres)"""
+    terms = query_terms(query)
+    if not terms:
+        return []
+
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        rows = db.execute(text(SQLITE_SEARCH_SQL), {"match": sqlite_match_expression(terms), "limit": limit})
+    elif dialect == "postgresql":
+        rows = db.execute(text(POSTGRES_SEARCH_SQL), {"match": postgres_match_expression(terms), "limit": limit})
+    else:
+        # No full-text backend for this database, fall back to an unranked substring scan
+        return db.query(Product).filter(
+            or_(Product.name.contains(query), Product.ingredients_text.contains(query))
+        ).limit(limit).all()
+
+    product_ids = [row.product_id for row in rows]
+    if not product_ids:
+        return []
+    products = {p.product_id: p for p in db.query(Product).filter(Product.product_id.in_(product_ids))}
+    return [products[pid] for pid in product_ids if pid in products]
@@ -0,0 +1,168 @@
+import asyncio
+import cProfile
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+from typing import Optional
+from urllib.parse import parse_qs
+
+from admin_auth import is_admin_token
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_DIR_MAX_BYTES = int(os.getenv("PROFILE_DIR_MAX_BYTES", str(200 * 1024 * 1024)))
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005"))
+MAX_SAMPLE_DEPTH = 128
+MODES = ("cprofile", "sample")
+
+def requested_mode(scope) -> Optional[str]:
+    """Profiling mode asked for via the X-Profile header or ?profile=, or None; anything but "cprofile" samples"""
+    mode = None
+    for name, value in scope["headers"]:
+        if name == PROFILE_HEADER:
+            mode = value.decode("latin-1").strip().lower()
+            break
+    if mode is None and b"profile=" in scope.get("query_string", b""):
+        mode = parse_qs(scope["query_string"].decode("latin-1")).get("profile", [""])[0].lower()
+    if not mode:
+        return None
+    return mode if mode in MODES else "sample"
+
+def _admin_token(scope) -> Optional[str]:
+    for name, value in scope["headers"]:
+        if name == b"x-admin-token":
+            return value.decode("latin-1")
+    return None
+
+class StackSampler:
+    """Samples every thread's Python stack at a fixed interval into collapsed-stack counts.
+
+    Unlike cProfile this also sees the OCR and LLM work that runs in asyncio.to_thread workers.
+    """
+
+    def __init__(self, interval: float = PROFILE_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def _run(self):
+        own_id = threading.get_ident()
+        names = {}
+        while not self.stop_event.wait(self.interval):
+            names.update((thread.ident, thread.name) for thread in threading.enumerate())
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                frames = []
+                while frame is not None and len(frames) < MAX_SAMPLE_DEPTH:
+                    code = frame.f_code
+                    frames.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                frames.append(names.get(thread_id, str(thread_id)))
+                self.stacks[";".join(reversed(frames))] += 1
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+
+    def write(self, path: str):
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+def enforce_size_cap(directory: str = PROFILE_DIR, max_bytes: int = PROFILE_DIR_MAX_BYTES):
+    """Delete the oldest profiles until the directory fits under its cap"""
+    files = []
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        files.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+class ProfilingMiddleware:
+    """Profiles single requests on demand: X-Profile: cprofile|sample (or ?profile=) plus a valid X-Admin-Token.
+
+    Requests without the flag only pay for the header check. One request is profiled
+    at a time; others asking meanwhile run normally with X-Profile-Status: busy.
+    cprofile traces the whole event loop thread while the request runs, so every
+    concurrent request is slowed down and shows up in its .pstats file too; the
+    default, sample, only reads stacks and costs the other requests next to nothing.
+    """
+
+    def __init__(self, app, directory: str = PROFILE_DIR):
+        self.app = app
+        self.directory = directory
+        self.lock = threading.Lock()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        mode = requested_mode(scope)
+        if mode is None or not is_admin_token(_admin_token(scope)):
+            await self.app(scope, receive, send)
+            return
+        if not self.lock.acquire(blocking=False):
+            await self.app(scope, receive, self._with_headers(send, [(b"x-profile-status", b"busy")]))
+            return
+
+        try:
+            slug = re.sub(r"[^A-Za-z0-9]+", "_", scope["path"]).strip("_") or "root"
+            filename = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{scope['method']}-{slug}-{uuid.uuid4().hex[:8]}"
+            filename += ".pstats" if mode == "cprofile" else ".collapsed"
+            headers = [(b"x-profile-status", b"recorded"), (b"x-profile-file", filename.encode())]
+
+            start = time.perf_counter()
+            if mode == "cprofile":
+                # Deterministic, but only for code on the event loop thread, and that includes other requests
+                profiler = cProfile.Profile()
+                profiler.enable()
+                try:
+                    await self.app(scope, receive, self._with_headers(send, headers))
+                finally:
+                    profiler.disable()
+                    await asyncio.to_thread(self._save, lambda path: profiler.dump_stats(path), filename)
+            else:
+                sampler = StackSampler()
+                sampler.start()
+                try:
+                    await self.app(scope, receive, self._with_headers(send, headers))
+                finally:
+                    sampler.stop()
+                    await asyncio.to_thread(self._save, sampler.write, filename)
+            print(f"Profiled {scope['method']} {scope['path']} ({mode}, {time.perf_counter() - start:.2f}s) -> {filename}")
+        finally:
+            self.lock.release()
+
+    def _save(self, write, filename: str):
+        os.makedirs(self.directory, exist_ok=True)
+        write(os.path.join(self.directory, filename))
+        enforce_size_cap(self.directory)
+
+    @staticmethod
+    def _with_headers(send, headers):
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": list(message.get("headers", [])) + headers}
+            await send(message)
+        return send_with_headers
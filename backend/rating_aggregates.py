@@ -0,0 +1,136 @@
+from typing import Optional
+
+from sqlalchemy import Numeric, and_, case, cast, func, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models import Product, UserRating
+from product_cache import product_cache
+
+MAX_RATING_ATTEMPTS = 3
+
+def apply_rating_delta(db: Session, product_id: int, sum_delta: int, count_delta: int) -> int:
+    """Adjust a product's rating sum, count and average in one atomic UPDATE"""
+    new_sum = func.coalesce(Product.rating_sum, 0) + sum_delta
+    new_count = func.coalesce(Product.total_ratings, 0) + count_delta
+    return db.query(Product).filter(Product.product_id == product_id).update({
+        Product.rating_sum: new_sum,
+        Product.total_ratings: new_count,
+        Product.avg_user_rating: case(
+            (new_count > 0, func.round(cast(new_sum, Numeric(12, 4)) / new_count, 1)),
+            else_=0.0
+        )
+    }, synchronize_session=False)
+
+def submit_rating(db: Session, product_id: int, user_id: int, star_rating: int, review_text: Optional[str] = None):
+    """Insert or replace a user's rating and update the product aggregates in the same transaction.
+
+    Replacing a rating is a compare-and-set on the old star value, and a duplicate insert
+    hits the (product_id, user_id) unique constraint. Either race retries with fresh state.
+    """
+    for _ in range(MAX_RATING_ATTEMPTS):
+        existing = db.query(UserRating).filter(
+            and_(
+                UserRating.product_id == product_id,
+                UserRating.user_id == user_id
+            )
+        ).first()
+
+        if existing:
+            old_rating = existing.star_rating
+            updated = db.query(UserRating).filter(
+                UserRating.rating_id == existing.rating_id,
+                UserRating.star_rating == old_rating
+            ).update({
+                UserRating.star_rating: star_rating,
+                UserRating.review_text: review_text
+            }, synchronize_session=False)
+            if not updated:
+                db.rollback()
+                continue
+            apply_rating_delta(db, product_id, star_rating - old_rating, 0)
+        else:
+            db.add(UserRating(
+                product_id=product_id,
+                user_id=user_id,
+                star_rating=star_rating,
+                review_text=review_text
+            ))
+            try:
+                db.flush()
+            except IntegrityError:
+                db.rollback()
+                continue
+            apply_rating_delta(db, product_id, star_rating, 1)
+
+        product_cache.invalidate(db, [product_id])
+        db.commit()
+        return
+    raise RuntimeError("Rating changed concurrently, please retry")
+
+def reconcile_rating_aggregates(db: Session, fix: bool = False) -> dict:
+    """Recompute every product's rating aggregates in bulk and report (optionally repair) drift"""
+    actual = select(
+        UserRating.product_id,
+        func.sum(UserRating.star_rating).label("rating_sum"),
+        func.count().label("rating_count")
+    ).group_by(UserRating.product_id).subquery()
+
+    actual_sum = func.coalesce(actual.c.rating_sum, 0)
+    actual_count = func.coalesce(actual.c.rating_count, 0)
+    drifted = db.query(
+        Product.product_id,
+        Product.rating_sum,
+        Product.total_ratings,
+        actual_sum.label("actual_sum"),
+        actual_count.label("actual_count")
+    ).outerjoin(actual, actual.c.product_id == Product.product_id).filter(
+        or_(
+            func.coalesce(Product.rating_sum, 0) != actual_sum,
+            func.coalesce(Product.total_ratings, 0) != actual_count
+        )
+    ).all()
+
+    if fix and drifted:
+        db.execute(update(Product), [
+            {
+                "product_id": row.product_id,
+                "rating_sum": row.actual_sum,
+                "total_ratings": row.actual_count,
+                "avg_user_rating": round(row.actual_sum / row.actual_count, 1) if row.actual_count else 0.0
+            }
+            for row in drifted
+        ])
+        product_cache.invalidate(db, [row.product_id for row in drifted])
+        db.commit()
+
+    return {
+        "products_drifted": len(drifted),
+        "fixed": fix,
+        "examples": [
+            {
+                "product_id": row.product_id,
+                "stored_sum": row.rating_sum,
+                "stored_count": row.total_ratings,
+                "actual_sum": row.actual_sum,
+                "actual_count": row.actual_count
+            }
+            for row in drifted[:20]
+        ]
+    }
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    from database import SessionLocal, create_tables
+
+    parser = argparse.ArgumentParser(description="Check product rating aggregates against user_ratings")
+    parser.add_argument("--fix", action="store_true", help="Overwrite drifted aggregates with recomputed values")
+    args = parser.parse_args()
+
+    create_tables()
+    db = SessionLocal()
+    try:
+        print(json.dumps(reconcile_rating_aggregates(db, fix=args.fix), indent=2))
+    finally:
+        db.close()
@@ -0,0 +1,114 @@
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional, Tuple
+
+from sqlalchemy import or_, update
+from sqlalchemy.orm import Session
+
+from ingredient_parser import PARSER_VERSION, derive_ingredient_fields
+from job_queue import enqueue
+from models import ProductSubmission
+from submission_worker import SUBMISSION_QUEUE
+
+REPROCESS_BATCH_SIZE = int(os.getenv("REPROCESS_BATCH_SIZE", "1000"))
+
+def parse_batch(rows: List[Tuple[int, str, Optional[str]]]) -> List[Tuple[int, dict, bool]]:
+    """Worker process: re-parse stored OCR text -> (submission_id, derived fields, ingredients changed).
+
+    Rows parsed for the first time (parsed_ingredients still NULL) are a backfill, not a change.
+    """
+    results = []
+    for submission_id, extracted_text, old_parsed in rows:
+        fields = derive_ingredient_fields(extracted_text)
+        changed = old_parsed is not None and fields["parsed_ingredients"] != old_parsed
+        results.append((submission_id, fields, changed))
+    return results
+
+def outdated_batches(db: Session, batch_size: int) -> Iterator[list]:
+    """Submissions whose derived fields predate PARSER_VERSION, in id order"""
+    last_id = 0
+    while True:
+        batch = db.query(
+            ProductSubmission.submission_id,
+            ProductSubmission.ai_extracted_text,
+            ProductSubmission.parsed_ingredients
+        ).filter(
+            ProductSubmission.submission_id > last_id,
+            ProductSubmission.ai_extracted_text.isnot(None),
+            or_(ProductSubmission.parser_version.is_(None), ProductSubmission.parser_version < PARSER_VERSION)
+        ).order_by(ProductSubmission.submission_id).limit(batch_size).all()
+        if not batch:
+            return
+        last_id = batch[-1].submission_id
+        yield [tuple(row) for row in batch]
+
+def reprocess_submissions(
+    db: Session,
+    batch_size: int = REPROCESS_BATCH_SIZE,
+    workers: Optional[int] = None,
+    dry_run: bool = False
+) -> dict:
+    """Re-derive parsed ingredients for submissions stamped with an older parser version.
+
+    Only outdated rows are selected, so an interrupted run simply picks up the
+    remainder next time. A submission whose ingredient list changes keeps its
+    stored analysis, flagged ai_analysis_stale, and is queued for the submission
+    worker to analyze again; the job commits with the new fields.
+    """
+    workers = workers or os.cpu_count() or 1
+    stats = {"reprocessed": 0, "ingredients_changed": 0}
+    start = time.perf_counter()
+
+    def finish(results):
+        stats["reprocessed"] += len(results)
+        stats["ingredients_changed"] += sum(1 for _, _, changed in results if changed)
+        if not dry_run:
+            db.execute(update(ProductSubmission), [
+                {"submission_id": submission_id, **fields, **({"ai_analysis_stale": True} if changed else {})}
+                for submission_id, fields, changed in results
+            ])
+            for submission_id, _, changed in results:
+                if changed:
+                    enqueue(db, SUBMISSION_QUEUE, {"submission_id": submission_id})
+            db.commit()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        in_flight = deque()
+        for batch in outdated_batches(db, batch_size):
+            in_flight.append(pool.submit(parse_batch, batch))
+            if len(in_flight) >= workers * 2:
+                finish(in_flight.popleft().result())
+                elapsed = time.perf_counter() - start
+                print(f"{stats['reprocessed']} submissions ({stats['reprocessed'] / max(elapsed, 1e-9):.0f} rows/sec)")
+        while in_flight:
+            finish(in_flight.popleft().result())
+
+    elapsed = time.perf_counter() - start
+    return {
+        "parser_version": PARSER_VERSION,
+        "dry_run": dry_run,
+        "workers": workers,
+        **stats,
+        "seconds": round(elapsed, 2),
+        "rows_per_second": round(stats["reprocessed"] / elapsed, 1) if elapsed else 0.0
+    }
+
+if __name__ == "__main__":
+    import argparse
+    from database import SessionLocal, create_tables
+
+    parser = argparse.ArgumentParser(description="Re-parse stored OCR text of submissions with an older parser version")
+    parser.add_argument("--dry-run", action="store_true", help="Count outdated rows and changed ingredient lists without writing")
+    parser.add_argument("--batch-size", type=int, default=REPROCESS_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, help="Parsing processes (default: CPU count)")
+    args = parser.parse_args()
+
+    create_tables()
+    db = SessionLocal()
+    try:
+        print(json.dumps(reprocess_submissions(db, args.batch_size, args.workers, args.dry_run), indent=2))
+    finally:
+        db.close()
@@ -0,0 +1,185 @@
+import json
+import os
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+from sqlalchemy import select, text, update
+from sqlalchemy.orm import Session
+
+from models import Product
+from product_cache import product_cache
+from product_index import split_ingredients_text
+from scoring import fallback_analysis
+
+RESCORE_BATCH_SIZE = int(os.getenv("RESCORE_BATCH_SIZE", "2000"))
+
+def score_batch(rows: List[Tuple[int, str, Optional[float]]]) -> List[Tuple[int, Optional[float], int]]:
+    """Worker process: (product_id, ingredients_text, old_score) -> (product_id, old_score, new_score)"""
+    results = []
+    for product_id, ingredients_text, old_score in rows:
+        ingredients = split_ingredients_text(ingredients_text or "")
+        if ingredients:
+            results.append((product_id, old_score, fallback_analysis(ingredients)["score"]))
+    return results
+
+def stream_products(db: Session, after_id: int, batch_size: int):
+    """Yield batches of products in id order from a server-side cursor"""
+    result = db.execute(
+        select(Product.product_id, Product.ingredients_text, Product.ai_score)
+        .where(Product.product_id > after_id)
+        .order_by(Product.product_id)
+        .execution_options(stream_results=True, yield_per=batch_size)
+    )
+    for partition in result.partitions():
+        yield [tuple(row) for row in partition]
+
+def load_checkpoint(path: Optional[str]) -> int:
+    if not path or not os.path.exists(path):
+        return 0
+    with open(path) as handle:
+        return json.load(handle)["last_product_id"]
+
+def save_checkpoint(path: str, last_product_id: int):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w") as handle:
+        json.dump({"last_product_id": last_product_id, "saved_at": time.time()}, handle)
+    os.replace(temp_path, path)
+
+def score_bucket(score: Optional[float]) -> str:
+    if score is None:
+        return "unscored"
+    low = min(int(score) // 10 * 10, 90)
+    return f"{low}-{low + 9 if low < 90 else 100}"
+
+class RescoreReport:
+    """Old vs new score distribution for the rows a run touched"""
+
+    def __init__(self):
+        self.old = Counter()
+        self.new = Counter()
+        self.scored = 0
+        self.changed = 0
+        self.compared = 0
+        self.total_shift = 0.0
+        self.largest_moves: List[Tuple[float, int, Optional[float], int]] = []
+
+    def add(self, results: List[Tuple[int, Optional[float], int]]):
+        for product_id, old_score, new_score in results:
+            self.scored += 1
+            self.old[score_bucket(old_score)] += 1
+            self.new[score_bucket(new_score)] += 1
+            if old_score != new_score:
+                self.changed += 1
+            if old_score is not None:
+                self.compared += 1
+                self.total_shift += new_score - old_score
+                self.largest_moves.append((abs(new_score - old_score), product_id, old_score, new_score))
+        self.largest_moves = sorted(self.largest_moves, reverse=True)[:10]
+
+    def as_dict(self) -> dict:
+        buckets = sorted(set(self.old) | set(self.new), key=lambda b: (b == "unscored", int(b.split("-")[0]) if b != "unscored" else 0))
+        return {
+            "products_scored": self.scored,
+            "scores_changed": self.changed,
+            "mean_shift": round(self.total_shift / self.compared, 2) if self.compared else 0.0,
+            "distribution": {bucket: {"before": self.old[bucket], "after": self.new[bucket]} for bucket in buckets},
+            "largest_moves": [
+                {"product_id": product_id, "before": old, "after": new}
+                for _, product_id, old, new in self.largest_moves
+            ]
+        }
+
+def write_scores(db: Session, results: List[Tuple[int, Optional[float], int]]):
+    changed = [(product_id, new_score) for product_id, old_score, new_score in results if old_score != new_score]
+    if changed:
+        db.execute(update(Product), [{"product_id": product_id, "ai_score": score} for product_id, score in changed])
+        product_cache.invalidate(db, [product_id for product_id, _ in changed])
+    db.commit()
+
+def rescore_products(
+    read_db: Session,
+    write_db: Session,
+    batch_size: int = RESCORE_BATCH_SIZE,
+    workers: Optional[int] = None,
+    checkpoint_path: Optional[str] = None,
+    dry_run: bool = False
+) -> dict:
+    """Recompute ai_score for every product with the rule-based scorer.
+
+    Batches stream from a server-side cursor on `read_db` into a process pool.
+    Results are written back in order on `write_db`, and each commit advances the
+    checkpoint, so a rerun resumes after the last written batch.
+    """
+    workers = workers or os.cpu_count() or 1
+    last_id = 0 if dry_run else load_checkpoint(checkpoint_path)
+    resumed_from = last_id
+    report = RescoreReport()
+    rows_read = 0
+    start = time.perf_counter()
+
+    def finish(batch_last_id: int, results):
+        nonlocal last_id
+        report.add(results)
+        if not dry_run:
+            write_scores(write_db, results)
+            if checkpoint_path:
+                save_checkpoint(checkpoint_path, batch_last_id)
+        last_id = batch_last_id
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        in_flight = deque()
+        for batch in stream_products(read_db, last_id, batch_size):
+            rows_read += len(batch)
+            in_flight.append((batch[-1][0], pool.submit(score_batch, batch)))
+            # Bound memory to a couple of batches per worker; write back in id order
+            if len(in_flight) >= workers * 2:
+                batch_last_id, future = in_flight.popleft()
+                finish(batch_last_id, future.result())
+                elapsed = time.perf_counter() - start
+                print(f"Rescored through product {last_id} ({rows_read / max(elapsed, 1e-9):.0f} rows/sec)")
+        while in_flight:
+            batch_last_id, future = in_flight.popleft()
+            finish(batch_last_id, future.result())
+
+    elapsed = time.perf_counter() - start
+    return {
+        "dry_run": dry_run,
+        "workers": workers,
+        "resumed_after_product": resumed_from,
+        "last_product_id": last_id,
+        "rows_read": rows_read,
+        "seconds": round(elapsed, 2),
+        "rows_per_second": round(rows_read / elapsed, 1) if elapsed else 0.0,
+        **report.as_dict()
+    }
+
+if __name__ == "__main__":
+    import argparse
+    from database import SessionLocal, create_tables, engine
+
+    parser = argparse.ArgumentParser(description="Recompute Product.ai_score with the current scoring rules")
+    parser.add_argument("--dry-run", action="store_true", help="Report the score distribution shift without writing")
+    parser.add_argument("--batch-size", type=int, default=RESCORE_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, help="Scoring processes (default: CPU count)")
+    parser.add_argument("--checkpoint", help="Checkpoint file; an existing one resumes after its last product")
+    args = parser.parse_args()
+
+    create_tables()
+    if engine.dialect.name == "sqlite":
+        # WAL lets the streaming read transaction stay open while batches are committed
+        with engine.connect() as connection:
+            connection.execute(text("PRAGMA journal_mode=WAL"))
+    read_db, write_db = SessionLocal(), SessionLocal()
+    try:
+        print(json.dumps(rescore_products(
+            read_db, write_db,
+            batch_size=args.batch_size,
+            workers=args.workers,
+            checkpoint_path=args.checkpoint,
+            dry_run=args.dry_run
+        ), indent=2))
+    finally:
+        read_db.close()
+        write_db.close()
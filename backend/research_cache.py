@@ -0,0 +1,216 @@
+import json
+import os
+import re
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from cache_backend import research_evidence_cache
+from database import SessionLocal
+from models import ResearchCacheEntry, ResearchPaperRecord
+
+# Entries older than the soft TTL are served stale and refreshed in the background,
+# entries older than the hard TTL are treated as missing
+RESEARCH_CACHE_SOFT_TTL = int(os.getenv("RESEARCH_CACHE_SOFT_TTL", str(7 * 24 * 3600)))
+RESEARCH_CACHE_HARD_TTL = int(os.getenv("RESEARCH_CACHE_HARD_TTL", str(30 * 24 * 3600)))
+PURGE_DELETE_CHUNK = 500
+
+def normalize_research_key(ingredient: str, health_concern: Optional[str] = None) -> str:
+    """Build the cache key for an ingredient and optional health concern"""
+    ingredient_key = re.sub(r"\s+", " ", ingredient.strip().lower())
+    concern_key = re.sub(r"\s+", " ", (health_concern or "").strip().lower())
+    return f"{ingredient_key}|{concern_key}"
+
+class ResearchCache:
+    """Persistent cache of arXiv paper lists and AI evidence with stale-while-revalidate TTLs"""
+
+    def __init__(self, soft_ttl: int = RESEARCH_CACHE_SOFT_TTL, hard_ttl: int = RESEARCH_CACHE_HARD_TTL):
+        self.soft_ttl = timedelta(seconds=soft_ttl)
+        self.hard_ttl = timedelta(seconds=max(soft_ttl, hard_ttl))
+
+    def _staleness(self, updated_at: Optional[datetime]) -> Optional[bool]:
+        """Return None for missing or expired data, otherwise whether it is past the soft TTL"""
+        if updated_at is None:
+            return None
+        age = datetime.utcnow() - updated_at
+        if age > self.hard_ttl:
+            return None
+        return age > self.soft_ttl
+
+    def _load_papers(self, db, paper_refs: Optional[str]) -> List[Dict]:
+        refs = json.loads(paper_refs or "[]")
+        if not refs:
+            return []
+        records = db.query(ResearchPaperRecord).filter(
+            ResearchPaperRecord.entry_id.in_([entry_id for entry_id, _ in refs])
+        ).all()
+        records_by_id = {record.entry_id: record for record in records}
+
+        papers = []
+        for entry_id, relevance_score in refs:
+            record = records_by_id.get(entry_id)
+            if record is not None:
+                papers.append(paper_record_to_dict(record, relevance_score))
+        return papers
+
+    def _get_or_create_entry(self, db, ingredient: str, health_concern: Optional[str]) -> ResearchCacheEntry:
+        key = normalize_research_key(ingredient, health_concern)
+        entry = db.get(ResearchCacheEntry, key)
+        if entry is None:
+            entry = ResearchCacheEntry(
+                cache_key=key,
+                ingredient=ingredient.strip().lower(),
+                health_concern=(health_concern or "").strip().lower() or None
+            )
+            db.add(entry)
+        return entry
+
+    def _store_paper_refs(self, db, entry: ResearchCacheEntry, papers: List[Dict]):
+        now = datetime.utcnow()
+        for paper in papers:
+            # Abstracts are deduplicated by arXiv entry id across every cached query
+            db.merge(ResearchPaperRecord(
+                entry_id=paper["url"],
+                title=paper["title"],
+                authors=json.dumps(paper.get("authors", [])),
+                abstract=paper.get("abstract"),
+                published_date=paper.get("published_date"),
+                journal=paper.get("journal"),
+                doi=paper.get("doi"),
+                fetched_at=now
+            ))
+        entry.paper_refs = json.dumps([[paper["url"], paper.get("relevance_score", 0.0)] for paper in papers])
+        entry.papers_updated_at = now
+
+    def get_papers(self, ingredient: str, health_concern: Optional[str] = None) -> Optional[Tuple[List[Dict], bool]]:
+        """Return (papers, is_stale) for a cached query, or None on a miss"""
+        db = SessionLocal()
+        try:
+            entry = db.get(ResearchCacheEntry, normalize_research_key(ingredient, health_concern))
+            if entry is None or entry.paper_refs is None:
+                return None
+            stale = self._staleness(entry.papers_updated_at)
+            if stale is None:
+                return None
+            return self._load_papers(db, entry.paper_refs), stale
+        finally:
+            db.close()
+
+    def put_papers(self, ingredient: str, health_concern: Optional[str], papers: List[Dict]):
+        """Store the ranked paper list for a query"""
+        db = SessionLocal()
+        try:
+            entry = self._get_or_create_entry(db, ingredient, health_concern)
+            self._store_paper_refs(db, entry, papers)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"Warning: Could not cache research papers for {ingredient}: {e}")
+        finally:
+            db.close()
+
+    def get_evidence(self, ingredient: str, health_concern: Optional[str] = None) -> Optional[Tuple[Dict, List[Dict], bool]]:
+        """Return (evidence, papers, is_stale) for a cached query, or None on a miss"""
+        key = normalize_research_key(ingredient, health_concern)
+        # Evidence is read on every analysis; the tiered cache answers repeats without a database round trip
+        cached = research_evidence_cache.get(key)
+        if cached is not None:
+            if self._staleness(datetime.fromisoformat(cached["updated_at"])) is False:
+                return cached["evidence"], cached["papers"], False
+            # Past the soft TTL another worker may already have refreshed it; the database decides
+            research_evidence_cache.delete(key)
+
+        db = SessionLocal()
+        try:
+            entry = db.get(ResearchCacheEntry, key)
+            if entry is None or entry.evidence is None:
+                return None
+            stale = self._staleness(entry.evidence_updated_at)
+            if stale is None:
+                return None
+            evidence, papers = json.loads(entry.evidence), self._load_papers(db, entry.paper_refs)
+            if not stale:
+                self._cache_evidence(key, evidence, papers, entry.evidence_updated_at)
+            return evidence, papers, stale
+        finally:
+            db.close()
+
+    def _cache_evidence(self, key: str, evidence: Dict, papers: List[Dict], updated_at: datetime):
+        research_evidence_cache.set(key, {"evidence": evidence, "papers": papers, "updated_at": updated_at.isoformat()})
+
+    def put_evidence(self, ingredient: str, health_concern: Optional[str], evidence: Dict, papers: List[Dict]):
+        """Store AI evidence together with the papers it was derived from"""
+        db = SessionLocal()
+        try:
+            entry = self._get_or_create_entry(db, ingredient, health_concern)
+            self._store_paper_refs(db, entry, papers)
+            entry.evidence = json.dumps(evidence)
+            updated_at = entry.evidence_updated_at = datetime.utcnow()
+            db.commit()
+            self._cache_evidence(normalize_research_key(ingredient, health_concern), evidence, papers, updated_at)
+        except Exception as e:
+            db.rollback()
+            print(f"Warning: Could not cache research evidence for {ingredient}: {e}")
+        finally:
+            db.close()
+
+    def get_papers_by_id(self, entry_ids: List[str]) -> Dict[str, Dict]:
+        """Load stored papers by arXiv entry id"""
+        if not entry_ids:
+            return {}
+        db = SessionLocal()
+        try:
+            records = db.query(ResearchPaperRecord).filter(ResearchPaperRecord.entry_id.in_(entry_ids)).all()
+            return {record.entry_id: paper_record_to_dict(record, 0.0) for record in records}
+        finally:
+            db.close()
+
+    def purge_expired(self) -> Tuple[int, List[str]]:
+        """Delete entries past the hard TTL and papers no longer referenced by any entry.
+
+        Returns the number of entries removed and the entry ids of the deleted papers,
+        which the caller should drop from research_index.
+        """
+        cutoff = datetime.utcnow() - self.hard_ttl
+        db = SessionLocal()
+        try:
+            removed = 0
+            referenced = set()
+            for entry in db.query(ResearchCacheEntry).all():
+                papers_expired = entry.papers_updated_at is None or entry.papers_updated_at < cutoff
+                evidence_expired = entry.evidence_updated_at is None or entry.evidence_updated_at < cutoff
+                if papers_expired and evidence_expired:
+                    db.delete(entry)
+                    removed += 1
+                else:
+                    referenced.update(entry_id for entry_id, _ in json.loads(entry.paper_refs or "[]"))
+
+            orphaned = [entry_id for (entry_id,) in db.query(ResearchPaperRecord.entry_id) if entry_id not in referenced]
+            for start in range(0, len(orphaned), PURGE_DELETE_CHUNK):
+                db.query(ResearchPaperRecord).filter(
+                    ResearchPaperRecord.entry_id.in_(orphaned[start:start + PURGE_DELETE_CHUNK])
+                ).delete(synchronize_session=False)
+
+            db.commit()
+            return removed, orphaned
+        finally:
+            db.close()
+
+def paper_record_to_dict(record: ResearchPaperRecord, relevance_score: float) -> Dict:
+    """Convert a stored paper row into ResearchPaper keyword arguments"""
+    return {
+        "title": record.title,
+        "authors": json.loads(record.authors or "[]"),
+        "abstract": record.abstract or "",
+        "published_date": record.published_date or "",
+        "journal": record.journal or "",
+        "doi": record.doi,
+        "url": record.entry_id,
+        "relevance_score": relevance_score
+    }
+
+# Global research cache instance
+research_cache = ResearchCache()
+
+if __name__ == "__main__":
+    removed, orphaned = research_cache.purge_expired()
+    print(f"Purged {removed} expired research cache entries and {len(orphaned)} unreferenced papers")
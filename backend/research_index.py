@@ -0,0 +1,150 @@
+import math
+import os
+import re
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from database import SessionLocal
+from models import ResearchPaperRecord
+
+# BM25 parameters and how many strong local hits are needed to skip arXiv entirely
+RESEARCH_BM25_K1 = float(os.getenv("RESEARCH_BM25_K1", "1.5"))
+RESEARCH_BM25_B = float(os.getenv("RESEARCH_BM25_B", "0.75"))
+RESEARCH_LOCAL_MIN_HITS = int(os.getenv("RESEARCH_LOCAL_MIN_HITS", "5"))
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "have", "in", "is",
+    "it", "its", "of", "on", "or", "that", "the", "this", "to", "was", "were", "which", "with",
+    "we", "our", "these", "those", "their", "can", "may", "also", "using", "based"
+}
+
+# Titles are short and precise, so their terms count more than abstract terms
+TITLE_WEIGHT = 2
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase, split on non-alphanumerics, drop stopwords and fold simple plurals"""
+    tokens = []
+    for token in re.findall(r"[a-z0-9]+", (text or "").lower()):
+        if len(token) < 2 or token in STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+class BM25Index:
+    """In-process inverted index with Okapi BM25 scoring over paper titles and abstracts"""
+
+    def __init__(self, k1: float = RESEARCH_BM25_K1, b: float = RESEARCH_BM25_B):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.doc_terms: Dict[str, Dict[str, int]] = {}
+        self.doc_lengths: Dict[str, int] = {}
+        self.total_length = 0
+        self.loaded = False
+        self.load_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def add(self, doc_id: str, title: str, abstract: str):
+        """Index a document, replacing any previous version with the same id"""
+        if doc_id in self.doc_lengths:
+            self.remove(doc_id)
+
+        term_counts: Dict[str, int] = {}
+        tokens = tokenize(title) * TITLE_WEIGHT + tokenize(abstract)
+        for token in tokens:
+            term_counts[token] = term_counts.get(token, 0) + 1
+
+        for term, count in term_counts.items():
+            self.postings.setdefault(term, {})[doc_id] = count
+        self.doc_terms[doc_id] = term_counts
+        self.doc_lengths[doc_id] = len(tokens)
+        self.total_length += len(tokens)
+
+    def remove(self, doc_id: str):
+        term_counts = self.doc_terms.pop(doc_id, None)
+        if term_counts is None:
+            return
+        for term in term_counts:
+            docs = self.postings.get(term)
+            if docs is not None:
+                docs.pop(doc_id, None)
+                if not docs:
+                    del self.postings[term]
+        self.total_length -= self.doc_lengths.pop(doc_id)
+
+    def _idf(self, term: str) -> float:
+        doc_freq = len(self.postings.get(term, ()))
+        return math.log(1 + (len(self.doc_lengths) - doc_freq + 0.5) / (doc_freq + 0.5))
+
+    def _score_terms(self, terms: List[str], doc_ids: Optional[Iterable[str]] = None) -> Dict[str, float]:
+        if not self.doc_lengths:
+            return {}
+        avg_length = self.total_length / len(self.doc_lengths) or 1.0
+        restrict = set(doc_ids) if doc_ids is not None else None
+
+        scores: Dict[str, float] = {}
+        for term in set(terms):
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            idf = self._idf(term)
+            for doc_id, freq in docs.items():
+                if restrict is not None and doc_id not in restrict:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * freq * (self.k1 + 1) / (freq + norm)
+        return scores
+
+    def search(self, query: str, limit: int = 10, required: Optional[str] = None) -> List[Tuple[str, float]]:
+        """Return the best (doc_id, score) pairs, optionally only docs containing every term of `required`"""
+        scores = self._score_terms(tokenize(query))
+        required_terms = set(tokenize(required)) if required else set()
+        ranked = [
+            (doc_id, score) for doc_id, score in scores.items()
+            if all(term in self.doc_terms[doc_id] for term in required_terms)
+        ]
+        ranked.sort(key=lambda item: item[1], reverse=True)
+        return ranked[:limit]
+
+    def score_documents(self, query: str, doc_ids: Iterable[str]) -> Dict[str, float]:
+        """Score specific documents against a query, zero for documents without any query term"""
+        doc_ids = list(doc_ids)
+        scores = self._score_terms(tokenize(query), doc_ids)
+        return {doc_id: scores.get(doc_id, 0.0) for doc_id in doc_ids}
+
+    def ensure_loaded(self):
+        """Build the index from every cached paper the first time it is needed.
+
+        Blocking (reads and tokenizes the whole research_papers table): call it from a
+        thread. Concurrent callers wait for the one load instead of each loading.
+        """
+        if self.loaded:
+            return
+        with self.load_lock:
+            if not self.loaded:
+                self._load()
+
+    def _load(self):
+        db = SessionLocal()
+        try:
+            rows = db.query(
+                ResearchPaperRecord.entry_id, ResearchPaperRecord.title, ResearchPaperRecord.abstract
+            ).yield_per(500)
+            for entry_id, title, abstract in rows:
+                self.add(entry_id, title, abstract)
+            print(f"Research index loaded with {len(self)} papers")
+        except Exception as e:
+            print(f"Warning: Could not load research index: {e}")
+        finally:
+            db.close()
+        self.loaded = True
+
+def build_research_query(ingredient: str, health_concern: Optional[str] = None) -> str:
+    return f"{ingredient} {health_concern}" if health_concern else ingredient
+
+# Global research index instance
+research_index = BM25Index()
@@ -0,0 +1,192 @@
+import asyncio
+import heapq
+import os
+from collections import deque
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+
+from research_cache import research_cache
+from research_index import research_index
+from research_service import research_service
+
+# Prefetch configuration: which ingredients, when, and how much upstream spend is allowed per day.
+# Budgets are tracked in memory per process, so N uvicorn workers may spend up to N times these limits.
+RESEARCH_PREFETCH_ENABLED = os.getenv("RESEARCH_PREFETCH_ENABLED", "true").lower() == "true"
+RESEARCH_PREFETCH_TOP_N = int(os.getenv("RESEARCH_PREFETCH_TOP_N", "20"))
+RESEARCH_PREFETCH_HOURS = os.getenv("RESEARCH_PREFETCH_HOURS", "1-6")  # local hours, end exclusive
+RESEARCH_PREFETCH_INTERVAL = int(os.getenv("RESEARCH_PREFETCH_INTERVAL", "300"))
+RESEARCH_PREFETCH_MAX_REQUESTS = int(os.getenv("RESEARCH_PREFETCH_MAX_REQUESTS", "50"))
+RESEARCH_PREFETCH_TOKEN_BUDGET = int(os.getenv("RESEARCH_PREFETCH_TOKEN_BUDGET", "100000"))
+RESEARCH_PREFETCH_TOKENS_PER_REFRESH = int(os.getenv("RESEARCH_PREFETCH_TOKENS_PER_REFRESH", "2500"))
+
+# Request counts are halved once a day so the ranking follows recent traffic
+FREQUENCY_DECAY = 0.5
+MAX_TRACKED_INGREDIENTS = 10000
+
+def parse_hour_window(window: str) -> tuple:
+    """Parse "start-end" local hours, e.g. "1-6" or "22-4" for a window across midnight"""
+    start, end = (int(part) % 24 for part in window.split("-", 1))
+    return start, end
+
+class ResearchPrefetchScheduler:
+    """Refreshes scientific evidence for the most requested ingredients during off-peak hours"""
+
+    def __init__(self):
+        self.enabled = RESEARCH_PREFETCH_ENABLED
+        self.top_n = RESEARCH_PREFETCH_TOP_N
+        self.window = parse_hour_window(RESEARCH_PREFETCH_HOURS)
+        self.interval = RESEARCH_PREFETCH_INTERVAL
+        self.max_requests = RESEARCH_PREFETCH_MAX_REQUESTS
+        self.token_budget = RESEARCH_PREFETCH_TOKEN_BUDGET
+        self.tokens_per_refresh = RESEARCH_PREFETCH_TOKENS_PER_REFRESH
+
+        self.request_counts: Dict[str, float] = {}
+        self.queue = deque()
+        self.last_refreshed: Dict[str, datetime] = {}
+        self.budget_day = datetime.now().date()
+        self.requests_used = 0
+        self.tokens_used = 0
+        self.last_run_at: Optional[datetime] = None
+        self.last_purge: Optional[dict] = None
+        self.last_error: Optional[str] = None
+        self.task: Optional[asyncio.Task] = None
+
+    def record(self, ingredients: Iterable[str]):
+        """Count ingredient lookups coming from /analyze and /research-analyze traffic"""
+        for ingredient in ingredients:
+            key = ingredient.strip().lower()
+            if key:
+                self.request_counts[key] = self.request_counts.get(key, 0.0) + 1.0
+
+        if len(self.request_counts) > MAX_TRACKED_INGREDIENTS:
+            keep = heapq.nlargest(MAX_TRACKED_INGREDIENTS // 2, self.request_counts.items(), key=lambda item: item[1])
+            self.request_counts = dict(keep)
+
+    def in_window(self, now: Optional[datetime] = None) -> bool:
+        hour = (now or datetime.now()).hour
+        start, end = self.window
+        if start <= end:
+            return start <= hour < end
+        return hour >= start or hour < end
+
+    def budget_remaining(self) -> bool:
+        return (self.requests_used < self.max_requests
+                and self.tokens_used + self.tokens_per_refresh <= self.token_budget)
+
+    def _roll_budget_day(self):
+        today = datetime.now().date()
+        if today != self.budget_day:
+            self.budget_day = today
+            self.requests_used = 0
+            self.tokens_used = 0
+            self.request_counts = {
+                key: count * FREQUENCY_DECAY
+                for key, count in self.request_counts.items()
+                if count * FREQUENCY_DECAY >= 0.5
+            }
+
+    def _needs_refresh(self, ingredient: str) -> bool:
+        cached = research_cache.get_evidence(ingredient)
+        return cached is None or cached[2]
+
+    def _stale_ingredients(self, candidates: list) -> list:
+        """Blocking (one cache lookup per ingredient): run it in a thread"""
+        return [ingredient for ingredient in candidates if self._needs_refresh(ingredient)]
+
+    async def plan(self):
+        """Queue the top-N ingredients whose cached evidence is missing or stale"""
+        top = heapq.nlargest(self.top_n, self.request_counts.items(), key=lambda item: item[1])
+        candidates = [ingredient for ingredient, _ in top if ingredient not in self.queue]
+        for ingredient in await asyncio.to_thread(self._stale_ingredients, candidates):
+            if ingredient not in self.queue:
+                self.queue.append(ingredient)
+
+    async def purge_expired(self):
+        """Drop research cache entries past the hard TTL and their orphaned papers, also from the BM25 index"""
+        removed, orphaned = await asyncio.to_thread(research_cache.purge_expired)
+        # The index is only touched on the event loop (after its initial load), so searches never see it mid-update
+        await research_service.ensure_index_loaded()
+        for entry_id in orphaned:
+            research_index.remove(entry_id)
+        self.last_purge = {"at": datetime.now(), "entries_removed": removed, "papers_removed": len(orphaned)}
+
+    async def run_once(self):
+        self._roll_budget_day()
+        self.last_run_at = datetime.now()
+        # Once a day, whether or not prefetching can run
+        if self.last_purge is None or self.last_purge["at"].date() != self.last_run_at.date():
+            try:
+                await self.purge_expired()
+            except Exception as e:
+                self.last_error = f"purge: {e}"
+                self.last_purge = {"at": self.last_run_at, "error": str(e)}
+                print(f"Research cache purge failed: {e}")
+        if not os.getenv("OPENAI_API_KEY") or not self.in_window():
+            return
+
+        await self.plan()
+        while self.queue and self.budget_remaining() and self.in_window():
+            ingredient = self.queue.popleft()
+            self.requests_used += 1
+            self.tokens_used += self.tokens_per_refresh
+            try:
+                await research_service.refresh_ingredient_evidence(ingredient)
+                self.last_refreshed[ingredient] = datetime.now()
+            except Exception as e:
+                self.last_error = f"{ingredient}: {e}"
+                print(f"Research prefetch failed for {ingredient}: {e}")
+
+    async def run_forever(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Research prefetch pass failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self.enabled and self.task is None:
+            self.task = asyncio.create_task(self.run_forever())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    def status(self) -> dict:
+        top = heapq.nlargest(self.top_n, self.request_counts.items(), key=lambda item: item[1])
+        return {
+            "enabled": self.enabled,
+            "running": self.task is not None and not self.task.done(),
+            "in_window": self.in_window(),
+            "window_hours": f"{self.window[0]}-{self.window[1]}",
+            "queue_depth": len(self.queue),
+            "queued_ingredients": list(self.queue),
+            "tracked_ingredients": len(self.request_counts),
+            "top_ingredients": [
+                {
+                    "ingredient": ingredient,
+                    "request_count": round(count, 2),
+                    "last_refreshed": self.last_refreshed.get(ingredient)
+                }
+                for ingredient, count in top
+            ],
+            "budget": {
+                "day": self.budget_day.isoformat(),
+                "requests_used": self.requests_used,
+                "max_requests": self.max_requests,
+                "tokens_used": self.tokens_used,
+                "token_budget": self.token_budget
+            },
+            "last_run_at": self.last_run_at,
+            "last_purge": self.last_purge,
+            "last_error": self.last_error
+        }
+
+# Global research prefetch scheduler instance
+research_prefetch_scheduler = ResearchPrefetchScheduler()
@@ -1,12 +1,15 @@
 import requests
-import arxiv
+import asyncio
 import json
-from typing import List, Dict, Optional
-from dataclasses import dataclass
+from typing import Awaitable, Callable, List, Dict, Optional
+from dataclasses import asdict, dataclass
 from datetime import datetime
-import openai
 import os
 
+from metrics import llm_json_failures, record_cache, stage
+from research_cache import normalize_research_key, research_cache
+from research_index import RESEARCH_LOCAL_MIN_HITS, build_research_query, research_index
+
 @dataclass
 class ResearchPaper:
     title: str
@@ -30,50 +33,144 @@ class ScientificEvidence:
 class ResearchService:
     def __init__(self):
         self.openai_client = None
+        self._refreshing = set()
+        self._background_tasks = set()
     
     def _get_openai_client(self):
         if self.openai_client is None:
             api_key = os.getenv("OPENAI_API_KEY")
             if not api_key:
                 raise ValueError("OPENAI_API_KEY environment variable not set")
+            import openai
             self.openai_client = openai.OpenAI(api_key=api_key)
         return self.openai_client
     
     async def search_ingredient_research(self, ingredient: str, health_concern: str = None) -> List[ResearchPaper]:
         """Search for research papers about ingredient health effects"""
-        try:
-            # Search ArXiv for relevant papers
-            search_query = f"nutrition health effects {ingredient}"
-            if health_concern:
-                search_query += f" {health_concern}"
-            
-            client = arxiv.Client()
-            search = arxiv.Search(
-                query=search_query,
-                max_results=10,
-                sort_by=arxiv.SortCriterion.Relevance
-            )
-            
-            papers = []
-            for result in client.results(search):
-                paper = ResearchPaper(
-                    title=result.title,
-                    authors=[author.name for author in result.authors],
-                    abstract=result.summary,
-                    published_date=result.published.strftime("%Y-%m-%d"),
-                    journal="ArXiv",
-                    doi=result.doi,
-                    url=result.entry_id,
-                    relevance_score=0.8  # Default relevance
+        # The research cache is synchronous SQLAlchemy; keep its queries and commits off the event loop
+        cached = await asyncio.to_thread(research_cache.get_papers, ingredient, health_concern)
+        record_cache("research_papers", "miss" if cached is None else "stale" if cached[1] else "hit")
+        if cached is not None:
+            papers, stale = cached
+            if stale:
+                self._refresh_in_background(
+                    ("papers", normalize_research_key(ingredient, health_concern)),
+                    lambda: self._refresh_papers(ingredient, health_concern)
                 )
-                papers.append(paper)
-            
-            return papers
-            
+            return [ResearchPaper(**paper) for paper in papers]
+        
+        # Answer from the local index when enough cached papers already cover the query
+        local_papers = await self._search_local_papers(ingredient, health_concern)
+        record_cache("research_index", "hit" if local_papers else "miss")
+        if local_papers:
+            await asyncio.to_thread(research_cache.put_papers, ingredient, health_concern, [asdict(paper) for paper in local_papers])
+            return local_papers
+        
+        try:
+            return await self._refresh_papers(ingredient, health_concern)
         except Exception as e:
             print(f"Error searching research papers: {e}")
             return []
     
+    async def _refresh_papers(self, ingredient: str, health_concern: str = None) -> List[ResearchPaper]:
+        """Fetch papers from arXiv and store them in the research cache"""
+        papers = await asyncio.to_thread(self._fetch_arxiv_papers, ingredient, health_concern)
+        await self.ensure_index_loaded()
+        papers = self._rank_papers(papers, ingredient, health_concern)
+        await asyncio.to_thread(research_cache.put_papers, ingredient, health_concern, [asdict(paper) for paper in papers])
+        return papers
+    
+    async def _search_local_papers(self, ingredient: str, health_concern: str = None) -> List[ResearchPaper]:
+        """Rank cached papers with BM25, returning nothing unless there are enough strong hits"""
+        await self.ensure_index_loaded()
+        hits = research_index.search(build_research_query(ingredient, health_concern), limit=10, required=ingredient)
+        if len(hits) < RESEARCH_LOCAL_MIN_HITS:
+            return []
+        
+        stored = await asyncio.to_thread(research_cache.get_papers_by_id, [doc_id for doc_id, _ in hits])
+        best_score = hits[0][1]
+        papers = []
+        for doc_id, score in hits:
+            paper = stored.get(doc_id)
+            if paper is not None:
+                paper["relevance_score"] = round(score / best_score, 3)
+                papers.append(ResearchPaper(**paper))
+        return papers if len(papers) >= RESEARCH_LOCAL_MIN_HITS else []
+    
+    async def ensure_index_loaded(self):
+        """Build the BM25 index in a worker thread the first time; it reads the whole research_papers table"""
+        if not research_index.loaded:
+            await asyncio.to_thread(research_index.ensure_loaded)
+    
+    def warm_index(self):
+        """Start loading the BM25 index in the background, so the first research request does not wait for it"""
+        task = asyncio.get_running_loop().create_task(self.ensure_index_loaded())
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+    
+    def _rank_papers(self, papers: List[ResearchPaper], ingredient: str, health_concern: str = None) -> List[ResearchPaper]:
+        """Index fetched papers and order them by BM25 relevance to the query (the index must be loaded)"""
+        for paper in papers:
+            research_index.add(paper.url, paper.title, paper.abstract)
+        
+        scores = research_index.score_documents(
+            build_research_query(ingredient, health_concern), [paper.url for paper in papers]
+        )
+        best_score = max(scores.values(), default=0.0)
+        for paper in papers:
+            paper.relevance_score = round(scores[paper.url] / best_score, 3) if best_score > 0 else 0.0
+        return sorted(papers, key=lambda paper: paper.relevance_score, reverse=True)
+    
+    def _fetch_arxiv_papers(self, ingredient: str, health_concern: str = None) -> List[ResearchPaper]:
+        """Query arXiv for relevant papers (blocking, raises on network errors)"""
+        search_query = f"nutrition health effects {ingredient}"
+        if health_concern:
+            search_query += f" {health_concern}"
+        
+        import arxiv
+        client = arxiv.Client()
+        search = arxiv.Search(
+            query=search_query,
+            max_results=10,
+            sort_by=arxiv.SortCriterion.Relevance
+        )
+        
+        papers = []
+        with stage("research_fetch"):
+            results = list(client.results(search))
+        for result in results:
+            paper = ResearchPaper(
+                title=result.title,
+                authors=[author.name for author in result.authors],
+                abstract=result.summary,
+                published_date=result.published.strftime("%Y-%m-%d"),
+                journal="ArXiv",
+                doi=result.doi,
+                url=result.entry_id,
+                relevance_score=0.0  # Scored by _rank_papers
+            )
+            papers.append(paper)
+        
+        return papers
+    
+    def _refresh_in_background(self, key: tuple, refresh: Callable[[], Awaitable]):
+        """Run a cache refresh without blocking the caller, at most once per key"""
+        if key in self._refreshing:
+            return
+        self._refreshing.add(key)
+        
+        async def run_refresh():
+            try:
+                await refresh()
+            except Exception as e:
+                print(f"Background research refresh failed for {key[1]}: {e}")
+            finally:
+                self._refreshing.discard(key)
+        
+        task = asyncio.create_task(run_refresh())
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+    
     async def analyze_research_with_ai(self, ingredient: str, papers: List[ResearchPaper]) -> ScientificEvidence:
         """Use AI to analyze research papers and extract health insights"""
         try:
@@ -93,7 +190,7 @@ class ResearchService:
             
             # Prepare research context for AI analysis
             research_context = ""
-            for paper in papers[:5]:  # Use top 5 most relevant papers
+            for paper in papers[:5]:  # Papers are ranked by BM25 relevance, use the top 5
                 research_context += f"Title: {paper.title}\nAbstract: {paper.abstract}\n\n"
             
             prompt = f"""
@@ -116,16 +213,22 @@ class ResearchService:
             }}
             """
             
-            response = self._get_openai_client().chat.completions.create(
-                model="gpt-4",
-                messages=[
-                    {"role": "system", "content": "You are a nutrition scientist analyzing research papers. Provide accurate, evidence-based assessments."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.3
-            )
+            with stage("llm"):
+                response = await asyncio.to_thread(
+                    self._get_openai_client().chat.completions.create,
+                    model="gpt-4",
+                    messages=[
+                        {"role": "system", "content": "You are a nutrition scientist analyzing research papers. Provide accurate, evidence-based assessments."},
+                        {"role": "user", "content": prompt}
+                    ],
+                    temperature=0.3
+                )
             
-            analysis = json.loads(response.choices[0].message.content)
+            try:
+                analysis = json.loads(response.choices[0].message.content)
+            except json.JSONDecodeError:
+                llm_json_failures.inc("research")
+                raise
             
             return ScientificEvidence(
                 ingredient=ingredient,
@@ -149,12 +252,36 @@ class ResearchService:
     
     async def get_ingredient_scientific_evidence(self, ingredient: str) -> ScientificEvidence:
         """Get comprehensive scientific evidence for an ingredient"""
+        cached = await asyncio.to_thread(research_cache.get_evidence, ingredient)
+        record_cache("research_evidence", "miss" if cached is None else "stale" if cached[2] else "hit")
+        if cached is not None:
+            evidence, papers, stale = cached
+            if stale:
+                self._refresh_in_background(
+                    ("evidence", normalize_research_key(ingredient)),
+                    lambda: self.refresh_ingredient_evidence(ingredient)
+                )
+            return ScientificEvidence(
+                research_papers=[ResearchPaper(**paper) for paper in papers],
+                **evidence
+            )
+        
+        return await self.refresh_ingredient_evidence(ingredient)
+    
+    async def refresh_ingredient_evidence(self, ingredient: str) -> ScientificEvidence:
+        """Search and analyze research for an ingredient, caching successful results"""
         # Search for research papers
         papers = await self.search_ingredient_research(ingredient)
         
         # Analyze with AI
         evidence = await self.analyze_research_with_ai(ingredient, papers)
         
+        # Only cache real AI assessments, not the fallbacks used when analysis is unavailable
+        if papers and evidence.confidence_score > 0 and os.getenv("OPENAI_API_KEY"):
+            evidence_fields = asdict(evidence)
+            del evidence_fields["research_papers"]
+            await asyncio.to_thread(research_cache.put_evidence, ingredient, None, evidence_fields, [asdict(paper) for paper in papers])
+        
         return evidence
     
     async def search_pubmed_alternative(self, ingredient: str) -> List[Dict]:
@@ -0,0 +1,276 @@
+from pydantic import BaseModel
+
+from metrics import timed
+
+class HealthRisk(BaseModel):
+    risk_type: str
+    severity: str  # low, medium, high
+    description: str
+    affected_ingredients: list[str]
+
+def analyze_health_risks(ingredients: list[str]) -> list[HealthRisk]:
+    """Analyze ingredients for specific health risks"""
+    health_risks = []
+    ingredients_lower = [ing.lower() for ing in ingredients]
+    
+    # Cholesterol and Heart Health Risks
+    cholesterol_risks = []
+    if any('trans fat' in ing or 'hydrogenated' in ing for ing in ingredients_lower):
+        cholesterol_risks.extend([ing for ing in ingredients if 'trans fat' in ing.lower() or 'hydrogenated' in ing.lower()])
+    if any('saturated fat' in ing for ing in ingredients_lower):
+        cholesterol_risks.extend([ing for ing in ingredients if 'saturated fat' in ing.lower()])
+    if any('palm oil' in ing for ing in ingredients_lower):
+        cholesterol_risks.extend([ing for ing in ingredients if 'palm oil' in ing.lower()])
+    
+    if cholesterol_risks:
+        severity = "high" if len(cholesterol_risks) > 2 else "medium"
+        health_risks.append(HealthRisk(
+            risk_type="Heart Health & Cholesterol",
+            severity=severity,
+            description="Contains ingredients that may raise LDL cholesterol and increase cardiovascular risk",
+            affected_ingredients=cholesterol_risks
+        ))
+    
+    # Diabetes and Blood Sugar Risks
+    sugar_risks = []
+    if any('sugar' in ing or 'syrup' in ing or 'dextrose' in ing or 'fructose' in ing or 'sucrose' in ing for ing in ingredients_lower):
+        sugar_risks.extend([ing for ing in ingredients if any(s in ing.lower() for s in ['sugar', 'syrup', 'dextrose', 'fructose', 'glucose', 'sucrose'])])
+    
+    if sugar_risks:
+        severity = "high" if len(sugar_risks) > 3 else "medium"
+        health_risks.append(HealthRisk(
+            risk_type="Diabetes & Blood Sugar",
+            severity=severity,
+            description="High sugar content may contribute to insulin resistance and diabetes risk",
+            affected_ingredients=sugar_risks
+        ))
+    
+    # Blood Pressure Risks
+    sodium_risks = []
+    if any('sodium' in ing or 'salt' in ing for ing in ingredients_lower):
+        sodium_risks.extend([ing for ing in ingredients if 'sodium' in ing.lower() or 'salt' in ing.lower()])
+    
+    if sodium_risks:
+        health_risks.append(HealthRisk(
+            risk_type="Blood Pressure",
+            severity="medium",
+            description="High sodium content may contribute to hypertension",
+            affected_ingredients=sodium_risks
+        ))
+    
+    # Cancer and Carcinogen Risks
+    carcinogen_risks = []
+    carcinogen_patterns = ['nitrate', 'nitrite', 'bht', 'bha', 'artificial color', 'artificial flavor', 'caramel color']
+    for pattern in carcinogen_patterns:
+        if any(pattern in ing for ing in ingredients_lower):
+            carcinogen_risks.extend([ing for ing in ingredients if pattern in ing.lower()])
+    
+    # Add phosphoric acid as a separate health concern
+    if any('phosphoric acid' in ing for ing in ingredients_lower):
+        health_risks.append(HealthRisk(
+            risk_type="Dental & Bone Health",
+            severity="medium",
+            description="Phosphoric acid can erode tooth enamel and may affect bone density with excessive consumption",
+            affected_ingredients=[ing for ing in ingredients if 'phosphoric acid' in ing.lower()]
+        ))
+    
+    # Add caffeine as a separate health concern
+    if any('caffeine' in ing for ing in ingredients_lower):
+        health_risks.append(HealthRisk(
+            risk_type="Caffeine Sensitivity",
+            severity="low",
+            description="Contains caffeine which may cause jitteriness, insomnia, or anxiety in sensitive individuals",
+            affected_ingredients=[ing for ing in ingredients if 'caffeine' in ing.lower()]
+        ))
+    
+    if carcinogen_risks:
+        health_risks.append(HealthRisk(
+            risk_type="Cancer Risk",
+            severity="medium",
+            description="Contains potential carcinogens or ingredients linked to cancer risk",
+            affected_ingredients=carcinogen_risks
+        ))
+    
+    # Digestive Health Risks
+    digestive_risks = []
+    if any('artificial sweetener' in ing or 'aspartame' in ing or 'sucralose' in ing for ing in ingredients_lower):
+        digestive_risks.extend([ing for ing in ingredients if any(s in ing.lower() for s in ['artificial sweetener', 'aspartame', 'sucralose', 'saccharin'])])
+    
+    if digestive_risks:
+        health_risks.append(HealthRisk(
+            risk_type="Digestive Health",
+            severity="low",
+            description="Artificial sweeteners may affect gut microbiome and digestive health",
+            affected_ingredients=digestive_risks
+        ))
+    
+    # Allergic Reactions
+    allergen_risks = []
+    common_allergens = ['soy', 'wheat', 'gluten', 'dairy', 'nuts', 'eggs', 'shellfish']
+    for allergen in common_allergens:
+        if any(allergen in ing for ing in ingredients_lower):
+            allergen_risks.extend([ing for ing in ingredients if allergen in ing.lower()])
+    
+    if allergen_risks:
+        health_risks.append(HealthRisk(
+            risk_type="Allergic Reactions",
+            severity="high",
+            description="Contains common allergens that may cause severe reactions in sensitive individuals",
+            affected_ingredients=allergen_risks
+        ))
+    
+    return health_risks
+
+def get_nutritional_insights(ingredients: list[str]) -> dict:
+    """Get nutritional insights and recommendations"""
+    ingredients_lower = [ing.lower() for ing in ingredients]
+    
+    insights = {
+        "fiber_content": "low",
+        "protein_content": "low", 
+        "vitamin_content": "low",
+        "mineral_content": "low",
+        "processing_level": "high"
+    }
+    
+    # Check for beneficial nutrients
+    if any('whole grain' in ing or 'fiber' in ing for ing in ingredients_lower):
+        insights["fiber_content"] = "moderate"
+    
+    if any('protein' in ing or 'soy' in ing or 'nuts' in ing for ing in ingredients_lower):
+        insights["protein_content"] = "moderate"
+    
+    if any('vitamin' in ing or 'mineral' in ing for ing in ingredients_lower):
+        insights["vitamin_content"] = "moderate"
+        insights["mineral_content"] = "moderate"
+    
+    # Check processing level
+    natural_ingredients = sum(1 for ing in ingredients_lower if any(natural in ing for natural in ['natural', 'organic', 'whole', 'fresh']))
+    if natural_ingredients > len(ingredients) * 0.5:
+        insights["processing_level"] = "low"
+    elif natural_ingredients > len(ingredients) * 0.2:
+        insights["processing_level"] = "moderate"
+    
+    return insights
+
+@timed("fallback")
+def fallback_analysis(ingredients: list[str]) -> dict:
+    """Enhanced fallback analysis with comprehensive medical-grade insights"""
+    risk_ingredients = []
+    tags = []
+    score = 70  # Default moderate score
+    allergen_warnings = []
+    target_demographics = []
+    alternative_suggestions = []
+    health_risks = []
+    medical_benefits = []
+    contraindications = []
+    
+    # Comprehensive risk ingredient patterns with medical context
+    risk_patterns = {
+        'artificial': ['artificial', 'synthetic', 'lab-made'],
+        'preservatives': ['preservative', 'sodium benzoate', 'bht', 'bha', 'sulfites'],
+        'colors': ['color', 'dye', 'red 40', 'yellow 5', 'blue 1'],
+        'flavors': ['artificial flavor', 'natural flavor', 'flavoring'],
+        'sweeteners': ['high fructose', 'corn syrup', 'aspartame', 'sucralose', 'saccharin'],
+        'fats': ['hydrogenated', 'trans fat', 'partially hydrogenated'],
+        'additives': ['msg', 'nitrate', 'nitrite', 'carrageenan', 'xanthan gum'],
+        'sodium': ['sodium', 'salt', 'sodium chloride'],
+        'sugar': ['sugar', 'sucrose', 'fructose', 'glucose', 'dextrose']
+    }
+    
+    # Analyze each ingredient
+    for ingredient in ingredients:
+        ingredient_lower = ingredient.lower()
+        
+        # Check for risk patterns
+        for category, patterns in risk_patterns.items():
+            if any(pattern in ingredient_lower for pattern in patterns):
+                risk_ingredients.append(f"{ingredient} ({category})")
+                break
+    
+    # Comprehensive tag analysis
+    if any('organic' in ing.lower() for ing in ingredients):
+        tags.append("Organic")
+        score += 15
+    
+    if any('natural' in ing.lower() and 'artificial' not in ing.lower() for ing in ingredients):
+        tags.append("Natural")
+        score += 10
+    
+    if any('protein' in ing.lower() or 'whey' in ing.lower() or 'soy' in ing.lower() for ing in ingredients):
+        tags.append("High Protein")
+        score += 5
+    
+    if any('fiber' in ing.lower() or 'whole grain' in ing.lower() for ing in ingredients):
+        tags.append("High Fiber")
+        score += 5
+    
+    if any('sugar' in ing.lower() or 'syrup' in ing.lower() or 'honey' in ing.lower() for ing in ingredients):
+        tags.append("Contains Sugar")
+        score -= 10
+    
+    if any('salt' in ing.lower() or 'sodium' in ing.lower() for ing in ingredients):
+        tags.append("Contains Sodium")
+        score -= 5
+    
+    if len(risk_ingredients) > 3:
+        tags.append("Ultra-Processed")
+        score -= 25
+    elif len(risk_ingredients) > 1:
+        tags.append("Processed")
+        score -= 15
+    elif len(risk_ingredients) == 0:
+        tags.append("Clean Ingredients")
+        score += 15
+    
+    # Allergen detection
+    allergens = {
+        'gluten': ['wheat', 'barley', 'rye', 'gluten'],
+        'dairy': ['milk', 'cheese', 'butter', 'cream', 'whey', 'casein'],
+        'nuts': ['almond', 'walnut', 'peanut', 'cashew', 'pistachio'],
+        'soy': ['soy', 'soybean', 'tofu', 'tempeh'],
+        'eggs': ['egg', 'albumin', 'lecithin'],
+        'shellfish': ['shrimp', 'crab', 'lobster', 'shellfish']
+    }
+    
+    for allergen, patterns in allergens.items():
+        if any(pattern in ing.lower() for ing in ingredients for pattern in patterns):
+            allergen_warnings.append(allergen.title())
+    
+    # Target demographics
+    if 'protein' in ' '.join(ingredients).lower():
+        target_demographics.append("Athletes & Fitness Enthusiasts")
+    if 'fiber' in ' '.join(ingredients).lower():
+        target_demographics.append("Health-Conscious Consumers")
+    if len(risk_ingredients) == 0:
+        target_demographics.append("Clean Eating Advocates")
+    if any('organic' in ing.lower() for ing in ingredients):
+        target_demographics.append("Organic Food Buyers")
+    
+    # Alternative suggestions
+    if len(risk_ingredients) > 2:
+        alternative_suggestions.append("Look for products with fewer artificial additives")
+        alternative_suggestions.append("Consider homemade alternatives")
+    if any('sugar' in ing.lower() for ing in ingredients):
+        alternative_suggestions.append("Try products sweetened with natural alternatives like stevia")
+    
+    # Enhanced health risks and nutritional insights
+    health_risks = analyze_health_risks(ingredients)
+    nutritional_insights = get_nutritional_insights(ingredients)
+    
+    return {
+        "score": max(0, min(100, score)),
+        "risk_ingredients": risk_ingredients,
+        "tags": tags,
+        "summary": f"Comprehensive analysis: {len(risk_ingredients)} concerning ingredients detected. {'High quality natural product' if len(risk_ingredients) == 0 else 'Contains processed additives'}.",
+        "recommendation": "Excellent choice for health-conscious consumers" if len(risk_ingredients) == 0 else "Consider alternatives with fewer artificial ingredients for better health outcomes",
+        "health_risks": health_risks,
+        "nutritional_insights": nutritional_insights,
+        "allergen_warnings": allergen_warnings,
+        "target_demographics": target_demographics,
+        "alternative_suggestions": alternative_suggestions,
+        "sustainability_score": 8 if len(risk_ingredients) == 0 else 5,
+        "cost_effectiveness": 7 if len(risk_ingredients) == 0 else 6,
+        "processing_level": 2 if len(risk_ingredients) == 0 else 7
+    }
@@ -0,0 +1,112 @@
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import time
+
+from sqlalchemy.orm import Session
+
+from analysis_pipeline import build_analysis_result, run_ocr
+from database import SessionLocal, engine
+from ingredient_parser import derive_ingredient_fields
+from job_queue import claim, complete, fail, fail_abandoned, purge_finished
+from models import ProductSubmission
+
+SUBMISSION_QUEUE = "product_submissions"
+# Each worker process loads its own OCR model, so this bounds memory as well as parallelism
+SUBMISSION_WORKER_CONCURRENCY = int(os.getenv("SUBMISSION_WORKER_CONCURRENCY", "2"))
+SUBMISSION_WORKER_POLL_INTERVAL = float(os.getenv("SUBMISSION_WORKER_POLL_INTERVAL", "1.0"))
+MAINTENANCE_INTERVAL = 60
+
+def process_submission(db: Session, submission_id: int):
+    """OCR, parse and analyze one submission and store the results for moderators"""
+    submission = db.get(ProductSubmission, submission_id)
+    if submission is None:
+        print(f"Submission {submission_id} no longer exists, skipping")
+        return
+    if not submission.raw_image_url or not os.path.exists(submission.raw_image_url):
+        raise FileNotFoundError(f"Image for submission {submission_id} not found: {submission.raw_image_url}")
+
+    extracted_text = run_ocr(submission.raw_image_url)
+    fields = derive_ingredient_fields(extracted_text)
+    ingredients = json.loads(fields["parsed_ingredients"]) if fields["parsed_ingredients"] else []
+    # Strict: a failed LLM call fails the job, so it is retried with backoff rather than stored as a rule-based fallback
+    use_ai = bool(os.getenv("OPENAI_API_KEY"))
+    analysis = build_analysis_result(ingredients, use_ai=use_ai, strict=True) if ingredients else None
+
+    submission.ai_extracted_text = extracted_text
+    submission.parsed_ingredients = fields["parsed_ingredients"]
+    submission.parser_version = fields["parser_version"]
+    submission.ai_analysis = json.dumps(analysis) if analysis else None
+    submission.ai_analysis_stale = False
+
+def run_worker(stop_event, drain: bool = False):
+    """Claim and process submission jobs until stopped (or, with drain, until the queue is empty)"""
+    # Inherited pooled connections belong to the parent process
+    engine.dispose(close=False)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    db = SessionLocal()
+    next_maintenance = 0.0
+    try:
+        while not stop_event.is_set():
+            if time.monotonic() >= next_maintenance:
+                fail_abandoned(db)
+                purge_finished(db)
+                next_maintenance = time.monotonic() + MAINTENANCE_INTERVAL
+
+            job = claim(db, SUBMISSION_QUEUE, worker_id)
+            if job is None:
+                if drain:
+                    return
+                stop_event.wait(SUBMISSION_WORKER_POLL_INTERVAL)
+                continue
+
+            start = time.perf_counter()
+            try:
+                process_submission(db, json.loads(job.payload)["submission_id"])
+                if complete(db, job, worker_id):
+                    db.commit()
+                    print(f"[{worker_id}] job {job.job_id} done in {time.perf_counter() - start:.1f}s")
+                else:
+                    db.rollback()
+                    print(f"[{worker_id}] job {job.job_id} lease expired before completion, discarding result")
+            except Exception as e:
+                db.rollback()
+                fail(db, job, worker_id, f"{type(e).__name__}: {e}")
+                print(f"[{worker_id}] job {job.job_id} attempt {job.attempts} failed: {e}")
+    finally:
+        db.close()
+
+def run_workers(concurrency: int = SUBMISSION_WORKER_CONCURRENCY, drain: bool = False):
+    stop_event = multiprocessing.Event()
+    workers = [
+        multiprocessing.Process(target=run_worker, args=(stop_event, drain), daemon=True)
+        for _ in range(concurrency)
+    ]
+    for worker in workers:
+        worker.start()
+
+    def shutdown(signum, frame):
+        print("Stopping submission workers after their current jobs...")
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+    for worker in workers:
+        worker.join()
+
+if __name__ == "__main__":
+    import argparse
+    from dotenv import load_dotenv
+    from database import create_tables
+
+    parser = argparse.ArgumentParser(description="Process queued product submissions (OCR, parsing and analysis)")
+    parser.add_argument("--concurrency", type=int, default=SUBMISSION_WORKER_CONCURRENCY, help="Worker processes")
+    parser.add_argument("--drain", action="store_true", help="Exit once the queue is empty")
+    args = parser.parse_args()
+
+    load_dotenv()
+    create_tables()
+    run_workers(args.concurrency, args.drain)
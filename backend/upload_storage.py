@@ -0,0 +1,205 @@
+import asyncio
+import hashlib
+import io
+import os
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Optional
+
+from PIL import Image
+from sqlalchemy.orm import Session
+
+from models import ProductSubmission
+
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
+UPLOAD_QUOTA_BYTES = int(os.getenv("UPLOAD_QUOTA_BYTES", str(5 * 1024 ** 3)))
+THUMBNAIL_SIZE = int(os.getenv("THUMBNAIL_SIZE", "256"))
+# Unreferenced blobs younger than this are kept: their submission row may not be committed yet
+UPLOAD_GC_GRACE_SECONDS = int(os.getenv("UPLOAD_GC_GRACE_SECONDS", "3600"))
+
+class StorageQuotaExceeded(Exception):
+    pass
+
+def blob_digest(path: str) -> Optional[str]:
+    """The sha256 a stored blob path names (.../blobs/ab/cd/<sha256>), whatever directory it is relative to"""
+    parts = os.path.normpath(path).replace("\\", "/").split("/")
+    if len(parts) < 4 or parts[-4] != "blobs":
+        return None
+    digest = parts[-1]
+    if len(digest) != 64 or parts[-3] != digest[:2] or parts[-2] != digest[2:4]:
+        return None
+    return digest
+
+@dataclass
+class StoredBlob:
+    sha256: str
+    path: str
+    thumbnail_path: Optional[str]
+    size: int
+    deduplicated: bool
+
+class UploadStorage:
+    """Content-addressed blob store: blobs/ab/cd/<sha256>, with a JPEG thumbnail per blob"""
+
+    def __init__(self, root: str = UPLOAD_DIR, quota_bytes: int = UPLOAD_QUOTA_BYTES):
+        self.root = root
+        self.quota_bytes = quota_bytes
+        self.lock = threading.Lock()
+        self._usage: Optional[int] = None
+
+    def blob_path(self, digest: str) -> str:
+        return os.path.join(self.root, "blobs", digest[:2], digest[2:4], digest)
+
+    def thumbnail_path(self, digest: str) -> str:
+        return os.path.join(self.root, "thumbs", digest[:2], digest[2:4], f"{digest}.jpg")
+
+    def usage_bytes(self) -> int:
+        """Bytes used by blobs and thumbnails, scanned once and then tracked on write and GC"""
+        with self.lock:
+            if self._usage is None:
+                self._usage = sum(size for _, size, _ in self._walk("blobs")) + sum(size for _, size, _ in self._walk("thumbs"))
+            return self._usage
+
+    def _add_usage(self, delta: int):
+        with self.lock:
+            if self._usage is not None:
+                self._usage += delta
+
+    def _walk(self, area: str):
+        for directory, _, files in os.walk(os.path.join(self.root, area)):
+            for name in files:
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield path, stat.st_size, stat.st_mtime
+
+    def _write_atomic(self, path: str, data: bytes):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+    def _make_thumbnail(self, data: bytes, path: str) -> Optional[str]:
+        try:
+            image = Image.open(io.BytesIO(data))
+            image.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+            if image.mode != "RGB":
+                image = image.convert("RGB")
+            buffer = io.BytesIO()
+            image.save(buffer, "JPEG", quality=80)
+        except Exception as e:
+            print(f"Could not create thumbnail: {e}")
+            return None
+        self._write_atomic(path, buffer.getvalue())
+        self._add_usage(buffer.tell())
+        return path
+
+    def save_sync(self, data: bytes) -> StoredBlob:
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.blob_path(digest)
+        thumbnail_path = self.thumbnail_path(digest)
+
+        if os.path.exists(path):
+            # Refresh the mtime so garbage collection treats the blob as recently used
+            os.utime(path)
+            if not os.path.exists(thumbnail_path):
+                thumbnail_path = self._make_thumbnail(data, thumbnail_path)
+            return StoredBlob(digest, path, thumbnail_path, len(data), True)
+
+        if self.usage_bytes() + len(data) > self.quota_bytes:
+            raise StorageQuotaExceeded(f"Upload storage quota of {self.quota_bytes} bytes reached")
+        self._write_atomic(path, data)
+        self._add_usage(len(data))
+        return StoredBlob(digest, path, self._make_thumbnail(data, thumbnail_path), len(data), False)
+
+    async def save(self, data: bytes) -> StoredBlob:
+        """Store an upload without blocking the event loop; identical content is stored once"""
+        return await asyncio.to_thread(self.save_sync, data)
+
+    def collect_garbage(self, db: Session, dry_run: bool = False) -> dict:
+        """Delete blobs (and their thumbnails) that no submission references any more.
+
+        Submissions store blob paths relative to the API's working directory, so
+        references are matched by digest rather than by path. If submissions reference
+        blobs but none of them is found under this root (a wrong UPLOAD_DIR or working
+        directory), nothing is deleted and RuntimeError is raised.
+        """
+        stored = [
+            path for (path,) in
+            db.query(ProductSubmission.raw_image_url).filter(ProductSubmission.raw_image_url.isnot(None))
+        ]
+        referenced = {digest for digest in map(blob_digest, stored) if digest}
+        if referenced and not any(os.path.exists(self.blob_path(digest)) for digest in referenced):
+            raise RuntimeError(
+                f"None of the {len(referenced)} blobs referenced by submissions exist under {os.path.abspath(self.root)}; "
+                "check UPLOAD_DIR or run from the API's working directory"
+            )
+        cutoff = time.time() - UPLOAD_GC_GRACE_SECONDS
+        stats = {"blobs_scanned": 0, "blobs_deleted": 0, "bytes_freed": 0, "dry_run": dry_run}
+
+        for path, size, mtime in list(self._walk("blobs")):
+            if path.endswith(".tmp"):
+                # Left behind by an interrupted write
+                if mtime <= cutoff and not dry_run:
+                    os.remove(path)
+                continue
+            stats["blobs_scanned"] += 1
+            if os.path.basename(path) in referenced or mtime > cutoff:
+                continue
+            digest = os.path.basename(path)
+            thumbnail_path = self.thumbnail_path(digest)
+            freed = size + (os.path.getsize(thumbnail_path) if os.path.exists(thumbnail_path) else 0)
+            stats["blobs_deleted"] += 1
+            stats["bytes_freed"] += freed
+            if not dry_run:
+                for victim in (path, thumbnail_path):
+                    try:
+                        os.remove(victim)
+                    except FileNotFoundError:
+                        pass
+                self._add_usage(-freed)
+
+        # Thumbnails whose blob is gone
+        for path, size, mtime in list(self._walk("thumbs")):
+            digest = os.path.basename(path).split(".")[0]
+            if mtime <= cutoff and not os.path.exists(self.blob_path(digest)):
+                stats["bytes_freed"] += size
+                if not dry_run:
+                    os.remove(path)
+                    self._add_usage(-size)
+
+        with self.lock:
+            self._usage = None
+        stats["usage_bytes"] = self.usage_bytes()
+        stats["quota_bytes"] = self.quota_bytes
+        return stats
+
+# Global upload storage instance
+upload_storage = UploadStorage()
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    from database import SessionLocal, create_tables
+
+    parser = argparse.ArgumentParser(description="Inspect and garbage-collect content-addressed upload storage")
+    parser.add_argument("--gc", action="store_true", help="Delete blobs no submission references")
+    parser.add_argument("--dry-run", action="store_true", help="With --gc, only report what would be deleted")
+    args = parser.parse_args()
+
+    if args.gc:
+        create_tables()
+        db = SessionLocal()
+        try:
+            print(json.dumps(upload_storage.collect_garbage(db, dry_run=args.dry_run), indent=2))
+        except RuntimeError as e:
+            raise SystemExit(f"Refusing to collect garbage: {e}")
+        finally:
+            db.close()
+    else:
+        print(json.dumps({"root": upload_storage.root, "usage_bytes": upload_storage.usage_bytes(), "quota_bytes": upload_storage.quota_bytes}, indent=2))